@@ -0,0 +1,33 @@
+# api/ejecutor_pruebas.py
+from django.db import connections
+from django.db.models.signals import pre_migrate
+from django.test.runner import DiscoverRunner
+
+
+def crear_tablas_no_gestionadas(sender, app_config, using, **kwargs):
+    """
+    Las tablas managed=False viven en Supabase y las migraciones de la app
+    tienen FK hacia ellas: en la BD de pruebas se crean antes de migrar (así
+    0009 también construye sus índices sobre ellas en PostgreSQL).
+    """
+    if app_config.label != "api":
+        return
+    conexion = connections[using]
+    with conexion.cursor() as cursor:
+        existentes = set(conexion.introspection.table_names(cursor))
+    # Las FK se agregan al cerrar el schema_editor: el orden no importa
+    with conexion.schema_editor() as editor:
+        for modelo in app_config.get_models():
+            if not modelo._meta.managed and modelo._meta.db_table not in existentes:
+                editor.create_model(modelo)
+
+
+class EjecutorPruebas(DiscoverRunner):
+    """DiscoverRunner que completa el esquema de Supabase en la BD de pruebas"""
+
+    def setup_databases(self, **kwargs):
+        pre_migrate.connect(crear_tablas_no_gestionadas, dispatch_uid="api.crear_tablas_no_gestionadas")
+        try:
+            return super().setup_databases(**kwargs)
+        finally:
+            pre_migrate.disconnect(dispatch_uid="api.crear_tablas_no_gestionadas")
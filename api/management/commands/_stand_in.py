@@ -0,0 +1,95 @@
+"""
+Microservicio de IA de reemplazo para benchmarks locales.
+
+Responde a los mismos endpoints que el microservicio real (y a la API REST de
+Supabase Storage) con JSON fijo y una latencia simulada. Usa HTTP/1.1 para que los clientes puedan reutilizar la
+conexión (keep-alive).
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPUESTAS = {
+    "/facial-recognition/": {"success": True, "is_match": True, "confidence": 0.91, "user_id": None},
+    "/register-face/": {"success": True},
+    "/plate-detection/": {"success": True, "plate_text": "1234-ABC", "confidence": 0.88},
+}
+BUCKET = {
+    "id": "ai-detection-images", "name": "ai-detection-images", "owner": "", "public": True,
+    "created_at": "2024-01-01T00:00:00Z", "updated_at": "2024-01-01T00:00:00Z",
+    "file_size_limit": None, "allowed_mime_types": None,
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo salen en dos writes: sin esto Nagle + ACK diferido suman ~40ms por llamada
+    disable_nagle_algorithm = True
+    latencia = 0.0
+    objetos = None  # claves "bucket/ruta" subidas, para responder HEAD
+
+    def do_POST(self):
+        largo = int(self.headers.get("Content-Length") or 0)
+        if largo:
+            self.rfile.read(largo)
+        cuerpo = RESPUESTAS.get(self.path)
+        if cuerpo is None and self.path.startswith("/storage/v1/object/"):
+            # Subida a Supabase Storage (API REST)
+            cuerpo = {"Key": self.path.split("/storage/v1/object/", 1)[1]}
+            if self.command == "POST":
+                self.objetos.add(cuerpo["Key"])
+        if cuerpo is None:
+            self._responder(404, {"detail": "not found"})
+        else:
+            self._responder(200, cuerpo)
+
+    def _responder(self, estado, cuerpo):
+        if self.latencia:
+            time.sleep(self.latencia)
+        data = json.dumps(cuerpo).encode()
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/storage/v1/bucket":
+            # list_buckets: devuelve el bucket configurado
+            self._responder(200, [BUCKET])
+        else:
+            self._responder(404, {"detail": "not found"})
+
+    def do_HEAD(self):
+        clave = self.path.split("/storage/v1/object/public/", 1)[-1]
+        if self.latencia:
+            time.sleep(self.latencia)
+        self.send_response(200 if clave in self.objetos else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_DELETE(self):
+        self.do_POST()
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer:
+    """Servidor en un hilo daemon sobre un puerto libre de localhost"""
+
+    def __init__(self, latencia: float = 0.0):
+        handler = type("Handler", (_Handler,), {"latencia": latencia, "objetos": set()})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._hilo = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
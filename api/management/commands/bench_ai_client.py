@@ -0,0 +1,74 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.services.ai_client import AIClient
+
+from ._stand_in import StandInServer
+
+ENDPOINT = "/plate-detection/"
+
+
+class Command(BaseCommand):
+    help = ('Compara requests.post (conexión nueva por llamada) con el cliente pooled '
+            'de IA contra un microservicio de reemplazo local')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--llamadas', type=int, default=500)
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--latencia-ms', type=float, default=5.0,
+                            help='Latencia simulada del microservicio por llamada')
+        parser.add_argument('--kb', type=int, default=200, help='Tamaño de la imagen enviada')
+        parser.add_argument('--url', default=None,
+                            help='Usar un microservicio ya levantado en lugar del reemplazo local')
+
+    def handle(self, *args, **options):
+        payload = b"\xff" * (options['kb'] * 1024)
+        files = lambda: {'image': ('bench.jpg', payload, 'image/jpeg')}  # noqa: E731
+        n, hilos = options['llamadas'], options['hilos']
+
+        if options['url']:
+            self._comparar(options['url'], files, n, hilos)
+            return
+        with StandInServer(latencia=options['latencia_ms'] / 1000) as server:
+            self._comparar(server.url, files, n, hilos)
+
+    def _comparar(self, url, files, n, hilos):
+        cfg = settings.AI_CLIENT_SETTINGS
+        timeout = (cfg['CONNECT_TIMEOUT'], cfg['READ_TIMEOUT'])
+
+        def sin_pool(_):
+            inicio = time.perf_counter()
+            requests.post(f"{url}{ENDPOINT}", files=files(), timeout=timeout).raise_for_status()
+            return time.perf_counter() - inicio
+
+        client = AIClient(url, pool_connections=cfg['POOL_CONNECTIONS'],
+                          pool_maxsize=max(hilos, cfg['POOL_MAXSIZE']),
+                          connect_timeout=cfg['CONNECT_TIMEOUT'], read_timeout=cfg['READ_TIMEOUT'])
+
+        def con_pool(_):
+            inicio = time.perf_counter()
+            client.post(ENDPOINT, files=files()).raise_for_status()
+            return time.perf_counter() - inicio
+
+        try:
+            for nombre, fn in (("requests.post", sin_pool), ("AIClient (pool)", con_pool)):
+                self._medir(nombre, fn, n, hilos)
+            self.stdout.write(f"Métricas del cliente: {client.metricas()}")
+        finally:
+            client.close()
+
+    def _medir(self, nombre, fn, n, hilos):
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            latencias = sorted(pool.map(fn, range(n)))
+        total = time.perf_counter() - inicio
+        p50 = latencias[len(latencias) // 2] * 1000
+        p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] * 1000
+        self.stdout.write(
+            f"{nombre:<16} {n} llamadas en {total:.2f}s  "
+            f"({n / total:.0f} req/s)  p50={p50:.1f}ms  p95={p95:.1f}ms"
+        )
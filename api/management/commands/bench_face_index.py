@@ -0,0 +1,91 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.services.face_index import IVFIndex, n_listas_para
+
+
+def galeria_sintetica(n: int, dim: int, rng: np.random.Generator):
+    """Encodings unitarios agrupados (como los de dlib: rostros parecidos quedan cerca)"""
+    grupos = rng.standard_normal((64, dim)).astype(np.float32)
+    x = grupos[rng.integers(0, 64, n)] * 0.5 + rng.standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+class Command(BaseCommand):
+    help = ('Compara el índice IVF con la búsqueda exacta de FaceMatcher (recall@1 y latencia) '
+            'sobre galerías sintéticas')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+        parser.add_argument('--n-probe', type=int, nargs='+', default=[4, 8, 16])
+        parser.add_argument('--consultas', type=int, default=500)
+        parser.add_argument('--dim', type=int, default=128)
+        parser.add_argument('--ruido', type=float, default=0.5,
+                            help='Desviación del ruido de cada consulta respecto a su perfil')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        dim = options['dim']
+        for n in options['tamanos']:
+            galeria = galeria_sintetica(n, dim, rng)
+            perfiles = np.arange(1, n + 1, dtype=np.int64)
+            objetivos = rng.integers(0, n, options['consultas'])
+            consultas = galeria[objetivos] + rng.standard_normal((len(objetivos), dim)).astype(np.float32) \
+                * options['ruido'] / np.sqrt(dim)
+
+            inicio = time.perf_counter()
+            indice = IVFIndex.entrenar(galeria)
+            entrenamiento = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            indice.agregar_lote(galeria, perfiles, perfiles)
+            carga = time.perf_counter() - inicio
+            self.stdout.write(
+                f"\nn={n:,}  listas={indice.n_listas} (regla {n_listas_para(n)})  "
+                f"k-means={entrenamiento:.2f}s  asignación={carga:.2f}s  desbalance={indice.desbalance():.1f}x"
+            )
+            self._persistencia(indice, consultas[0])
+
+            # Búsqueda exacta, igual que FaceMatcher.distancias
+            normas = np.einsum("ij,ij->i", galeria, galeria)
+            exactos, tiempos = [], []
+            for q in consultas:
+                t = time.perf_counter()
+                exactos.append(int(np.argmin(normas - 2.0 * (galeria @ q))) + 1)
+                tiempos.append(time.perf_counter() - t)
+            self._fila("exacta", tiempos, 1.0)
+
+            for n_probe in options['n_probe']:
+                aciertos, tiempos = 0, []
+                for q, esperado in zip(consultas, exactos):
+                    t = time.perf_counter()
+                    resultado = indice.buscar(q, n_probe)
+                    tiempos.append(time.perf_counter() - t)
+                    aciertos += resultado is not None and resultado[0] == esperado
+                self._fila(f"ivf n_probe={n_probe}", tiempos, aciertos / len(consultas))
+
+    def _fila(self, nombre, tiempos, recall):
+        tiempos = np.array(tiempos) * 1e6
+        self.stdout.write(
+            f"  {nombre:<16} recall@1={recall:.3f}  p50={np.percentile(tiempos, 50):.0f}µs  "
+            f"p95={np.percentile(tiempos, 95):.0f}µs"
+        )
+
+    def _persistencia(self, indice, consulta):
+        with tempfile.TemporaryDirectory() as tmp:
+            ruta = os.path.join(tmp, "face_index.npz")
+            inicio = time.perf_counter()
+            indice.guardar(ruta)
+            guardado = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            cargado = IVFIndex.cargar(ruta)
+            lectura = time.perf_counter() - inicio
+            assert cargado is not None and len(cargado) == len(indice)
+            assert cargado.buscar(consulta, 8) == indice.buscar(consulta, 8)
+            self.stdout.write(
+                f"  persistencia: {os.path.getsize(ruta) / 1e6:.1f}MB  "
+                f"guardar={guardado * 1000:.0f}ms  cargar={lectura * 1000:.0f}ms"
+            )
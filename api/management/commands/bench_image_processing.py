@@ -0,0 +1,92 @@
+import io
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from api.services.supabase_storage import generar_variantes, optimizar_imagen, variantes_configuradas
+
+
+def legado(file_data: bytes) -> bytes:
+    """Lo que hacía optimizar_imagen antes de los presets: decodificación completa y optimize=True"""
+    image = Image.open(io.BytesIO(file_data))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail(settings.AI_IMAGE_SETTINGS['THUMBNAIL_SIZE'], Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=settings.AI_IMAGE_SETTINGS['JPEG_QUALITY'], optimize=True)
+    return output.getvalue()
+
+
+def escena(ancho: int, alto: int, rng: np.random.Generator) -> Image.Image:
+    """Degradados y ruido de sensor: comprime parecido a una foto de cámara"""
+    y, x = np.mgrid[0:alto, 0:ancho].astype(np.float32)
+    base = np.stack([
+        128 + 90 * np.sin(x / ancho * 7 + c) * np.cos(y / alto * 5 - c) for c in (0.0, 1.3, 2.6)
+    ], axis=-1)
+    ruido = rng.normal(0, 12, base.shape)
+    return Image.fromarray(np.clip(base + ruido, 0, 255).astype(np.uint8))
+
+
+def muestras_sinteticas():
+    rng = np.random.default_rng(0)
+    for nombre, tamano, formato, opciones in (
+        ("camara 12MP", (4000, 3000), "JPEG", {"quality": 92}),
+        ("camara 1080p", (1920, 1080), "JPEG", {"quality": 90}),
+        ("miniatura lista", (800, 450), "JPEG", {"quality": 75}),
+        ("captura PNG", (1280, 720), "PNG", {}),
+    ):
+        buf = io.BytesIO()
+        escena(*tamano, rng).save(buf, formato, **opciones)
+        yield nombre, buf.getvalue()
+
+
+class Command(BaseCommand):
+    help = ('Mide ms/imagen y bytes de salida de la optimización de imágenes para Storage: '
+            'el camino anterior frente a cada preset de STORAGE_PRESETS, y las VARIANTES '
+            'generadas con una sola decodificación frente a una por variante')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Carpeta con imágenes de muestra (por defecto, sintéticas)')
+        parser.add_argument('--repeticiones', type=int, default=10)
+
+    def handle(self, *args, **options):
+        muestras = list(self._leer_dir(options['dir']) if options['dir'] else muestras_sinteticas())
+        if not muestras:
+            raise CommandError("No hay imágenes de muestra")
+
+        variantes = [("legado", legado)] + [
+            (nombre, lambda data, preset=nombre: optimizar_imagen(data, preset))
+            for nombre in settings.AI_IMAGE_SETTINGS['STORAGE_PRESETS']
+        ] + [
+            # Todas las VARIANTES (los bytes son la suma): una decodificación frente a una por variante
+            ("var x1", lambda data: b"".join(generar_variantes(data).values())),
+            ("var xN", lambda data: b"".join(
+                generar_variantes(data, {nombre: tamano})[nombre] for nombre, tamano in variantes_configuradas().items()
+            )),
+        ]
+        for nombre, data in muestras:
+            with Image.open(io.BytesIO(data)) as img:
+                self.stdout.write(f"\n{nombre}: {img.format} {img.width}x{img.height}  {len(data) / 1024:.0f}KB")
+            for variante, funcion in variantes:
+                tiempos = []
+                for _ in range(options['repeticiones']):
+                    inicio = time.perf_counter()
+                    salida = funcion(data)
+                    tiempos.append(time.perf_counter() - inicio)
+                sin_cambios = " (sin recodificar)" if salida is data else ""
+                self.stdout.write(
+                    f"  {variante:<10} {np.median(tiempos) * 1000:7.1f}ms/imagen  "
+                    f"{len(salida) / 1024:6.0f}KB{sin_cambios}"
+                )
+
+    @staticmethod
+    def _leer_dir(carpeta):
+        for nombre in sorted(os.listdir(carpeta)):
+            ruta = os.path.join(carpeta, nombre)
+            if os.path.isfile(ruta):
+                with open(ruta, 'rb') as f:
+                    yield nombre, f.read()
@@ -0,0 +1,79 @@
+import io
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from PIL import Image
+
+from api.services import ai_client, registry
+from api.services.ai_detection import FacialRecognitionService, PlateDetectionService
+from api.services.supabase_storage import SupabaseStorageService
+
+from ._stand_in import BUCKET, StandInServer
+
+
+class Command(BaseCommand):
+    help = ('Mide la latencia por request construyendo los servicios de IA en cada request '
+            '(antes) frente al registro compartido (después), contra un Storage de reemplazo local')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--latencia-ms', type=float, default=20.0,
+                            help='Latencia simulada de Storage y del microservicio')
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        buf = io.BytesIO()
+        Image.new("RGB", (640, 480), "gray").save(buf, "JPEG")
+        imagen = buf.getvalue()
+
+        with StandInServer(latencia=options['latencia_ms'] / 1000) as server, override_settings(
+            SUPABASE_URL=server.url,
+            SUPABASE_SERVICE_KEY="stand.in.key",
+            SUPABASE_STORAGE_BUCKET=BUCKET["name"],
+            AI_MICROSERVICE_URL=server.url,
+        ):
+            ai_client._client = None
+            registry.registry.reset()
+            try:
+                antes = self._medir(n, imagen, self._servicios_por_request)
+                despues = self._medir(n, imagen, self._servicios_del_registro)
+            finally:
+                ai_client._client = None
+                registry.registry.reset()
+                SupabaseStorageService._buckets_verificados.clear()
+
+        for nombre, latencias in (("por request", antes), ("registro", despues)):
+            latencias.sort()
+            self.stdout.write(
+                f"{nombre:<12} p50={latencias[len(latencias) // 2] * 1000:.1f}ms  "
+                f"p95={latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] * 1000:.1f}ms  "
+                f"promedio={sum(latencias) / len(latencias) * 1000:.1f}ms"
+            )
+
+    @staticmethod
+    def _servicios_por_request():
+        # Lo que hacía AIDetectionViewSet.__init__: tres clientes y tres list_buckets
+        SupabaseStorageService._buckets_verificados.clear()
+        plate = PlateDetectionService()
+        FacialRecognitionService()
+        SupabaseStorageService._buckets_verificados.clear()
+        SupabaseStorageService()
+        return plate
+
+    @staticmethod
+    def _servicios_del_registro():
+        registry.get_facial_service()
+        registry.get_storage_service()
+        return registry.get_plate_service()
+
+    @staticmethod
+    def _medir(n, imagen, obtener_servicios):
+        latencias = []
+        for _ in range(n):
+            inicio = time.perf_counter()
+            plate = obtener_servicios()
+            plate.detect_plate(SimpleUploadedFile("bench.jpg", imagen, "image/jpeg"))
+            latencias.append(time.perf_counter() - inicio)
+        return latencias
@@ -0,0 +1,58 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.services.avisos import despachar_envios_programados, publicar_comunicados_vencidos
+
+
+class Command(BaseCommand):
+    help = 'Worker que publica los comunicados programados y despacha sus envíos de forma escalonada'
+
+    def add_arguments(self, parser):
+        cfg = settings.AVISOS_SETTINGS
+        parser.add_argument('--once', action='store_true', help='Procesa un solo ciclo y termina')
+        parser.add_argument('--intervalo', type=float, default=cfg['POLL_SEGUNDOS'],
+                            help='Segundos entre consultas cuando no hay trabajo')
+        parser.add_argument('--ventana', type=int, default=cfg['VENTANA_SUAVIZADO_SEG'],
+                            help='Segundos en los que se reparte un envío masivo')
+        parser.add_argument('--umbral', type=int, default=cfg['UMBRAL_SUAVIZADO'],
+                            help='Destinatarios a partir de los cuales se aplica la ventana')
+        parser.add_argument('--comunicados-por-ciclo', type=int, default=cfg['COMUNICADOS_POR_CICLO'],
+                            help='Máximo de comunicados programados publicados por ciclo')
+        parser.add_argument('--envios-por-ciclo', type=int, default=cfg['ENVIOS_POR_CICLO'],
+                            help='Máximo de push despachados por ciclo')
+
+    def handle(self, *args, **options):
+        ventana = timedelta(seconds=options['ventana'])
+        self.stdout.write(
+            f"Worker de comunicados programados iniciado (ventana: {options['ventana']}s, "
+            f"umbral: {options['umbral']}, envíos/ciclo: {options['envios_por_ciclo']})"
+        )
+
+        while True:
+            close_old_connections()
+            try:
+                publicados = publicar_comunicados_vencidos(
+                    limite=options['comunicados_por_ciclo'], ventana=ventana, umbral=options['umbral'],
+                )
+                enviados, errores = despachar_envios_programados(limite=options['envios_por_ciclo'])
+            except Exception as e:
+                self.stderr.write(f'Error en el ciclo del worker: {e}')
+                publicados, enviados, errores = 0, 0, 0
+
+            if publicados or enviados or errores:
+                self.stdout.write(f'Publicados: {publicados} | enviados: {enviados} | errores: {errores}')
+
+            if options['once']:
+                break
+            # Si el ciclo llenó el cupo hay más trabajo pendiente: se sigue sin esperar
+            if enviados + errores < options['envios_por_ciclo']:
+                try:
+                    time.sleep(options['intervalo'])
+                except KeyboardInterrupt:
+                    break
+
+        self.stdout.write(self.style.SUCCESS('Worker detenido'))
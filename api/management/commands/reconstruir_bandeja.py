@@ -0,0 +1,72 @@
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+
+from api.models import BandejaNotificacion, ContadorNoLeidos, Envio
+
+
+class Command(BaseCommand):
+    help = 'Carga en la bandeja los envíos históricos que aún no tienen entrada y recalcula los contadores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-leidos', action='store_true',
+                            help='Marca las entradas históricas como no leídas (por defecto quedan leídas)')
+
+    def handle(self, *args, **options):
+        batch_size = settings.AVISOS_SETTINGS['BULK_BATCH_SIZE']
+        leido = not options['no_leidos']
+
+        faltantes = (
+            Envio.objects
+            .filter(codigo_usuario__isnull=False)
+            .annotate(en_bandeja=Exists(BandejaNotificacion.objects.filter(envio_id=OuterRef("pk"))))
+            .filter(en_bandeja=False)
+            .order_by("id")
+            .values_list("id", "codigo_usuario_id", "id_notific_id", "id_notific__descripcion",
+                         "id_notific__tipo", "fecha", "hora")
+        )
+
+        creadas, lote = 0, []
+        for envio_id, usuario_id, notif_id, titulo, tipo, fecha, hora in faltantes.iterator(chunk_size=batch_size):
+            lote.append(BandejaNotificacion(
+                usuario_id=usuario_id,
+                envio_id=envio_id,
+                notificacion_id=notif_id,
+                titulo=titulo,
+                tipo=tipo,
+                fecha=_fecha_hora(fecha, hora),
+                leido=leido,
+            ))
+            if len(lote) >= batch_size:
+                BandejaNotificacion.objects.bulk_create(lote)
+                creadas += len(lote)
+                lote = []
+        if lote:
+            BandejaNotificacion.objects.bulk_create(lote)
+            creadas += len(lote)
+
+        # Contadores desde cero a partir de la bandeja
+        with transaction.atomic():
+            ContadorNoLeidos.objects.all().delete()
+            conteos = (
+                BandejaNotificacion.objects
+                .filter(leido=False)
+                .values("usuario_id")
+                .annotate(n=Count("id"))
+            )
+            ContadorNoLeidos.objects.bulk_create(
+                [ContadorNoLeidos(usuario_id=c["usuario_id"], no_leidos=c["n"]) for c in conteos],
+                batch_size=batch_size,
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Bandeja reconstruida: {creadas} entrada(s) nuevas'))
+
+
+def _fecha_hora(fecha, hora):
+    if fecha is None:
+        return datetime.now(dt_timezone.utc)
+    # Envio guarda fecha/hora en UTC (timezone.now())
+    return datetime.combine(fecha, hora or time(0), tzinfo=dt_timezone.utc)
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.services.resumen_detecciones import reconstruir
+
+
+class Command(BaseCommand):
+    help = ('Recalcula el resumen horario de detecciones (ResumenDeteccionHora) a partir de '
+            'ReconocimientoFacial y DeteccionPlaca')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int,
+                            help='Solo los últimos N días (por defecto, todo el historial)')
+
+    def handle(self, *args, **options):
+        desde = timezone.now() - timedelta(days=options['dias']) if options['dias'] else None
+        filas = reconstruir(desde)
+        alcance = f"últimos {options['dias']} día(s)" if desde else "historial completo"
+        self.stdout.write(self.style.SUCCESS(f'Resumen reconstruido ({alcance}): {filas} fila(s)'))
@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.services.evidence_spool import get_evidence_spool
+from api.services.registry import get_storage_service
+
+
+class Command(BaseCommand):
+    help = 'Worker que sube a Storage las evidencias encoladas en disco (EVIDENCE_UPLOAD_MODE=spool)'
+
+    def add_arguments(self, parser):
+        cfg = settings.AI_CLIENT_SETTINGS
+        parser.add_argument('--once', action='store_true', help='Procesa un solo lote y termina')
+        parser.add_argument('--intervalo', type=float, default=cfg['SPOOL_POLL_SEG'],
+                            help='Segundos entre lotes cuando la cola está vacía')
+
+    def handle(self, *args, **options):
+        spool = get_evidence_spool()
+        lote = settings.AI_CLIENT_SETTINGS['SPOOL_LOTE']
+        self.stdout.write(f"Worker de evidencias iniciado ({spool.directorio}, {spool.pendientes()} pendiente(s))")
+
+        while True:
+            close_old_connections()
+            try:
+                resultado = spool.procesar_lote(get_storage_service())
+            except Exception as e:
+                self.stderr.write(f'Error en el ciclo del worker: {e}')
+                resultado = {"subidas": 0, "errores": 0}
+
+            if resultado["subidas"] or resultado["errores"]:
+                self.stdout.write(f'Subidas: {resultado["subidas"]} | errores: {resultado["errores"]}')
+
+            if options['once']:
+                break
+            # Lote lleno: hay más trabajo pendiente, se sigue sin esperar
+            if resultado["subidas"] + resultado["errores"] < lote:
+                try:
+                    time.sleep(options['intervalo'])
+                except KeyboardInterrupt:
+                    break
+
+        self.stdout.write(self.style.SUCCESS('Worker detenido'))
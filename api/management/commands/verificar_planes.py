@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.services.planes_consultas import consultas_frecuentes, escaneos_grandes, muestra
+
+
+class Command(BaseCommand):
+    help = ('Ejecuta EXPLAIN sobre las consultas frecuentes contra la BD configurada (solo lectura) y '
+            'falla si alguna recorre secuencialmente una tabla de más de --umbral filas. La misma '
+            'verificación sobre datos sembrados corre en api/tests.py con PostgreSQL')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--umbral', type=int, default=1000,
+                            help='Filas de la tabla a partir de las cuales un Seq Scan es una regresión')
+        parser.add_argument('--mostrar-planes', action='store_true', help='Imprime el plan de cada consulta')
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("verificar_planes necesita PostgreSQL (DATABASE_URL)")
+
+        fallos = []
+        for nombre, queryset in consultas_frecuentes(muestra()):
+            if options['mostrar_planes']:
+                self.stdout.write(f"\n{nombre}:\n{queryset.explain()}")
+            grandes = escaneos_grandes(queryset, options['umbral'])
+            if grandes:
+                fallos.append(nombre)
+                self.stdout.write(self.style.ERROR(f"  FALLA {nombre}: Seq Scan en {', '.join(grandes)}"))
+            else:
+                self.stdout.write(f"  ok    {nombre}")
+
+        if fallos:
+            raise CommandError(f"{len(fallos)} consulta(s) con Seq Scan sobre tablas grandes: {', '.join(fallos)}")
+        self.stdout.write(self.style.SUCCESS("Sin escaneos secuenciales sobre tablas grandes"))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_deteccionplaca_perfilfacial_reconocimientofacial_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComunicadoProgramado',
+            fields=[
+                ('id', models.BigAutoField(db_column='Id', primary_key=True, serialize=False)),
+                ('destinatarios', models.TextField(db_column='Destinatarios')),
+                ('usuario_ids', models.JSONField(blank=True, db_column='UsuarioIds', null=True)),
+                ('publicar_en', models.DateTimeField(db_column='PublicarEn')),
+                ('estado', models.TextField(choices=[('pendiente', 'Pendiente'), ('publicado', 'Publicado'), ('error', 'Error')], db_column='Estado', default='pendiente')),
+                ('intentos', models.SmallIntegerField(db_column='Intentos', default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, db_column='FechaCreacion')),
+                ('fecha_publicado', models.DateTimeField(blank=True, db_column='FechaPublicado', null=True)),
+                ('comunicado', models.OneToOneField(db_column='IdComunicado', on_delete=django.db.models.deletion.DO_NOTHING, related_name='programacion', to='api.comunicados')),
+                ('notificacion', models.ForeignKey(blank=True, db_column='IdNotificacion', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='programaciones', to='api.notificaciones')),
+            ],
+            options={
+                'db_table': 'ComunicadoProgramado',
+                'indexes': [models.Index(fields=['estado', 'publicar_en'], name='comprog_estado_publicar_idx')],
+            },
+        ),
+    ]
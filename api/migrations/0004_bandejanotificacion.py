@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_comunicadoprogramado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorNoLeidos',
+            fields=[
+                ('usuario', models.OneToOneField(db_column='CodigoUsuario', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='contador_no_leidos', serialize=False, to='api.usuario')),
+                ('no_leidos', models.IntegerField(db_column='NoLeidos', default=0)),
+            ],
+            options={
+                'db_table': 'ContadorNoLeidos',
+            },
+        ),
+        migrations.CreateModel(
+            name='BandejaNotificacion',
+            fields=[
+                ('id', models.BigAutoField(db_column='Id', primary_key=True, serialize=False)),
+                ('titulo', models.TextField(blank=True, db_column='Titulo', null=True)),
+                ('tipo', models.TextField(blank=True, db_column='Tipo', null=True)),
+                ('fecha', models.DateTimeField(db_column='Fecha')),
+                ('leido', models.BooleanField(db_column='Leido', default=False)),
+                ('fecha_lectura', models.DateTimeField(blank=True, db_column='FechaLectura', null=True)),
+                ('envio', models.OneToOneField(blank=True, db_column='IdEnvio', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='bandeja', to='api.envio')),
+                ('notificacion', models.ForeignKey(blank=True, db_column='IdNotificacion', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='bandeja', to='api.notificaciones')),
+                ('usuario', models.ForeignKey(db_column='CodigoUsuario', on_delete=django.db.models.deletion.DO_NOTHING, related_name='bandeja', to='api.usuario')),
+            ],
+            options={
+                'db_table': 'BandejaNotificacion',
+                'ordering': ['-fecha', '-id'],
+                'indexes': [models.Index(fields=['usuario', '-fecha'], name='bandeja_usuario_fecha_idx'), models.Index(condition=models.Q(('leido', False)), fields=['usuario'], name='bandeja_no_leidos_idx')],
+            },
+        ),
+    ]
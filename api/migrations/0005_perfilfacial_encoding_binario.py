@@ -0,0 +1,93 @@
+# Convierte PerfilFacial.EncodingFacial de texto (JSON o números separados)
+# a float32 binario con cabecera versionada.
+
+import json
+import logging
+import struct
+
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+# Copia del formato de api.services.face_matcher (las migraciones no importan servicios)
+CABECERA = struct.Struct("<2sBBI")
+MAGIA = b"FE"
+VERSION_ENCODING = 1
+TIPO_FLOAT32 = 1
+
+
+def _texto_a_vector(texto):
+    texto = (texto or "").strip()
+    if not texto:
+        return None
+    try:
+        if texto.startswith("["):
+            return [float(x) for x in json.loads(texto)]
+        return [float(x) for x in texto.replace(",", " ").split()]
+    except (ValueError, TypeError):
+        return None
+
+
+def texto_a_binario(apps, schema_editor):
+    PerfilFacial = apps.get_model("api", "PerfilFacial")
+    ilegibles = []
+    for perfil in PerfilFacial.objects.only("id", "encoding_facial").iterator(chunk_size=500):
+        vector = _texto_a_vector(perfil.encoding_facial)
+        if not vector:
+            ilegibles.append(perfil.id)
+            continue
+        binario = CABECERA.pack(MAGIA, VERSION_ENCODING, TIPO_FLOAT32, len(vector)) \
+            + struct.pack(f"<{len(vector)}f", *vector)
+        PerfilFacial.objects.filter(id=perfil.id).update(encoding_binario=binario)
+
+    if ilegibles:
+        # Sin encoding válido no pueden reconocerse: se desactivan para que se registren de nuevo
+        logger.warning(f"Perfiles faciales con encoding ilegible desactivados: {ilegibles}")
+        PerfilFacial.objects.filter(id__in=ilegibles).update(encoding_binario=b"", activo=False)
+
+
+def binario_a_texto(apps, schema_editor):
+    PerfilFacial = apps.get_model("api", "PerfilFacial")
+    for perfil in PerfilFacial.objects.only("id", "encoding_binario").iterator(chunk_size=500):
+        binario = bytes(perfil.encoding_binario or b"")
+        vector = []
+        if len(binario) >= CABECERA.size:
+            _, _, _, dim = CABECERA.unpack_from(binario)
+            vector = list(struct.unpack_from(f"<{dim}f", binario, CABECERA.size))
+        PerfilFacial.objects.filter(id=perfil.id).update(encoding_facial=json.dumps(vector))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_bandejanotificacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilfacial',
+            name='encoding_binario',
+            field=models.BinaryField(db_column='EncodingFacialBin', null=True),
+        ),
+        # Nullable antes de quitarla: al revertir se vuelve a crear vacía y binario_a_texto la rellena
+        migrations.AlterField(
+            model_name='perfilfacial',
+            name='encoding_facial',
+            field=models.TextField(db_column='EncodingFacial', null=True),
+        ),
+        migrations.RunPython(texto_a_binario, binario_a_texto),
+        migrations.RemoveField(
+            model_name='perfilfacial',
+            name='encoding_facial',
+        ),
+        migrations.RenameField(
+            model_name='perfilfacial',
+            old_name='encoding_binario',
+            new_name='encoding_facial',
+        ),
+        migrations.AlterField(
+            model_name='perfilfacial',
+            name='encoding_facial',
+            field=models.BinaryField(db_column='EncodingFacial'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_perfilfacial_encoding_binario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deteccionplaca',
+            name='imagen_variantes',
+            field=models.JSONField(blank=True, db_column='ImagenVariantes', null=True),
+        ),
+        migrations.AddField(
+            model_name='perfilfacial',
+            name='imagen_variantes',
+            field=models.JSONField(blank=True, db_column='ImagenVariantes', null=True),
+        ),
+        migrations.AddField(
+            model_name='reconocimientofacial',
+            name='imagen_variantes',
+            field=models.JSONField(blank=True, db_column='ImagenVariantes', null=True),
+        ),
+    ]
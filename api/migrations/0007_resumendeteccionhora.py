@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_imagen_variantes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDeteccionHora',
+            fields=[
+                ('id', models.BigAutoField(db_column='Id', primary_key=True, serialize=False)),
+                ('hora', models.DateTimeField(db_column='Hora')),
+                ('tipo', models.TextField(choices=[('rostro', 'Rostro'), ('placa', 'Placa')], db_column='Tipo')),
+                ('ubicacion_camara', models.TextField(blank=True, db_column='UbicacionCamara', default='')),
+                ('resultado', models.TextField(choices=[('residente', 'Residente'), ('desconocido', 'Desconocido'), ('autorizado', 'Autorizado'), ('no_autorizado', 'No autorizado')], db_column='Resultado')),
+                ('total', models.IntegerField(db_column='Total', default=0)),
+            ],
+            options={
+                'db_table': 'ResumenDeteccionHora',
+                'indexes': [models.Index(fields=['tipo', 'hora'], name='resumen_deteccion_tipo_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hora', 'tipo', 'ubicacion_camara', 'resultado'), name='resumen_deteccion_hora_uniq')],
+            },
+        ),
+    ]
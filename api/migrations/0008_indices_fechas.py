@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:30
+#
+# Las tres tablas reciben una fila por detección: en PostgreSQL los índices se
+# construyen CONCURRENTLY (como en 0009) para no bloquear las escrituras; en
+# otros motores se crean con el AddIndex normal.
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexConcurrentlyEnPostgres(AddIndexConcurrently):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('api', '0007_resumendeteccionhora'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyEnPostgres(
+            model_name='deteccionplaca',
+            index=models.Index(fields=['fecha_deteccion'], name='deteccion_placa_fecha_idx'),
+        ),
+        AddIndexConcurrentlyEnPostgres(
+            model_name='reconocimientofacial',
+            index=models.Index(fields=['fecha_deteccion'], name='reconocimiento_fecha_idx'),
+        ),
+        AddIndexConcurrentlyEnPostgres(
+            model_name='reporteseguridad',
+            index=models.Index(fields=['fecha_evento'], name='reporte_seguridad_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Índices para los filtros frecuentes sobre tablas con managed=False.
+#
+# Django no genera migraciones para esas tablas (el esquema vive en Supabase),
+# así que los índices se crean con SQL propio: solo en PostgreSQL, solo si la
+# tabla existe (en SQLite de desarrollo o en una BD nueva no están) y con
+# CONCURRENTLY para no bloquear escrituras mientras se construyen.
+
+from django.db import migrations
+
+# (nombre, tabla, columnas)
+INDICES = (
+    ("usuario_correo_idx", "Usuario", ("Correo",)),
+    ("pertenece_usuario_fecha_idx", "Pertenece", ("CodigoUsuario", "FechaIni")),
+    ("pertenece_propiedad_fecha_idx", "Pertenece", ("CodigoPropiedad", "FechaIni")),
+    ("reserva_area_fecha_idx", "Reserva", ("IdAreaC", "Fecha")),
+    ("detalle_multa_propiedad_fecha_idx", "DetalleMulta", ("Codigo Propiedad", "FechaEmi")),
+    ("factura_usuario_fecha_estado_idx", "Factura", ("CodigoUsuario", "Fecha", "Estado")),
+)
+
+
+def sql_crear(quote_name):
+    """[(tabla, CREATE INDEX ...)] de INDICES"""
+    return [
+        (tabla, f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote_name(nombre)} ON {quote_name(tabla)} '
+                f'({", ".join(quote_name(c) for c in columnas)})')
+        for nombre, tabla, columnas in INDICES
+    ]
+
+
+def crear_indices(apps, schema_editor):
+    conexion = schema_editor.connection
+    if conexion.vendor != "postgresql":
+        return
+    with conexion.cursor() as cursor:
+        tablas = set(conexion.introspection.table_names(cursor))
+        for tabla, sql in sql_crear(schema_editor.quote_name):
+            if tabla in tablas:
+                cursor.execute(sql)
+
+
+def borrar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for nombre, _, _ in INDICES:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(nombre)}")
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('api', '0008_indices_fechas'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
@@ -404,9 +404,12 @@ class PerfilFacial(models.Model):
         Usuario, models.CASCADE, db_column="CodigoUsuario",
         related_name="perfil_facial"
     )
-    encoding_facial = models.TextField(db_column="EncodingFacial")
+    # float32 con cabecera versionada (api.services.face_matcher.serializar_encoding)
+    encoding_facial = models.BinaryField(db_column="EncodingFacial")
     imagen_path = models.TextField(null=True, blank=True, db_column="ImagenPath")
     imagen_url = models.URLField(null=True, blank=True, db_column="ImagenUrl")
+    # {variante: ruta en Storage}; imagen_path/imagen_url son los de la variante principal
+    imagen_variantes = models.JSONField(null=True, blank=True, db_column="ImagenVariantes")
     fecha_registro = models.DateTimeField(auto_now_add=True, db_column="FechaRegistro")
     activo = models.BooleanField(default=True, db_column="Activo")
 
@@ -425,6 +428,8 @@ class ReconocimientoFacial(models.Model):
     )
     imagen_path = models.TextField(null=True, blank=True, db_column="ImagenPath")
     imagen_url = models.URLField(null=True, blank=True, db_column="ImagenUrl")
+    # {variante: ruta en Storage}; imagen_path/imagen_url son los de la variante principal
+    imagen_variantes = models.JSONField(null=True, blank=True, db_column="ImagenVariantes")
     confianza = models.DecimalField(max_digits=5, decimal_places=2, db_column="Confianza")
     es_residente = models.BooleanField(default=False, db_column="EsResidente")
     fecha_deteccion = models.DateTimeField(auto_now_add=True, db_column="FechaDeteccion")
@@ -436,6 +441,9 @@ class ReconocimientoFacial(models.Model):
 
     class Meta:
         db_table = "ReconocimientoFacial"
+        indexes = [
+            models.Index(fields=["fecha_deteccion"], name="reconocimiento_fecha_idx"),
+        ]
 
     def __str__(self):
         return f"Reconocimiento {self.id} - {self.fecha_deteccion}"
@@ -450,6 +458,8 @@ class DeteccionPlaca(models.Model):
     )
     imagen_path = models.TextField(null=True, blank=True, db_column="ImagenPath")
     imagen_url = models.URLField(null=True, blank=True, db_column="ImagenUrl")
+    # {variante: ruta en Storage}; imagen_path/imagen_url son los de la variante principal
+    imagen_variantes = models.JSONField(null=True, blank=True, db_column="ImagenVariantes")
     confianza = models.DecimalField(max_digits=5, decimal_places=2, db_column="Confianza")
     es_autorizado = models.BooleanField(default=False, db_column="EsAutorizado")
     fecha_deteccion = models.DateTimeField(auto_now_add=True, db_column="FechaDeteccion")
@@ -461,11 +471,46 @@ class DeteccionPlaca(models.Model):
 
     class Meta:
         db_table = "DeteccionPlaca"
+        indexes = [
+            models.Index(fields=["fecha_deteccion"], name="deteccion_placa_fecha_idx"),
+        ]
 
     def __str__(self):
         return f"Placa {self.placa_detectada} - {self.fecha_deteccion}"
 
 
+class ResumenDeteccionHora(models.Model):
+    """
+    Detecciones por hora, cámara, tipo y resultado; mantenido por señales al
+    crear/editar/borrar ReconocimientoFacial y DeteccionPlaca (api.services.resumen_detecciones)
+    """
+    TIPOS = [('rostro', 'Rostro'), ('placa', 'Placa')]
+    RESULTADOS = [
+        ('residente', 'Residente'), ('desconocido', 'Desconocido'),
+        ('autorizado', 'Autorizado'), ('no_autorizado', 'No autorizado'),
+    ]
+
+    id = models.BigAutoField(primary_key=True, db_column="Id")
+    hora = models.DateTimeField(db_column="Hora")  # inicio de la hora (UTC)
+    tipo = models.TextField(choices=TIPOS, db_column="Tipo")
+    ubicacion_camara = models.TextField(default="", blank=True, db_column="UbicacionCamara")
+    resultado = models.TextField(choices=RESULTADOS, db_column="Resultado")
+    total = models.IntegerField(default=0, db_column="Total")
+
+    class Meta:
+        db_table = "ResumenDeteccionHora"
+        constraints = [
+            models.UniqueConstraint(fields=["hora", "tipo", "ubicacion_camara", "resultado"],
+                                    name="resumen_deteccion_hora_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["tipo", "hora"], name="resumen_deteccion_tipo_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.hora:%Y-%m-%d %H}h {self.tipo}/{self.resultado} {self.ubicacion_camara}: {self.total}"
+
+
 class ReporteSeguridad(models.Model):
     id = models.BigAutoField(primary_key=True, db_column="Id")
     tipo_evento = models.TextField(
@@ -500,6 +545,92 @@ class ReporteSeguridad(models.Model):
     class Meta:
         db_table = "ReporteSeguridad"
         ordering = ['-fecha_evento']
+        indexes = [
+            models.Index(fields=["fecha_evento"], name="reporte_seguridad_fecha_idx"),
+        ]
+
+    def __str__(self):
+        return f"Reporte {self.tipo_evento} - {self.fecha_evento}"
+
+class ComunicadoProgramado(models.Model):
+    """
+    Publicación diferida de un comunicado; la procesa el comando publicar_programados.
+    Las publicaciones inmediatas también dejan su fila (ya 'publicado') para ligar
+    notificación y comunicado.
+    """
+    id = models.BigAutoField(primary_key=True, db_column="Id")
+    comunicado = models.OneToOneField(
+        Comunicados, models.DO_NOTHING, db_column="IdComunicado",
+        related_name="programacion"
+    )
+    notificacion = models.ForeignKey(
+        Notificaciones, models.DO_NOTHING, null=True, blank=True,
+        db_column="IdNotificacion", related_name="programaciones"
+    )
+    destinatarios = models.TextField(db_column="Destinatarios")
+    usuario_ids = models.JSONField(null=True, blank=True, db_column="UsuarioIds")
+    publicar_en = models.DateTimeField(db_column="PublicarEn")
+    estado = models.TextField(
+        choices=[('pendiente', 'Pendiente'), ('publicado', 'Publicado'), ('error', 'Error')],
+        default='pendiente', db_column="Estado"
+    )
+    intentos = models.SmallIntegerField(default=0, db_column="Intentos")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, db_column="FechaCreacion")
+    fecha_publicado = models.DateTimeField(null=True, blank=True, db_column="FechaPublicado")
+
+    class Meta:
+        db_table = "ComunicadoProgramado"
+        indexes = [
+            models.Index(fields=["estado", "publicar_en"], name="comprog_estado_publicar_idx"),
+        ]
+
+    def __str__(self):
+        return f"Programación {self.id} - {self.publicar_en}"
+
+
+class BandejaNotificacion(models.Model):
+    """Bandeja de notificaciones por usuario (modelo de lectura desnormalizado de Envio + Notificaciones)"""
+    id = models.BigAutoField(primary_key=True, db_column="Id")
+    usuario = models.ForeignKey(
+        Usuario, models.DO_NOTHING, db_column="CodigoUsuario",
+        related_name="bandeja"
+    )
+    envio = models.OneToOneField(
+        Envio, models.DO_NOTHING, null=True, blank=True,
+        db_column="IdEnvio", related_name="bandeja"
+    )
+    notificacion = models.ForeignKey(
+        Notificaciones, models.DO_NOTHING, null=True, blank=True,
+        db_column="IdNotificacion", related_name="bandeja"
+    )
+    titulo = models.TextField(null=True, blank=True, db_column="Titulo")
+    tipo = models.TextField(null=True, blank=True, db_column="Tipo")
+    fecha = models.DateTimeField(db_column="Fecha")
+    leido = models.BooleanField(default=False, db_column="Leido")
+    fecha_lectura = models.DateTimeField(null=True, blank=True, db_column="FechaLectura")
+
+    class Meta:
+        db_table = "BandejaNotificacion"
+        ordering = ['-fecha', '-id']
+        indexes = [
+            models.Index(fields=["usuario", "-fecha"], name="bandeja_usuario_fecha_idx"),
+            models.Index(fields=["usuario"], name="bandeja_no_leidos_idx", condition=models.Q(leido=False)),
+        ]
+
+    def __str__(self):
+        return f"Bandeja {self.id} - usuario {self.usuario_id}"
+
+
+class ContadorNoLeidos(models.Model):
+    """Contador de no leídos por usuario, mantenido junto con BandejaNotificacion"""
+    usuario = models.OneToOneField(
+        Usuario, models.DO_NOTHING, primary_key=True,
+        db_column="CodigoUsuario", related_name="contador_no_leidos"
+    )
+    no_leidos = models.IntegerField(default=0, db_column="NoLeidos")
+
+    class Meta:
+        db_table = "ContadorNoLeidos"
 
     def __str__(self):
-        return f"Reporte {self.tipo_evento} - {self.fecha_evento}"
\ No newline at end of file
+        return f"{self.usuario_id}: {self.no_leidos}"
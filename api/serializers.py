@@ -3,8 +3,10 @@ from .models import (
     Rol, Usuario, Propiedad, Multa, Pagos, Notificaciones, AreasComunes, Tareas,
     Vehiculo, Pertenece, ListaVisitantes, DetalleMulta, Factura, Finanzas,
     Comunicados, Horarios, Reserva, Asignacion, Envio, Registro, Bitacora,
-    PerfilFacial, ReconocimientoFacial, DeteccionPlaca, ReporteSeguridad
+    PerfilFacial, ReconocimientoFacial, DeteccionPlaca, ReporteSeguridad,
+    BandejaNotificacion
 )
+from .services.supabase_storage import urls_variantes
 
 
 class RolSerializer(serializers.ModelSerializer):
@@ -215,6 +217,12 @@ class EnvioSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class BandejaNotificacionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BandejaNotificacion
+        fields = ("id", "notificacion", "titulo", "tipo", "fecha", "leido", "fecha_lectura")
+
+
 class RegistroSerializer(serializers.ModelSerializer):
     class Meta:
         model = Registro
@@ -229,18 +237,27 @@ class BitacoraSerializer(serializers.ModelSerializer):
 
 # ---- Reconocimiento/Perfiles/Placas ----
 
-class PerfilFacialSerializer(serializers.ModelSerializer):
+class ImagenVariantesMixin(serializers.Serializer):
+    """URL pública de cada variante de la imagen (mini, media, original...)"""
+    imagen_variantes_url = serializers.SerializerMethodField()
+
+    def get_imagen_variantes_url(self, obj):
+        return urls_variantes(obj.imagen_variantes)
+
+
+class PerfilFacialSerializer(ImagenVariantesMixin, serializers.ModelSerializer):
     usuario_nombre = serializers.SerializerMethodField()
 
     class Meta:
         model = PerfilFacial
-        fields = ['id', 'codigo_usuario', 'imagen_url', 'fecha_registro', 'activo', 'usuario_nombre']
+        fields = ['id', 'codigo_usuario', 'imagen_url', 'imagen_variantes_url', 'fecha_registro', 'activo',
+                  'usuario_nombre']
 
     def get_usuario_nombre(self, obj):
         return f"{obj.codigo_usuario.nombre} {obj.codigo_usuario.apellido}"
 
 
-class ReconocimientoFacialSerializer(serializers.ModelSerializer):
+class ReconocimientoFacialSerializer(ImagenVariantesMixin, serializers.ModelSerializer):
     usuario_nombre = serializers.SerializerMethodField()
 
     class Meta:
@@ -253,7 +270,7 @@ class ReconocimientoFacialSerializer(serializers.ModelSerializer):
         return "Desconocido"
 
 
-class DeteccionPlacaSerializer(serializers.ModelSerializer):
+class DeteccionPlacaSerializer(ImagenVariantesMixin, serializers.ModelSerializer):
     vehiculo_info = serializers.SerializerMethodField()
 
     class Meta:
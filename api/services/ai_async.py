@@ -0,0 +1,368 @@
+# api/services/ai_async.py
+"""
+Pipeline asíncrono de detección para servir las cámaras bajo ASGI.
+
+La inferencia y la subida a Supabase Storage (API REST) van por httpx, así
+que un worker atiende muchas cámaras a la vez mientras espera la red; la
+subida de la evidencia corre en paralelo con la inferencia. El
+recorte/recodificado de la imagen corre en un hilo y las escrituras en BD
+reutilizan registrar_reconocimiento / registrar_deteccion_placa vía
+sync_to_async. El circuit breaker y el plazo por request son los mismos que
+usa el cliente sync (circuit_breaker.py).
+"""
+import asyncio
+import logging
+import weakref
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .ai_client import EndpointMetrics
+from .ai_detection import (
+    Frame, evidencia_referenciada, mejor_placa, mejor_rostro, misma_decision, registrar_deteccion_placa,
+    registrar_reconocimiento, resumen_rafaga,
+)
+from .circuit_breaker import CircuitoAbiertoError, Plazo, get_ai_breaker, nuevo_plazo
+from .evidence_spool import EvidenciaPendiente, modo_spool
+from .frame_dedupe import get_frame_deduper
+from .image_prep import preparar_frame
+from .supabase_storage import (
+    generar_variantes, get_indice_contenido, resultado_subida, ruta_por_contenido, url_publica,
+)
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_SUBIDA = "storage:upload"
+
+
+class IANoDisponibleAsyncError(CircuitoAbiertoError, httpx.TransportError):
+    """Circuito abierto; al ser httpx.HTTPError, el pipeline lo trata como 'no disponible'"""
+
+
+class AsyncAIHttp:
+    """Un httpx.AsyncClient (con su pool keep-alive) por event loop"""
+
+    def __init__(self):
+        cfg = settings.AI_CLIENT_SETTINGS
+        self.ai_url = settings.AI_MICROSERVICE_URL.rstrip("/")
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(cfg['READ_TIMEOUT'], connect=cfg['CONNECT_TIMEOUT']),
+            limits=httpx.Limits(max_connections=cfg['POOL_MAXSIZE'],
+                                max_keepalive_connections=cfg['POOL_MAXSIZE']),
+            transport=httpx.AsyncHTTPTransport(retries=cfg['REINTENTOS_CONEXION']),
+        )
+        self._metricas: Dict[str, EndpointMetrics] = {}
+        self.breaker = get_ai_breaker()
+        self._cierre = None
+
+    async def _post(self, clave: str, url: str, **kwargs) -> httpx.Response:
+        metricas = self._metricas.setdefault(clave, EndpointMetrics())
+        inicio = asyncio.get_running_loop().time()
+        ok = False
+        try:
+            response = await self.client.post(url, **kwargs)
+            ok = response.status_code < 500
+            return response
+        finally:
+            metricas.registrar(asyncio.get_running_loop().time() - inicio, ok)
+
+    async def post_ia(self, endpoint: str, plazo: Optional[Plazo] = None, **kwargs) -> httpx.Response:
+        """Pasa por el circuit breaker; con plazo, la llamada se corta al vencer"""
+        try:
+            self.breaker.permitir()
+        except CircuitoAbiertoError as e:
+            raise IANoDisponibleAsyncError(str(e)) from None
+        inicio = asyncio.get_running_loop().time()
+        ok = False
+        try:
+            llamada = self._post(endpoint, f"{self.ai_url}{endpoint}", **kwargs)
+            if plazo is None:
+                response = await llamada
+            else:
+                try:
+                    response = await asyncio.wait_for(llamada, timeout=plazo.restante())
+                except asyncio.TimeoutError:
+                    raise httpx.TimeoutException(f"Plazo de {plazo.segundos:g}s agotado en {endpoint}") from None
+            ok = response.status_code < 500
+            return response
+        finally:
+            self.breaker.registrar(asyncio.get_running_loop().time() - inicio, ok)
+
+    async def subir_evidencia(self, data: bytes, folder: str, prefix: str) -> Optional[Dict]:
+        """
+        Genera las variantes en un hilo (una sola decodificación) y las sube
+        en paralelo por la API REST de Storage, con clave por contenido: lo que
+        ya está en el bucket no se vuelve a transferir
+        """
+        variantes = await asyncio.to_thread(generar_variantes, data)
+        if not variantes:
+            return None
+
+        rutas = {nombre: ruta_por_contenido(f"{folder}/{nombre}", prefix, contenido)
+                 for nombre, contenido in variantes.items()}
+        subidas = await asyncio.gather(*(
+            self._subir_objeto(rutas[nombre][1], contenido) for nombre, contenido in variantes.items()
+        ))
+        if not all(subidas):
+            return None
+
+        principal = settings.AI_IMAGE_SETTINGS['VARIANTE_PRINCIPAL']
+        filename, file_path = rutas[principal]
+        return resultado_subida(file_path, filename, folder, len(variantes[principal]),
+                                {nombre: ruta for nombre, (_, ruta) in rutas.items()})
+
+    async def _subir_objeto(self, file_path: str, contenido: bytes) -> bool:
+        indice = get_indice_contenido()
+        if indice.contiene(file_path):
+            indice.contar_omitida()
+            return True
+        if await self._existe(url_publica(file_path)):
+            indice.agregar(file_path)
+            indice.contar_omitida()
+            return True
+
+        key = settings.SUPABASE_SERVICE_KEY
+        try:
+            response = await self._post(
+                ENDPOINT_SUBIDA,
+                f"{settings.SUPABASE_URL}/storage/v1/object/{settings.SUPABASE_STORAGE_BUCKET}/{file_path}",
+                content=contenido,
+                headers={
+                    "Authorization": f"Bearer {key}",
+                    "apikey": key,
+                    "Content-Type": "image/jpeg",
+                    "cache-control": "max-age=31536000",
+                    "x-upsert": "true",
+                },
+            )
+        except httpx.HTTPError as e:
+            logger.error(f"Error subiendo imagen a Supabase: {e}")
+            return False
+        if response.status_code >= 300:
+            logger.error(f"Error subiendo imagen a Supabase: {response.status_code} - {response.text}")
+            return False
+
+        indice.agregar(file_path)
+        return True
+
+    async def _existe(self, public_url: str) -> bool:
+        if not settings.AI_IMAGE_SETTINGS['STORAGE_HEAD_CHECK']:
+            return False
+        try:
+            response = await self.client.head(public_url, timeout=settings.AI_CLIENT_SETTINGS['CONNECT_TIMEOUT'])
+        except httpx.HTTPError:
+            return False
+        return response.status_code == 200
+
+    async def borrar_evidencia(self, file_path: str, variantes: Optional[Dict[str, str]] = None):
+        """Solo si ningún registro la referencia (la misma imagen puede ser evidencia de varios)"""
+        if await sync_to_async(evidencia_referenciada)(file_path):
+            return
+        rutas = sorted({file_path, *(variantes or {}).values()})
+        for ruta in rutas:
+            get_indice_contenido().quitar(ruta)
+        key = settings.SUPABASE_SERVICE_KEY
+        try:
+            await self.client.request(
+                "DELETE",
+                f"{settings.SUPABASE_URL}/storage/v1/object/{settings.SUPABASE_STORAGE_BUCKET}",
+                json={"prefixes": rutas},
+                headers={"Authorization": f"Bearer {key}", "apikey": key},
+            )
+        except httpx.HTTPError as e:
+            logger.warning(f"No se pudo borrar la evidencia {file_path}: {e}")
+
+    def metricas(self) -> Dict[str, Dict]:
+        return {clave: m.snapshot() for clave, m in list(self._metricas.items())}
+
+    async def cerrar_al_terminar_loop(self):
+        """
+        Generador que queda suspendido en el loop: asyncio.run (con el que
+        async_to_sync corre cada request bajo WSGI) y uvicorn llaman a
+        shutdown_asyncgens() antes de cerrar el loop, lo que ejecuta el
+        finally y cierra el pool en lugar de dejar los sockets al GC
+        """
+        try:
+            yield
+        finally:
+            await self.client.aclose()
+
+
+# Con ASGI hay un único loop por worker; bajo WSGI cada request trae un loop
+# efímero: el mapa débil suelta el AsyncAIHttp y el cliente se cierra con el loop
+_por_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncAIHttp]" = weakref.WeakKeyDictionary()
+
+
+async def get_async_http() -> AsyncAIHttp:
+    loop = asyncio.get_running_loop()
+    http = _por_loop.get(loop)
+    if http is None:
+        http = _por_loop[loop] = AsyncAIHttp()
+        # El loop solo guarda una referencia débil al generador: la fuerte queda en http
+        http._cierre = http.cerrar_al_terminar_loop()
+        await http._cierre.asend(None)
+    return http
+
+
+async def _inferir_con_evidencia(endpoint: str, data: bytes, nombre: str, content_type: str,
+                                folder: str, prefix: str, servicio: str, subir: bool = True
+                                ) -> Tuple[Optional[Dict], Optional[Dict], Optional[Dict]]:
+    """
+    Inferencia y subida de evidencia en paralelo sobre el mismo buffer.
+    Devuelve (ai_result, subida, error); si la inferencia falla solo viene
+    error y la evidencia ya subida se borra. En modo spool o con subir=False
+    no se sube nada: subida es la EvidenciaPendiente con el frame preparado.
+    """
+    http = await get_async_http()
+    if http.breaker.rechazaria():
+        # Falla rápido, sin subir una evidencia que nadie va a referenciar
+        return None, None, {"success": False, "error": f"Servicio de {servicio} no disponible"}
+
+    plazo = nuevo_plazo()
+    nombre, data, content_type = await asyncio.to_thread(preparar_frame, nombre, data, content_type)
+    subida_task = None
+    if subir and not modo_spool():
+        subida_task = asyncio.create_task(http.subir_evidencia(data, folder, prefix))
+    try:
+        response = await http.post_ia(endpoint, plazo=plazo, files={'image': (nombre, data, content_type)})
+        if response.status_code == 200:
+            if subida_task is None:
+                return response.json(), EvidenciaPendiente(data, folder, prefix), None
+            return response.json(), await _esperar_subida(subida_task, plazo), None
+        logger.error(f"Error del microservicio: {response.status_code} - {response.text}")
+        error = f"Error en el servicio de {servicio}"
+    except httpx.HTTPError as e:
+        logger.error(f"Error conectando con microservicio: {e}")
+        error = f"Servicio de {servicio} no disponible"
+    except BaseException:
+        if subida_task is not None:
+            subida_task.cancel()
+        raise
+
+    # Misma espera acotada que con éxito: una subida colgada no retiene el request pasado el plazo
+    subida = await _esperar_subida(subida_task, plazo) if subida_task is not None else None
+    if subida:
+        await http.borrar_evidencia(subida["file_path"], subida.get("variantes"))
+    return None, None, {"success": False, "error": error}
+
+
+async def _esperar_subida(subida_task: asyncio.Task, plazo: Plazo) -> Optional[Dict]:
+    """Si la subida no termina dentro del plazo, se cancela y se registra sin evidencia"""
+    try:
+        return await asyncio.wait_for(subida_task, timeout=plazo.restante())
+    except asyncio.TimeoutError:
+        logger.error("Subida de evidencia no completada dentro del plazo del request")
+        return None
+
+
+async def _registrar(registrar: Callable, ai_result: Dict, subida, *args) -> Dict:
+    """Si el registro en BD falla, la evidencia recién subida queda sin referencia: se borra"""
+    try:
+        return await sync_to_async(registrar)(ai_result, subida, *args)
+    except Exception:
+        if isinstance(subida, dict):
+            http = await get_async_http()
+            await http.borrar_evidencia(subida["file_path"], subida.get("variantes"))
+        raise
+
+
+async def _confirmar_previo(previo: Dict, ai_result: Dict, pendiente: EvidenciaPendiente):
+    """
+    Frame parecido a uno reciente (frame_dedupe): (respuesta, None) si la
+    inferencia confirma su decisión; si no, (None, subida) con la evidencia
+    que no se subió en paralelo
+    """
+    if await sync_to_async(misma_decision)(previo, ai_result):
+        return get_frame_deduper().suprimir(previo), None
+    if modo_spool():
+        return None, pendiente
+    http = await get_async_http()
+    return None, await http.subir_evidencia(pendiente.data, pendiente.folder, pendiente.prefix)
+
+
+async def reconocer_rostro(data: bytes, nombre: str, content_type: str, camera_location: str,
+                           previo: Optional[Dict] = None) -> Dict:
+    ai_result, subida, error = await _inferir_con_evidencia(
+        "/facial-recognition/", data, nombre, content_type,
+        "facial_recognitions", "face", "reconocimiento facial", subir=previo is None,
+    )
+    if error:
+        return error
+    if previo is not None:
+        repetido, subida = await _confirmar_previo(previo, ai_result, subida)
+        if repetido is not None:
+            return repetido
+    return await _registrar(registrar_reconocimiento, ai_result, subida, camera_location)
+
+
+async def detectar_placa(data: bytes, nombre: str, content_type: str, camera_location: str,
+                         access_type: str, previo: Optional[Dict] = None) -> Dict:
+    ai_result, subida, error = await _inferir_con_evidencia(
+        "/plate-detection/", data, nombre, content_type,
+        "plate_detections", "plate", "detección de placas", subir=previo is None,
+    )
+    if error:
+        return error
+    if previo is not None:
+        repetido, subida = await _confirmar_previo(previo, ai_result, subida)
+        if repetido is not None:
+            return repetido
+    return await _registrar(registrar_deteccion_placa, ai_result, subida, camera_location, access_type)
+
+
+# ---------------------------------------------------------------------
+# Ráfagas
+# ---------------------------------------------------------------------
+async def _inferir_frames(http: AsyncAIHttp, endpoint: str, frames: List[Frame]) -> List[Tuple[int, Dict]]:
+    plazo = nuevo_plazo()
+
+    async def _inferir(idx: int, frame: Frame):
+        nombre, data, content_type = frame
+        try:
+            response = await http.post_ia(endpoint, plazo=plazo, files={'image': (nombre, data, content_type)})
+        except httpx.HTTPError as e:
+            logger.error(f"Error conectando con microservicio (frame {idx}): {e}")
+            return None
+        if response.status_code != 200:
+            logger.error(f"Error del microservicio (frame {idx}): {response.status_code} - {response.text}")
+            return None
+        return idx, response.json()
+
+    resultados = await asyncio.gather(*(_inferir(i, f) for i, f in enumerate(frames)))
+    return [r for r in resultados if r is not None]
+
+
+async def _procesar_rafaga(endpoint: str, frames: List[Frame], elegir: Callable, folder: str, prefix: str,
+                           servicio: str, guardar_evidencia: bool, registrar: Callable, *args) -> Dict:
+    http = await get_async_http()
+    resultados = await _inferir_frames(http, endpoint, frames)
+    # elegir puede consultar la BD (carga del FaceMatcher / índice de placas): fuera del loop
+    mejor = await sync_to_async(elegir)(resultados)
+    if mejor is None:
+        return {"success": False, "error": f"Servicio de {servicio} no disponible"}
+
+    idx, ai_result = mejor
+    subida = None
+    if guardar_evidencia:
+        data = frames[idx][1]
+        subida = EvidenciaPendiente(data, folder, prefix) if modo_spool() \
+            else await http.subir_evidencia(data, folder, prefix)
+    resultado = await _registrar(registrar, ai_result, subida, *args)
+    return resumen_rafaga(resultado, idx, len(frames), len(resultados), guardar_evidencia)
+
+
+async def reconocer_rafaga(frames: List[Frame], camera_location: str, guardar_evidencia: bool = True) -> Dict:
+    return await _procesar_rafaga(
+        "/facial-recognition/", frames, mejor_rostro, "facial_recognitions", "face",
+        "reconocimiento facial", guardar_evidencia, registrar_reconocimiento, camera_location,
+    )
+
+
+async def detectar_placa_rafaga(frames: List[Frame], camera_location: str, access_type: str,
+                                guardar_evidencia: bool = True) -> Dict:
+    return await _procesar_rafaga(
+        "/plate-detection/", frames, mejor_placa, "plate_detections", "plate",
+        "detección de placas", guardar_evidencia, registrar_deteccion_placa, camera_location, access_type,
+    )
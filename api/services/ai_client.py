@@ -0,0 +1,155 @@
+# api/services/ai_client.py
+"""
+Cliente HTTP compartido por proceso para el microservicio de IA.
+
+Una sola requests.Session con pool de conexiones keep-alive, timeouts de
+conexión y lectura separados, métricas de latencia por endpoint y un circuit
+breaker (circuit_breaker.py) para fallar rápido cuando el servicio está caído.
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .circuit_breaker import CircuitBreaker, CircuitoAbiertoError, Plazo, get_ai_breaker
+
+# Latencias recientes que se conservan por endpoint para los percentiles
+MUESTRAS_LATENCIA = 512
+
+
+class EndpointMetrics:
+    """Contadores y latencias recientes de un endpoint"""
+
+    def __init__(self):
+        self.llamadas = 0
+        self.errores = 0
+        self.total_seg = 0.0
+        self.max_seg = 0.0
+        self.recientes = deque(maxlen=MUESTRAS_LATENCIA)
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos: float, ok: bool):
+        with self._lock:
+            self.llamadas += 1
+            if not ok:
+                self.errores += 1
+            self.total_seg += segundos
+            self.max_seg = max(self.max_seg, segundos)
+            self.recientes.append(segundos)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            muestras = sorted(self.recientes)
+            llamadas, errores, total, maximo = self.llamadas, self.errores, self.total_seg, self.max_seg
+
+        def pct(p: float) -> float:
+            if not muestras:
+                return 0.0
+            return muestras[min(len(muestras) - 1, int(p * len(muestras)))]
+
+        return {
+            "llamadas": llamadas,
+            "errores": errores,
+            "promedio_ms": round(total / llamadas * 1000, 2) if llamadas else 0.0,
+            "p50_ms": round(pct(0.50) * 1000, 2),
+            "p95_ms": round(pct(0.95) * 1000, 2),
+            "max_ms": round(maximo * 1000, 2),
+        }
+
+
+class IANoDisponibleError(CircuitoAbiertoError, requests.exceptions.ConnectionError):
+    """Circuito abierto; al ser RequestException, los servicios lo tratan como 'no disponible'"""
+
+
+class AIClient:
+    """POST al microservicio reutilizando conexiones; seguro entre hilos"""
+
+    def __init__(self, base_url: str, pool_connections: int = 4, pool_maxsize: int = 16,
+                 connect_timeout: float = 3.0, read_timeout: float = 30.0, reintentos_conexion: int = 1,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.base_url = base_url.rstrip("/")
+        self.breaker = breaker
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # Solo se reintentan fallos de conexión: un POST de inferencia no es idempotente
+        retry = Retry(total=reintentos_conexion, connect=reintentos_conexion, read=0, status=0,
+                      other=0, allowed_methods=None, backoff_factor=0.1)
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                              max_retries=retry, pool_block=False)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._metricas: Dict[str, EndpointMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _metricas_de(self, endpoint: str) -> EndpointMetrics:
+        m = self._metricas.get(endpoint)
+        if m is None:
+            with self._lock:
+                m = self._metricas.setdefault(endpoint, EndpointMetrics())
+        return m
+
+    def verificar_disponible(self):
+        """Lanza IANoDisponibleError si el circuito rechazaría la llamada (antes de preparar trabajo)"""
+        if self.breaker is not None and self.breaker.rechazaria():
+            raise IANoDisponibleError(f"{self.breaker.nombre}: circuito abierto")
+
+    def post(self, endpoint: str, timeout: Optional[float] = None, plazo: Optional[Plazo] = None,
+             **kwargs) -> requests.Response:
+        """endpoint relativo (p. ej. '/plate-detection/'); propaga RequestException"""
+        timeout = timeout or self.timeout
+        if plazo is not None:
+            if plazo.vencido:
+                raise requests.exceptions.Timeout(f"Plazo de {plazo.segundos:g}s agotado antes de {endpoint}")
+            conexion, lectura = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+            timeout = (plazo.acotar(conexion), plazo.acotar(lectura))
+        if self.breaker is not None:
+            try:
+                self.breaker.permitir()
+            except CircuitoAbiertoError as e:
+                raise IANoDisponibleError(str(e)) from None
+
+        inicio = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.post(f"{self.base_url}{endpoint}", timeout=timeout, **kwargs)
+            ok = response.status_code < 500
+            return response
+        finally:
+            duracion = time.perf_counter() - inicio
+            self._metricas_de(endpoint).registrar(duracion, ok)
+            if self.breaker is not None:
+                self.breaker.registrar(duracion, ok)
+
+    def metricas(self) -> Dict[str, Dict]:
+        return {endpoint: m.snapshot() for endpoint, m in list(self._metricas.items())}
+
+    def close(self):
+        self.session.close()
+
+
+_client: Optional[AIClient] = None
+_client_lock = threading.Lock()
+
+
+def get_ai_client() -> AIClient:
+    """Cliente del proceso, configurado desde settings.AI_CLIENT_SETTINGS"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                cfg = settings.AI_CLIENT_SETTINGS
+                _client = AIClient(
+                    settings.AI_MICROSERVICE_URL,
+                    pool_connections=cfg['POOL_CONNECTIONS'],
+                    pool_maxsize=cfg['POOL_MAXSIZE'],
+                    connect_timeout=cfg['CONNECT_TIMEOUT'],
+                    read_timeout=cfg['READ_TIMEOUT'],
+                    reintentos_conexion=cfg['REINTENTOS_CONEXION'],
+                    breaker=get_ai_breaker(),
+                )
+    return _client
@@ -8,23 +8,333 @@ import io
 from PIL import Image
 # import easyocr  # Comentado para evitar el error en producción
 import re
-from typing import List, Tuple, Optional, Dict
+from typing import Callable, List, Tuple, Optional, Dict, Union
 from django.conf import settings
-from ..models import Usuario, PerfilFacial, ReconocimientoFacial, DeteccionPlaca, Vehiculo
-from .supabase_storage import SupabaseStorageService
+from ..models import Usuario, PerfilFacial, ReconocimientoFacial, DeteccionPlaca, ReporteSeguridad
+from .supabase_storage import SupabaseStorageService, urls_variantes
 import logging
 from django.core.files.uploadedfile import InMemoryUploadedFile
 import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from .ai_client import get_ai_client
+from .circuit_breaker import Plazo, nuevo_plazo
+from .evidence_spool import EvidenciaPendiente, get_evidence_spool, modo_spool
+from .frame_dedupe import get_frame_deduper
+from .face_matcher import completar_coincidencia, get_face_matcher, parse_encoding, serializar_encoding
+from .image_prep import Frame, preparar_frame
+from .plate_index import get_plate_index, normalizar_placa
 logger = logging.getLogger(__name__)
 
 
+# Subidas de evidencia en paralelo con la inferencia (solo red, sin BD)
+_evidencia_executor = ThreadPoolExecutor(
+    max_workers=settings.AI_CLIENT_SETTINGS['UPLOAD_WORKERS'],
+    thread_name_prefix="ai-evidencia",
+)
+
+# Inferencia concurrente de los frames de una ráfaga
+_rafaga_executor = ThreadPoolExecutor(
+    max_workers=settings.AI_CLIENT_SETTINGS['RAFAGA_WORKERS'],
+    thread_name_prefix="ai-rafaga",
+)
+
+AVISO_SIN_EVIDENCIA = "Detección registrada sin imagen de evidencia: falló la subida a Storage"
+
+# Subida ya hecha (dict de upload_bytes), encolada para después o ninguna
+Evidencia = Union[Dict, EvidenciaPendiente, None]
+
+
+def _esperar_subida(storage_service: SupabaseStorageService, futuro: Future,
+                    plazo: Optional[Plazo] = None) -> Optional[Dict]:
+    """Si la subida no termina dentro del plazo del request, se registra sin evidencia"""
+    timeout = plazo.restante() if plazo is not None else settings.AI_CLIENT_SETTINGS['READ_TIMEOUT']
+    try:
+        return futuro.result(timeout=timeout)
+    except Exception as e:
+        logger.error(f"Subida de evidencia no completada: {e}")
+        _descartar_evidencia(storage_service, futuro)
+        return None
+
+
+def _descartar_evidencia(storage_service: SupabaseStorageService, futuro: Future):
+    """Sin registro que la referencie, la evidencia subida (o por subir) se borra"""
+    if futuro.cancel():
+        return
+
+    def _borrar(f: Future):
+        try:
+            subida = f.result()
+        except Exception:
+            return
+        if subida:
+            borrar_evidencia_sin_uso(storage_service, subida["file_path"], subida.get("variantes"))
+
+    futuro.add_done_callback(_borrar)
+
+
+def evidencia_referenciada(file_path: str) -> bool:
+    """Con claves por contenido, la misma imagen puede ser la evidencia de varios registros"""
+    return any(
+        modelo.objects.filter(imagen_path=file_path).exists()
+        for modelo in (ReconocimientoFacial, DeteccionPlaca, PerfilFacial)
+    )
+
+
+def borrar_evidencia_sin_uso(storage_service: SupabaseStorageService, file_path: str,
+                             variantes: Optional[Dict[str, str]] = None) -> bool:
+    """
+    Borra la imagen y sus variantes solo si ningún registro la referencia (la
+    misma imagen produce las mismas variantes, así que basta con la principal)
+    """
+    if evidencia_referenciada(file_path):
+        logger.info(f"Evidencia {file_path} conservada: otro registro la referencia")
+        return False
+    return storage_service.delete_files(sorted({file_path, *(variantes or {}).values()}))
+
+
+# ---------------------------------------------------------------------
+# Registro en BD del resultado (compartido por las rutas sync y async)
+# ---------------------------------------------------------------------
+def _confianza(valor) -> Decimal:
+    """Confianza con la precisión de la columna (5,2)"""
+    try:
+        return Decimal(str(round(float(valor or 0), 2)))
+    except (TypeError, ValueError, InvalidOperation):
+        return Decimal("0")
+
+
+def _evidencia(subida: Evidencia) -> Tuple[Optional[str], Optional[str], Optional[Dict[str, str]]]:
+    """(imagen_path, imagen_url, imagen_variantes) de una subida ya hecha"""
+    if not subida or isinstance(subida, EvidenciaPendiente):
+        return None, None, None
+    return subida.get("file_path"), subida.get("public_url"), subida.get("variantes") or None
+
+
+def _estado_evidencia(resultado: Dict, subida: Evidencia, modelo: str) -> Dict:
+    """La inferencia vale aunque falle la subida: se informa como éxito parcial"""
+    if isinstance(subida, EvidenciaPendiente):
+        # imagen_path/imagen_url los completa el worker de evidence_spool
+        get_evidence_spool().encolar_al_confirmar(modelo, resultado["id"], subida)
+        resultado["evidence_saved"] = False
+        resultado["evidence_queued"] = True
+        return resultado
+    resultado["evidence_saved"] = subida is not None
+    if subida is None:
+        resultado["warning"] = AVISO_SIN_EVIDENCIA
+    return resultado
+
+
+def _iniciar_subida(storage_service: SupabaseStorageService, data: bytes, folder: str, prefix: str) -> Optional[Future]:
+    """Subida en paralelo con la inferencia; en modo spool no hay subida (se encola tras el registro)"""
+    if modo_spool():
+        return None
+    return _evidencia_executor.submit(storage_service.upload_bytes, data, folder, prefix)
+
+
+def misma_decision(previo: Dict, ai_result: Dict) -> bool:
+    """
+    ¿La inferencia del frame actual confirma la decisión registrada para un
+    frame parecido (frame_dedupe)? Placas: el mismo texto leído. Rostros: el
+    mismo resultado de coincidencia y el mismo usuario. Si el FaceMatcher aún
+    no puede decidir, no se confirma y el frame se registra completo.
+    """
+    if "plate" in previo:
+        return normalizar_placa(ai_result.get("plate_text")) == normalizar_placa(previo.get("plate"))
+    ai_result = completar_coincidencia(ai_result)
+    if "is_match" not in ai_result:
+        return False
+    es_residente = bool(ai_result["is_match"])
+    if es_residente != bool(previo.get("is_resident")):
+        return False
+    return not es_residente or ai_result.get("user_id") == previo.get("user_id")
+
+
+def _subir_o_encolar(storage_service: SupabaseStorageService, data: bytes, folder: str, prefix: str) -> Evidencia:
+    """Subida síncrona de la evidencia (ráfagas) o, en modo spool, su entrada en la cola"""
+    if modo_spool():
+        return EvidenciaPendiente(data, folder, prefix)
+    return storage_service.upload_bytes(data, folder, prefix)
+
+
+@transaction.atomic
+def registrar_reconocimiento(ai_result: Dict, subida: Evidencia, camera_location: str) -> Dict:
+    """Crea el ReconocimientoFacial y, si no es residente, el reporte de intruso"""
+    ai_result = completar_coincidencia(ai_result)
+    is_resident = bool(ai_result.get("is_match", False))
+    confidence = ai_result.get("confidence", 0.0)
+    user_id = ai_result.get("user_id") if is_resident else None
+    image_path, image_url, variantes = _evidencia(subida)
+
+    usuario = Usuario.objects.filter(pk=user_id).first() if user_id else None
+
+    reconocimiento = ReconocimientoFacial.objects.create(
+        codigo_usuario=usuario,
+        imagen_path=image_path,
+        imagen_url=image_url,
+        imagen_variantes=variantes,
+        es_residente=is_resident,
+        confianza=_confianza(confidence),
+        ubicacion_camara=camera_location,
+    )
+
+    if not is_resident:
+        ReporteSeguridad.objects.create(
+            tipo_evento='intruso_detectado',
+            reconocimiento_facial=reconocimiento,
+            descripcion=f"Persona no identificada detectada en {camera_location}",
+            nivel_alerta='alto'
+        )
+
+    return _estado_evidencia({
+        "success": True,
+        "id": reconocimiento.id,
+        "is_resident": is_resident,
+        "confidence": confidence,
+        "user_id": user_id,
+        "camera_location": camera_location,
+        "image_url": image_url,
+        "image_variants": urls_variantes(variantes),
+        "user_name": usuario.nombre if usuario else None
+    }, subida, "reconocimiento_facial")
+
+
+@transaction.atomic
+def registrar_deteccion_placa(ai_result: Dict, subida: Evidencia, camera_location: str,
+                              access_type: str) -> Dict:
+    """Crea la DeteccionPlaca y, si la placa no está autorizada, el reporte correspondiente"""
+    plate_text = ai_result.get("plate_text", "") or ""
+    confidence = ai_result.get("confidence", 0.0)
+    image_path, image_url, variantes = _evidencia(subida)
+
+    # Verificar si la placa está autorizada (índice en memoria, tolerante a errores de OCR)
+    coincidencia = get_plate_index().buscar(plate_text)
+    placa = coincidencia.placa if coincidencia else None
+    is_authorized = placa is not None
+
+    deteccion = DeteccionPlaca.objects.create(
+        placa_detectada=plate_text,
+        confianza=_confianza(confidence),
+        imagen_path=image_path,
+        imagen_url=image_url,
+        imagen_variantes=variantes,
+        ubicacion_camara=camera_location,
+        tipo_acceso=access_type,
+        es_autorizado=is_authorized,
+        vehiculo_id=placa.vehiculo_id if placa else None
+    )
+
+    if plate_text and not is_authorized:
+        ReporteSeguridad.objects.create(
+            tipo_evento='placa_no_autorizada',
+            deteccion_placa=deteccion,
+            descripcion=f"Placa no autorizada detectada: {plate_text} en {camera_location}",
+            nivel_alerta='medio'
+        )
+
+    return _estado_evidencia({
+        "success": True,
+        "id": deteccion.id,
+        "plate": plate_text,
+        "confidence": confidence,
+        "is_authorized": is_authorized,
+        "match_confidence": coincidencia.confianza if coincidencia else None,
+        "camera_location": camera_location,
+        "access_type": access_type,
+        "image_url": image_url,
+        "image_variants": urls_variantes(variantes),
+        "vehicle_info": {
+            "id": placa.vehiculo_id,
+            "placa": placa.nro_placa,
+            "descripcion": placa.descripcion
+        } if placa else None
+    }, subida, "deteccion_placa")
+
+
+def _registrar_o_descartar(storage_service: SupabaseStorageService, registrar: Callable, ai_result: Dict,
+                           subida: Evidencia, *args) -> Dict:
+    """Si el registro en BD falla, la evidencia recién subida queda sin referencia: se borra"""
+    try:
+        return registrar(ai_result, subida, *args)
+    except Exception:
+        if isinstance(subida, dict):
+            borrar_evidencia_sin_uso(storage_service, subida["file_path"], subida.get("variantes"))
+        raise
+
+
+# ---------------------------------------------------------------------
+# Ráfagas: varios frames de un mismo evento de cámara -> un solo registro
+# ---------------------------------------------------------------------
+def leer_frames(frames) -> List[Frame]:
+    """Lee y prepara (image_prep) los frames; la decodificación corre en paralelo"""
+    crudos = []
+    for f in frames:
+        f.seek(0)
+        crudos.append((f.name, f.read(), f.content_type))
+    return list(_rafaga_executor.map(lambda frame: preparar_frame(*frame), crudos))
+
+
+def _inferir_frames(ai_client, endpoint: str, frames: List[Frame],
+                    plazo: Optional[Plazo] = None) -> List[Tuple[int, Dict]]:
+    """Una llamada por frame, en paralelo; devuelve (índice, resultado) de los que respondieron"""
+    def _inferir(item):
+        idx, (nombre, data, content_type) = item
+        try:
+            response = ai_client.post(endpoint, plazo=plazo, files={'image': (nombre, data, content_type)})
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error conectando con microservicio (frame {idx}): {e}")
+            return None
+        if response.status_code != 200:
+            logger.error(f"Error del microservicio (frame {idx}): {response.status_code} - {response.text}")
+            return None
+        return idx, response.json()
+
+    return [r for r in _rafaga_executor.map(_inferir, enumerate(frames)) if r is not None]
+
+
+def _conf(resultado: Tuple[int, Dict]) -> float:
+    try:
+        return float(resultado[1].get("confidence") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def mejor_rostro(resultados: List[Tuple[int, Dict]]) -> Optional[Tuple[int, Dict]]:
+    """Si algún frame coincide con un residente, gana la coincidencia más confiable"""
+    resultados = [(idx, completar_coincidencia(r)) for idx, r in resultados]
+    coincidencias = [r for r in resultados if r[1].get("is_match")]
+    return max(coincidencias or resultados, key=_conf, default=None)
+
+
+def mejor_placa(resultados: List[Tuple[int, Dict]]) -> Optional[Tuple[int, Dict]]:
+    """Se prefieren los frames con texto de placa y, entre ellos, los que coinciden con un vehículo activo"""
+    con_texto = [r for r in resultados if r[1].get("plate_text")]
+    if not con_texto:
+        return max(resultados, key=_conf, default=None)
+    indice = get_plate_index()
+
+    def _puntaje(resultado):
+        coincidencia = indice.buscar(resultado[1]["plate_text"])
+        return (coincidencia.confianza if coincidencia else 0.0, _conf(resultado))
+
+    return max(con_texto, key=_puntaje)
+
+
+def resumen_rafaga(resultado: Dict, idx: int, total: int, respondidos: int, guardar_evidencia: bool) -> Dict:
+    resultado.update({"frames": total, "frames_ok": respondidos, "frame_index": idx})
+    if not guardar_evidencia:
+        resultado.pop("warning", None)
+    return resultado
+
+
 class FacialRecognitionService:
     """Servicio para reconocimiento facial usando el microservicio de IA"""
 
-    def __init__(self):
+    def __init__(self, storage_service: Optional[SupabaseStorageService] = None):
         self.tolerance = settings.AI_IMAGE_SETTINGS.get('FACE_TOLERANCE', 0.6)
-        self.storage_service = SupabaseStorageService()
-        self.ai_microservice_url = settings.AI_MICROSERVICE_URL
+        self.storage_service = storage_service or SupabaseStorageService()
+        self.ai_client = get_ai_client()
 
     def process_facial_recognition(self, image_file: InMemoryUploadedFile) -> Dict:
         """
@@ -35,10 +345,9 @@ class FacialRecognitionService:
             files = {'image': (image_file.name, image_file.read(), image_file.content_type)}
 
             # Llamar al microservicio
-            response = requests.post(
-                f"{self.ai_microservice_url}/facial-recognition/",
-                files=files,
-                timeout=30
+            response = self.ai_client.post(
+                "/facial-recognition/",
+                files=files
             )
 
             if response.status_code == 200:
@@ -55,9 +364,8 @@ class FacialRecognitionService:
             return {"success": False, "error": "Error interno en reconocimiento facial"}
 
     def load_known_faces(self):
-        """Método mantenido para compatibilidad"""
-        # Este método ahora se maneja en el microservicio
-        pass
+        """Recarga la matriz de encodings activos del FaceMatcher del proceso"""
+        get_face_matcher().cargar()
 
     def register_face(self, user_id: int, image_file: InMemoryUploadedFile) -> Dict:
         """
@@ -67,11 +375,10 @@ class FacialRecognitionService:
             files = {'image': (image_file.name, image_file.read(), image_file.content_type)}
             data = {'user_id': user_id}
 
-            response = requests.post(
-                f"{self.ai_microservice_url}/register-face/",
+            response = self.ai_client.post(
+                "/register-face/",
                 files=files,
-                data=data,
-                timeout=30
+                data=data
             )
 
             if response.status_code == 200:
@@ -84,68 +391,103 @@ class FacialRecognitionService:
             logger.error(f"Error registrando cara: {str(e)}")
             return {"success": False, "error": "Error interno registrando rostro"}
 
-    def recognize_face_from_file(self, image_file: InMemoryUploadedFile, camera_location: str = "Principal") -> Dict:
+    def register_face_from_file(self, user_id: int, image_file: InMemoryUploadedFile) -> bool:
         """
-        Reconoce una cara desde un archivo y la procesa completamente
+        Obtiene el encoding del rostro del microservicio y crea (o reactiva) el
+        PerfilFacial del usuario con su imagen. El FaceMatcher se actualiza por señal.
         """
+        subida_futura = None
         try:
-            # Resetear el puntero del archivo al inicio
             image_file.seek(0)
+            # Reducida a MAX_SIZE una sola vez: el mismo buffer va a la IA y a Storage
+            nombre, data, content_type = preparar_frame(image_file.name, image_file.read(), image_file.content_type)
+            self.ai_client.verificar_disponible()
+            subida_futura = _evidencia_executor.submit(
+                self.storage_service.upload_bytes, data, "facial_profiles", "profile"
+            )
 
-            # Llamar al microservicio para reconocimiento
-            files = {'image': (image_file.name, image_file.read(), image_file.content_type)}
+            response = self.ai_client.post(
+                "/register-face/",
+                files={'image': (nombre, data, content_type)},
+                data={'user_id': user_id}
+            )
+            if response.status_code != 200:
+                logger.error(f"Error registrando cara: {response.status_code} - {response.text}")
+                return False
+
+            ai_result = response.json()
+            encoding = parse_encoding(ai_result.get("encoding", ai_result.get("embedding")))
+            if encoding is None or not encoding.size:
+                logger.warning(f"El microservicio no devolvió encoding para el usuario {user_id}")
+                return False
+
+            image_path, image_url, variantes = _evidencia(_esperar_subida(self.storage_service, subida_futura))
+            anterior = PerfilFacial.objects.filter(codigo_usuario_id=user_id) \
+                .values_list("imagen_path", "imagen_variantes").first()
+            PerfilFacial.objects.update_or_create(
+                codigo_usuario_id=user_id,
+                defaults={
+                    "encoding_facial": serializar_encoding(encoding),
+                    "imagen_path": image_path,
+                    "imagen_url": image_url,
+                    "imagen_variantes": variantes,
+                    "activo": True,
+                },
+            )
+            subida_futura = None
+            if anterior and anterior[0] and anterior[0] != image_path:
+                borrar_evidencia_sin_uso(self.storage_service, *anterior)
+            return True
 
-            response = requests.post(
-                f"{self.ai_microservice_url}/facial-recognition/",
-                files=files,
-                timeout=30
+        except Exception as e:
+            logger.error(f"Error registrando perfil facial: {str(e)}")
+            return False
+        finally:
+            if subida_futura is not None:
+                _descartar_evidencia(self.storage_service, subida_futura)
+
+    def recognize_face_from_file(self, image_file: InMemoryUploadedFile, camera_location: str = "Principal",
+                                 previo: Optional[Dict] = None) -> Dict:
+        """
+        Reconoce una cara desde un archivo y la procesa completamente. Con
+        previo (decisión de un frame parecido, ver frame_dedupe), si la
+        inferencia la confirma se devuelve esa sin subir ni registrar nada
+        """
+        subida_futura = None
+        try:
+            # Un único buffer, reducido a MAX_SIZE, para la inferencia y para la evidencia
+            image_file.seek(0)
+            nombre, data, content_type = preparar_frame(image_file.name, image_file.read(), image_file.content_type)
+
+            # Con el circuito abierto se falla antes de subir nada
+            plazo = nuevo_plazo()
+            self.ai_client.verificar_disponible()
+
+            # La evidencia se sube mientras el microservicio procesa la imagen
+            # (en modo spool se encola tras el registro y el request no espera a Storage),
+            # salvo con un frame parecido reciente: si se confirma su decisión no hace falta
+            if previo is None:
+                subida_futura = _iniciar_subida(self.storage_service, data, "facial_recognitions", "face")
+
+            response = self.ai_client.post(
+                "/facial-recognition/",
+                plazo=plazo,
+                files={'image': (nombre, data, content_type)}
             )
 
             if response.status_code == 200:
                 ai_result = response.json()
-
-                # Resetear archivo para guardado
-                image_file.seek(0)
-
-                # Guardar imagen en Supabase
-                image_url = self.storage_service.upload_file(
-                    image_file,
-                    folder="facial_recognitions"
-                )
-
-                # Procesar resultado y crear registro en BD
-                is_resident = ai_result.get("is_match", False)
-                confidence = ai_result.get("confidence", 0.0)
-                user_id = ai_result.get("user_id") if is_resident else None
-
-                # Crear registro en base de datos
-                from ..models import ReconocimientoFacial, Usuario
-
-                usuario = None
-                if user_id:
-                    try:
-                        usuario = Usuario.objects.get(pk=user_id)
-                    except Usuario.DoesNotExist:
-                        pass
-
-                reconocimiento = ReconocimientoFacial.objects.create(
-                    imagen_url=image_url,
-                    es_residente=is_resident,
-                    confianza=confidence,
-                    ubicacion_camara=camera_location,
-                    usuario=usuario
-                )
-
-                return {
-                    "success": True,
-                    "id": reconocimiento.id,
-                    "is_resident": is_resident,
-                    "confidence": confidence,
-                    "user_id": user_id,
-                    "camera_location": camera_location,
-                    "image_url": image_url,
-                    "user_name": usuario.nombre if usuario else None
-                }
+                if previo is not None:
+                    if misma_decision(previo, ai_result):
+                        return get_frame_deduper().suprimir(previo)
+                    subida_futura = _iniciar_subida(self.storage_service, data, "facial_recognitions", "face")
+                if subida_futura is None:
+                    subida = EvidenciaPendiente(data, "facial_recognitions", "face")
+                else:
+                    subida = _esperar_subida(self.storage_service, subida_futura, plazo)
+                resultado = registrar_reconocimiento(ai_result, subida, camera_location)
+                subida_futura = None
+                return resultado
             else:
                 logger.error(f"Error del microservicio: {response.status_code} - {response.text}")
                 return {"success": False, "error": "Error en el servicio de reconocimiento facial"}
@@ -156,14 +498,44 @@ class FacialRecognitionService:
         except Exception as e:
             logger.error(f"Error procesando reconocimiento facial completo: {str(e)}")
             return {"success": False, "error": "Error interno en reconocimiento facial"}
+        finally:
+            if subida_futura is not None:
+                _descartar_evidencia(self.storage_service, subida_futura)
+
+    def recognize_face_burst(self, frames, camera_location: str = "Principal",
+                             guardar_evidencia: bool = True) -> Dict:
+        """
+        Reconoce una ráfaga de frames del mismo evento: infiere todos en
+        paralelo y registra solo el mejor (una fila y, opcionalmente, una imagen)
+        """
+        try:
+            datos = leer_frames(frames)
+            resultados = _inferir_frames(self.ai_client, "/facial-recognition/", datos, nuevo_plazo())
+            mejor = mejor_rostro(resultados)
+            if mejor is None:
+                return {"success": False, "error": "Servicio de reconocimiento facial no disponible"}
+
+            idx, ai_result = mejor
+            subida = None
+            if guardar_evidencia:
+                _, data, _ = datos[idx]
+                subida = _subir_o_encolar(self.storage_service, data, "facial_recognitions", "face")
+            resultado = _registrar_o_descartar(
+                self.storage_service, registrar_reconocimiento, ai_result, subida, camera_location,
+            )
+            return resumen_rafaga(resultado, idx, len(datos), len(resultados), guardar_evidencia)
+
+        except Exception as e:
+            logger.error(f"Error procesando ráfaga de reconocimiento facial: {str(e)}")
+            return {"success": False, "error": "Error interno en reconocimiento facial"}
 
 
 class PlateDetectionService:
     """Servicio para detección de placas usando el microservicio de IA"""
 
-    def __init__(self):
-        self.storage_service = SupabaseStorageService()
-        self.ai_microservice_url = settings.AI_MICROSERVICE_URL
+    def __init__(self, storage_service: Optional[SupabaseStorageService] = None):
+        self.storage_service = storage_service or SupabaseStorageService()
+        self.ai_client = get_ai_client()
 
     def detect_plate(self, image_file: InMemoryUploadedFile) -> Dict:
         """
@@ -172,10 +544,9 @@ class PlateDetectionService:
         try:
             files = {'image': (image_file.name, image_file.read(), image_file.content_type)}
 
-            response = requests.post(
-                f"{self.ai_microservice_url}/plate-detection/",
-                files=files,
-                timeout=30
+            response = self.ai_client.post(
+                "/plate-detection/",
+                files=files
             )
 
             if response.status_code == 200:
@@ -203,24 +574,29 @@ class PlateDetectionService:
                 return detection_result
 
             # Guardar imagen en Supabase
-            image_url = self.storage_service.upload_file(
+            subida = self.storage_service.upload_django_file(
                 image_file,
-                folder="plate_detections"
+                folder="plate_detections",
+                prefix="plate"
             )
+            image_url = subida["public_url"] if subida else None
 
             # Crear registro en base de datos
             deteccion = DeteccionPlaca.objects.create(
-                texto_placa=detection_result.get("plate_text", ""),
-                confianza=detection_result.get("confidence", 0.0),
+                placa_detectada=detection_result.get("plate_text", ""),
+                confianza=_confianza(detection_result.get("confidence")),
+                imagen_path=subida["file_path"] if subida else None,
                 imagen_url=image_url,
+                imagen_variantes=subida["variantes"] if subida else None,
+                tipo_acceso="entrada",
                 vehiculo_id=vehicle_id
             )
 
             return {
                 "success": True,
                 "detection_id": deteccion.id,
-                "plate_text": deteccion.texto_placa,
-                "confidence": deteccion.confianza,
+                "plate_text": deteccion.placa_detectada,
+                "confidence": float(deteccion.confianza),
                 "image_url": image_url
             }
 
@@ -236,76 +612,48 @@ class PlateDetectionService:
         pattern = r'^\d{3,4}-[A-Z]{3}$'
         return bool(re.match(pattern, plate_text.upper()))
 
-    def detect_plate_from_file(self, image_file: InMemoryUploadedFile, camera_location: str = "Estacionamiento", access_type: str = "entrada") -> Dict:
+    def detect_plate_from_file(self, image_file: InMemoryUploadedFile, camera_location: str = "Estacionamiento", access_type: str = "entrada",
+                               previo: Optional[Dict] = None) -> Dict:
         """
-        Detecta placa desde un archivo y la procesa completamente
+        Detecta placa desde un archivo y la procesa completamente. Con previo
+        (decisión de un frame parecido, ver frame_dedupe), si se lee la misma
+        placa se devuelve esa decisión sin subir ni registrar nada
         """
+        subida_futura = None
         try:
-            # Resetear el puntero del archivo al inicio
+            # Un único buffer, reducido a MAX_SIZE, para la inferencia y para la evidencia
             image_file.seek(0)
-
-            # Llamar al microservicio para detección
-            files = {'image': (image_file.name, image_file.read(), image_file.content_type)}
-
-            response = requests.post(
-                f"{self.ai_microservice_url}/plate-detection/",
-                files=files,
-                timeout=30
+            nombre, data, content_type = preparar_frame(image_file.name, image_file.read(), image_file.content_type)
+
+            # Con el circuito abierto se falla antes de subir nada
+            plazo = nuevo_plazo()
+            self.ai_client.verificar_disponible()
+
+            # La evidencia se sube mientras el microservicio procesa la imagen
+            # (en modo spool se encola tras el registro y el request no espera a Storage),
+            # salvo con un frame parecido reciente: si se confirma su decisión no hace falta
+            if previo is None:
+                subida_futura = _iniciar_subida(self.storage_service, data, "plate_detections", "plate")
+
+            response = self.ai_client.post(
+                "/plate-detection/",
+                plazo=plazo,
+                files={'image': (nombre, data, content_type)}
             )
 
             if response.status_code == 200:
                 ai_result = response.json()
-
-                # Resetear archivo para guardado
-                image_file.seek(0)
-
-                # Guardar imagen en Supabase
-                image_url = self.storage_service.upload_file(
-                    image_file,
-                    folder="plate_detections"
-                )
-
-                # Procesar resultado
-                plate_text = ai_result.get("plate_text", "")
-                confidence = ai_result.get("confidence", 0.0)
-
-                # Verificar si la placa está autorizada
-                is_authorized = False
-                vehiculo = None
-                if plate_text:
-                    try:
-                        vehiculo = Vehiculo.objects.get(placa=plate_text, activo=True)
-                        is_authorized = True
-                    except Vehiculo.DoesNotExist:
-                        pass
-
-                # Crear registro en base de datos
-                deteccion = DeteccionPlaca.objects.create(
-                    texto_placa=plate_text,
-                    confianza=confidence,
-                    imagen_url=image_url,
-                    ubicacion_camara=camera_location,
-                    tipo_acceso=access_type,
-                    es_autorizado=is_authorized,
-                    vehiculo=vehiculo
-                )
-
-                return {
-                    "success": True,
-                    "id": deteccion.id,
-                    "plate": plate_text,
-                    "confidence": confidence,
-                    "is_authorized": is_authorized,
-                    "camera_location": camera_location,
-                    "access_type": access_type,
-                    "image_url": image_url,
-                    "vehicle_info": {
-                        "id": vehiculo.id,
-                        "marca": vehiculo.marca,
-                        "modelo": vehiculo.modelo,
-                        "color": vehiculo.color
-                    } if vehiculo else None
-                }
+                if previo is not None:
+                    if misma_decision(previo, ai_result):
+                        return get_frame_deduper().suprimir(previo)
+                    subida_futura = _iniciar_subida(self.storage_service, data, "plate_detections", "plate")
+                if subida_futura is None:
+                    subida = EvidenciaPendiente(data, "plate_detections", "plate")
+                else:
+                    subida = _esperar_subida(self.storage_service, subida_futura, plazo)
+                resultado = registrar_deteccion_placa(ai_result, subida, camera_location, access_type)
+                subida_futura = None
+                return resultado
             else:
                 logger.error(f"Error del microservicio: {response.status_code} - {response.text}")
                 return {"success": False, "error": "Error en el servicio de detección de placas"}
@@ -316,3 +664,30 @@ class PlateDetectionService:
         except Exception as e:
             logger.error(f"Error procesando detección de placa completa: {str(e)}")
             return {"success": False, "error": "Error interno en detección de placas"}
+        finally:
+            if subida_futura is not None:
+                _descartar_evidencia(self.storage_service, subida_futura)
+
+    def detect_plate_burst(self, frames, camera_location: str = "Estacionamiento",
+                           access_type: str = "entrada", guardar_evidencia: bool = True) -> Dict:
+        """Detecta placa en una ráfaga de frames y registra solo la mejor lectura"""
+        try:
+            datos = leer_frames(frames)
+            resultados = _inferir_frames(self.ai_client, "/plate-detection/", datos, nuevo_plazo())
+            mejor = mejor_placa(resultados)
+            if mejor is None:
+                return {"success": False, "error": "Servicio de detección de placas no disponible"}
+
+            idx, ai_result = mejor
+            subida = None
+            if guardar_evidencia:
+                _, data, _ = datos[idx]
+                subida = _subir_o_encolar(self.storage_service, data, "plate_detections", "plate")
+            resultado = _registrar_o_descartar(
+                self.storage_service, registrar_deteccion_placa, ai_result, subida, camera_location, access_type,
+            )
+            return resumen_rafaga(resultado, idx, len(datos), len(resultados), guardar_evidencia)
+
+        except Exception as e:
+            logger.error(f"Error procesando ráfaga de placas: {str(e)}")
+            return {"success": False, "error": "Error interno en detección de placas"}
@@ -0,0 +1,92 @@
+# api/services/audiencias.py
+"""
+Resolución de audiencias de comunicados (todos/copropietarios/inquilinos/personal).
+
+La pertenencia de cada rol a una audiencia y las variantes de "activo" que
+existen en Usuario.estado se calculan una vez y se guardan en caché, de modo
+que resolver destinatarios es un `IdRol IN (...) AND Estado IN (...)` sobre
+índices, sin regex ni comparaciones case-insensitive por fila.
+"""
+import re
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import QuerySet
+
+from ..models import Rol, Usuario
+
+# Palabras clave sobre Rol.descripcion (ajusta si tu taxonomía está en Rol.tipo)
+AUDIENCIAS_POR_ROL = {
+    "copropietarios": ["copropietario", "copropietarios"],
+    "inquilinos": ["inquilino", "inquilinos"],
+    "personal": ["personal", "guardia", "seguridad", "admin", "administrador"],
+}
+ESTADOS_ACTIVOS = ("activo", "activa")
+
+CACHE_KEY = "audiencias:mapa"
+
+
+def _calcular_mapa() -> Dict:
+    """Recorre Rol (tabla pequeña) y los valores distintos de Usuario.estado"""
+    patrones = {
+        kind: re.compile("|".join(nombres), re.IGNORECASE)
+        for kind, nombres in AUDIENCIAS_POR_ROL.items()
+    }
+    roles: Dict[str, List[int]] = {kind: [] for kind in AUDIENCIAS_POR_ROL}
+    for rol_id, descripcion in Rol.objects.values_list("id", "descripcion"):
+        for kind, patron in patrones.items():
+            if descripcion and patron.search(descripcion):
+                roles[kind].append(rol_id)
+
+    estados = [
+        e for e in Usuario.objects.exclude(estado__isnull=True)
+        .values_list("estado", flat=True).distinct()
+        if e.lower() in ESTADOS_ACTIVOS
+    ]
+    return {"roles": roles, "estados": estados}
+
+
+def mapa_audiencias() -> Dict:
+    """{'roles': {audiencia: [rol_id, ...]}, 'estados': [variantes de activo]}"""
+    mapa = cache.get(CACHE_KEY)
+    if mapa is None:
+        mapa = _calcular_mapa()
+        cache.set(CACHE_KEY, mapa, settings.AVISOS_SETTINGS['AUDIENCIAS_CACHE_TTL'])
+    return mapa
+
+
+def invalidar_audiencias():
+    """Llamar tras escribir en Rol o Usuario (roles nuevos o variantes de estado)"""
+    cache.delete(CACHE_KEY)
+
+
+def usuarios_de_audiencia(kind: str, usuario_ids=None) -> QuerySet:
+    """Usuarios activos de la audiencia; queryset sin evaluar"""
+    mapa = mapa_audiencias()
+    base = Usuario.objects.filter(estado__in=mapa["estados"])
+    if kind == "todos":
+        return base
+    if kind == "usuarios":
+        return base.filter(codigo__in=(usuario_ids or []))
+
+    rol_ids = mapa["roles"].get(kind)
+    if not rol_ids:
+        return base.none()
+    return base.filter(idrol_id__in=rol_ids)
+
+
+def ids_de_audiencia(kind: str, usuario_ids=None) -> List[int]:
+    """Solo ids: no hace falta materializar Usuario para crear los envíos"""
+    return list(usuarios_de_audiencia(kind, usuario_ids).values_list("codigo", flat=True))
+
+
+def pertenece_a_audiencia(kind: str, idrol_id: Optional[int], estado: Optional[str]) -> bool:
+    """Comprueba la pertenencia con los datos del usuario ya leídos, sin otra consulta"""
+    mapa = mapa_audiencias()
+    if estado not in mapa["estados"]:
+        return False
+    if kind == "todos":
+        return True
+    return idrol_id in mapa["roles"].get(kind, ())
+
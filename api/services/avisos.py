@@ -1,42 +1,157 @@
 # api/services/avisos.py
-from typing import Iterable, Tuple
-from django.db import transaction
-from django.db.models import Q
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Dict, List, Tuple
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, Q, Value, When
 from django.utils import timezone
 from ..models import (
-    Usuario, Rol, Comunicados, Notificaciones, Envio, Bitacora
+    Usuario, Comunicados, Notificaciones, Envio, Bitacora, ComunicadoProgramado
 )
+from .audiencias import ids_de_audiencia
+from .bandeja import registrar_en_bandeja
+from .eventos import publicar_evento
+from .push_dispatch import PushDestino, PushResultado, get_dispatcher
+
+logger = logging.getLogger(__name__)
+
+# Worker de despacho: los push se envían fuera de la transacción y del request
+_dispatch_executor = ThreadPoolExecutor(
+    max_workers=settings.AVISOS_SETTINGS['DISPATCH_WORKERS'],
+    thread_name_prefix="avisos-push",
+)
+
 
 class PushService:
     """
-    Stub de notificaciones push. Aquí integrarías FCM/OneSignal.
+    Envío push puntual a un usuario a través del despachador configurado.
     Devuelve (ok, mensaje).
     """
     @staticmethod
     def send_push(usuario: Usuario, titulo: str, cuerpo: str) -> Tuple[bool, str]:
         try:
-            # TODO: integrar proveedor real (FCM/OneSignal)
-            return True, "ok"
+            # Sin fila en Envio: el 0 solo indexa el resultado y nunca llega a _guardar_resultados
+            destino = PushDestino(envio_id=0, usuario_id=usuario.codigo)
+            resultado = get_dispatcher().dispatch([destino], titulo, cuerpo)[0]
+            return resultado.ok, resultado.detalle
         except Exception as e:
             return False, str(e)
 
-def _usuarios_por_destinatario(kind: str, usuario_ids=None) -> Iterable[Usuario]:
-    base = Usuario.objects.filter(Q(estado__iexact="activo") | Q(estado__iexact="activa"))
-    if kind == "todos":
-        return base
-    if kind == "usuarios":
-        return base.filter(codigo__in=(usuario_ids or []))
-
-    # Filtrado por rol (ajusta si tu taxonomía está en Rol.tipo en lugar de descripcion)
-    rol_map = {
-        "copropietarios": ["copropietario", "copropietarios"],
-        "inquilinos": ["inquilino", "inquilinos"],
-        "personal": ["personal", "guardia", "seguridad", "admin", "administrador"],
-    }
-    nombres = rol_map.get(kind, [])
-    if not nombres:
-        return base.none()
-    return base.filter(idrol__descripcion__iregex="|".join(nombres))
+
+def _guardar_resultados(resultados: Dict[int, PushResultado]) -> Tuple[int, int]:
+    """Escribe el estado final de cada Envio con bulk_update. Devuelve (enviados, errores)."""
+    # Envio no tiene columna para el detalle: queda en el log para diagnosticar cada fallo
+    for envio_id, r in resultados.items():
+        if not r.ok:
+            logger.warning(f"Push del envío {envio_id} falló tras {r.intentos} intento(s): {r.detalle}")
+    lote = [Envio(id=envio_id, estado="enviado" if r.ok else "error") for envio_id, r in resultados.items()]
+    Envio.objects.bulk_update(lote, ["estado"], batch_size=settings.AVISOS_SETTINGS['BULK_BATCH_SIZE'])
+    enviados = sum(1 for r in resultados.values() if r.ok)
+    return enviados, len(lote) - enviados
+
+
+def _vencidos_hasta(momento: datetime) -> Q:
+    """Envíos cuya fecha/hora es anterior o igual a momento"""
+    return Q(fecha__lt=momento.date()) | Q(fecha=momento.date(), hora__lte=momento.time())
+
+
+def _reclamar(filtro: Q, limite: int) -> List[Tuple[int, int, int]]:
+    """
+    Reclama hasta `limite` envíos del filtro en una transacción corta con
+    FOR UPDATE SKIP LOCKED: pasan a 'enviando' con la fecha/hora del reclamo.
+    Devuelve (id, usuario, notificación) de cada uno.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        filas = list(
+            Envio.objects
+            .select_for_update(skip_locked=True)
+            .filter(filtro)
+            .order_by("fecha", "hora", "id")
+            .values_list("id", "codigo_usuario_id", "id_notific_id")[:limite]
+        )
+        if filas:
+            Envio.objects.filter(id__in=[envio_id for envio_id, _, _ in filas]).update(
+                estado="enviando", fecha=ahora.date(), hora=ahora.time(),
+            )
+    return filas
+
+
+def _despachar_envios(notif_id: int, titulo: str, contenido: str):
+    """
+    Despacha los push de una notificación y guarda los estados con bulk_update.
+    Corre en el worker, después del commit de la publicación, y reclama los
+    envíos 'pendiente' por lotes. Si el proceso muere antes, los que quedan
+    los recoge publicar_programados pasado PENDIENTE_VENCIDO_SEG.
+    """
+    batch_size = settings.AVISOS_SETTINGS['BULK_BATCH_SIZE']
+    try:
+        enviados = errores = 0
+        while True:
+            filas = _reclamar(Q(id_notific_id=notif_id, estado="pendiente"), batch_size)
+            if not filas:
+                break
+            destinos = [PushDestino(envio_id=envio_id, usuario_id=usuario_id) for envio_id, usuario_id, _ in filas]
+            ok, err = _guardar_resultados(get_dispatcher().dispatch(destinos, titulo, contenido))
+            enviados += ok
+            errores += err
+        if enviados or errores:
+            logger.info(f"Notificación {notif_id} despachada (env:{enviados}, err:{errores})")
+    except Exception:
+        logger.exception(f"Error despachando notificación {notif_id}")
+    finally:
+        close_old_connections()
+
+
+def encolar_despacho(notif_id: int, titulo: str, contenido: str):
+    """Entrega el despacho de una notificación al worker"""
+    _dispatch_executor.submit(_despachar_envios, notif_id, titulo, contenido)
+
+
+def _crear_envios(notif: Notificaciones, destinatario_ids: List[int], estado: str,
+                  inicio: datetime, ventana: timedelta = timedelta(0)) -> int:
+    """
+    Inserta los envíos de una notificación con bulk_create.
+    Si hay ventana, la fecha/hora de cada envío se reparte uniformemente en
+    [inicio, inicio + ventana) para que el despacho salga escalonado.
+    """
+    total = len(destinatario_ids)
+    paso = ventana / total if total and ventana else timedelta(0)
+    envios = []
+    for i, uid in enumerate(destinatario_ids):
+        momento = inicio + paso * i
+        envios.append(Envio(
+            codigo_usuario_id=uid,
+            id_notific=notif,
+            fecha=momento.date(),
+            hora=momento.time(),
+            estado=estado,
+        ))
+    Envio.objects.bulk_create(envios, batch_size=settings.AVISOS_SETTINGS['BULK_BATCH_SIZE'])
+    # La bandeja muestra el aviso desde la publicación, aunque el push salga escalonado
+    registrar_en_bandeja(notif, envios, inicio)
+    return total
+
+
+def _publicar_tiempo_real(comunicado: Comunicados, notif: Notificaciones, destinatario_ids: List[int]):
+    """Avisa a las consolas y apps conectadas por SSE (sale tras el commit)"""
+    publicar_evento("comunicados", {
+        "id": comunicado.id,
+        "titulo": comunicado.titulo,
+        "tipo": comunicado.tipo,
+        "fecha": comunicado.fecha,
+        "hora": comunicado.hora,
+    })
+    publicar_evento("envios", {
+        "notificacion": notif.id,
+        "titulo": notif.descripcion,
+        "tipo": notif.tipo,
+    }, usuarios=destinatario_ids)
+
 
 @transaction.atomic
 def publicar_comunicado_y_notificar(
@@ -64,31 +179,183 @@ def publicar_comunicado_y_notificar(
     notif = Notificaciones.objects.create(tipo="comunicado", descripcion=titulo)
 
     # 3) Resolver destinatarios
-    usuarios = list(_usuarios_por_destinatario(destinatarios, usuario_ids))
-    enviados, errores = 0, 0
+    destinatario_ids = ids_de_audiencia(destinatarios, usuario_ids)
 
-    # 4) Crear envíos y despachar push
-    for u in usuarios:
-        envio = Envio.objects.create(
-            codigo_usuario=u,
-            id_notific=notif,
-            fecha=timezone.now().date(),
-            hora=timezone.now().time(),
-            estado="pendiente",
-        )
-        ok, msg = PushService.send_push(u, titulo, contenido)
-        envio.estado = "enviado" if ok else "error"
-        envio.save(update_fields=["estado"])
-        enviados += 1 if ok else 0
-        errores  += 0 if ok else 1
+    # 4) Crear todos los envíos en un solo INSERT; el push sale después del commit
+    ahora = timezone.now()
+    # Liga notificación y comunicado: si el despacho inmediato se pierde, el worker saca de aquí el texto
+    ComunicadoProgramado.objects.create(
+        comunicado=comunicado,
+        notificacion=notif,
+        destinatarios=destinatarios,
+        usuario_ids=usuario_ids,
+        publicar_en=ahora,
+        estado="publicado",
+        fecha_publicado=ahora,
+    )
+    total = _crear_envios(notif, destinatario_ids, "pendiente", ahora)
+    if total:
+        transaction.on_commit(partial(encolar_despacho, notif.id, titulo, contenido))
+    _publicar_tiempo_real(comunicado, notif, destinatario_ids)
 
     # 5) Bitácora
     Bitacora.objects.create(
         codigo_usuario=admin,
-        accion=f"Publicó comunicado: {titulo} (dest:{destinatarios}, prio:{prioridad}, env:{enviados}, err:{errores})",
-        fecha=timezone.now().date(),
-        hora=timezone.now().time(),
+        accion=f"Publicó comunicado: {titulo} (dest:{destinatarios}, prio:{prioridad}, encolados:{total})",
+        fecha=ahora.date(),
+        hora=ahora.time(),
         ip="system",
     )
 
-    return comunicado, {"total": len(usuarios), "enviados": enviados, "errores": errores}
+    return comunicado, {"total": total, "encolados": total, "enviados": 0, "errores": 0}
+
+
+# ---------------------------------------------------------------------
+# Publicación programada
+# ---------------------------------------------------------------------
+@transaction.atomic
+def programar_comunicado(
+    admin: Usuario,
+    titulo: str,
+    contenido: str,
+    prioridad: str,
+    destinatarios: str,
+    publicar_en: datetime,    # datetime aware
+    usuario_ids=None,
+):
+    """Guarda el comunicado en estado 'programado'; lo publica el worker publicar_programados"""
+    local = timezone.localtime(publicar_en)
+    comunicado = Comunicados.objects.create(
+        tipo=prioridad,
+        fecha=local.date(),
+        hora=local.time(),
+        titulo=titulo,
+        contenido=contenido,
+        estado="programado",
+        codigo_usuario=admin,
+    )
+    programacion = ComunicadoProgramado.objects.create(
+        comunicado=comunicado,
+        destinatarios=destinatarios,
+        usuario_ids=usuario_ids,
+        publicar_en=publicar_en,
+    )
+
+    ahora = timezone.now()
+    Bitacora.objects.create(
+        codigo_usuario=admin,
+        accion=f"Programó comunicado: {titulo} para {local:%Y-%m-%d %H:%M} (dest:{destinatarios}, prio:{prioridad})",
+        fecha=ahora.date(),
+        hora=ahora.time(),
+        ip="system",
+    )
+    return comunicado, programacion
+
+
+def publicar_comunicados_vencidos(limite: int, ventana: timedelta, umbral: int) -> int:
+    """
+    Publica las programaciones vencidas. Cada programación se toma con
+    SELECT ... FOR UPDATE SKIP LOCKED, así varios workers no publican la misma.
+    Los envíos quedan en estado 'programado' y, si superan el umbral, repartidos
+    en la ventana de suavizado. Devuelve cuántos comunicados se publicaron.
+    """
+    publicados = 0
+    vistos: List[int] = []
+    for _ in range(limite):
+        with transaction.atomic():
+            prog = (
+                ComunicadoProgramado.objects
+                .select_for_update(skip_locked=True)
+                .select_related("comunicado")
+                .filter(estado="pendiente", publicar_en__lte=timezone.now())
+                .exclude(pk__in=vistos)
+                .order_by("publicar_en", "id")
+                .first()
+            )
+            if prog is None:
+                break
+            vistos.append(prog.pk)
+
+            comunicado = prog.comunicado
+            try:
+                with transaction.atomic():
+                    notif = Notificaciones.objects.create(tipo="comunicado", descripcion=comunicado.titulo)
+                    destinatario_ids = ids_de_audiencia(prog.destinatarios, prog.usuario_ids)
+                    ahora = timezone.now()
+                    total = _crear_envios(
+                        notif, destinatario_ids, "programado", ahora,
+                        ventana if len(destinatario_ids) > umbral else timedelta(0),
+                    )
+
+                    Comunicados.objects.filter(pk=comunicado.pk).update(estado="publicado")
+                    _publicar_tiempo_real(comunicado, notif, destinatario_ids)
+                    prog.notificacion = notif
+                    prog.estado = "publicado"
+                    prog.fecha_publicado = ahora
+                    prog.save(update_fields=["notificacion", "estado", "fecha_publicado"])
+
+                    Bitacora.objects.create(
+                        codigo_usuario_id=comunicado.codigo_usuario_id,
+                        accion=f"Publicó comunicado programado: {comunicado.titulo} (dest:{prog.destinatarios}, encolados:{total})",
+                        fecha=ahora.date(),
+                        hora=ahora.time(),
+                        ip="system",
+                    )
+                publicados += 1
+            except Exception:
+                logger.exception(f"Error publicando comunicado programado {prog.id}")
+                ComunicadoProgramado.objects.filter(pk=prog.pk).update(
+                    intentos=F("intentos") + 1,
+                    estado=Case(
+                        When(intentos__gte=settings.AVISOS_SETTINGS['MAX_INTENTOS_PROGRAMADO'] - 1, then=Value("error")),
+                        default=Value("pendiente"),
+                    ),
+                )
+    return publicados
+
+
+def _liberar_reclamos_vencidos(ahora: datetime) -> int:
+    """
+    Devuelve a 'programado' los envíos que un proceso caído dejó a medias:
+    'enviando' sin resultado y 'pendiente' que el despacho inmediato nunca tomó.
+    """
+    cfg = settings.AVISOS_SETTINGS
+    reclamo = ahora - timedelta(seconds=cfg['RECLAMO_VENCIDO_SEG'])
+    pendiente = ahora - timedelta(seconds=cfg['PENDIENTE_VENCIDO_SEG'])
+    liberados = Envio.objects.filter(
+        (_vencidos_hasta(reclamo) & Q(estado="enviando")) | (_vencidos_hasta(pendiente) & Q(estado="pendiente"))
+    ).update(estado="programado")
+    if liberados:
+        logger.warning(f"{liberados} envío(s) sin despachar vuelven a 'programado'")
+    return liberados
+
+
+def despachar_envios_programados(limite: int) -> Tuple[int, int]:
+    """
+    Despacha hasta `limite` envíos 'programado' cuya fecha/hora ya llegó.
+    Las filas se reclaman con _reclamar y el push sale después del commit, sin
+    locks abiertos durante reintentos y esperas. Antes se devuelven a la cola
+    los envíos abandonados (ver _liberar_reclamos_vencidos).
+    """
+    ahora = timezone.now()
+    _liberar_reclamos_vencidos(ahora)
+    filas = _reclamar(_vencidos_hasta(ahora) & Q(estado="programado"), limite)
+    if not filas:
+        return 0, 0
+
+    por_notif: Dict[int, List[PushDestino]] = defaultdict(list)
+    for envio_id, usuario_id, notif_id in filas:
+        por_notif[notif_id].append(PushDestino(envio_id=envio_id, usuario_id=usuario_id))
+
+    textos = {
+        p.notificacion_id: (p.comunicado.titulo, p.comunicado.contenido)
+        for p in ComunicadoProgramado.objects
+        .filter(notificacion_id__in=list(por_notif))
+        .select_related("comunicado")
+    }
+
+    resultados: Dict[int, PushResultado] = {}
+    for notif_id, destinos in por_notif.items():
+        titulo, contenido = textos.get(notif_id, ("", ""))
+        resultados.update(get_dispatcher().dispatch(destinos, titulo or "", contenido or ""))
+    return _guardar_resultados(resultados)
@@ -0,0 +1,98 @@
+# api/services/bandeja.py
+from collections import Counter, defaultdict
+from typing import Iterable, List, Sequence
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from ..models import BandejaNotificacion, ContadorNoLeidos, Envio, Notificaciones
+
+
+def _lotes(items: Sequence, size: int) -> Iterable[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _incrementar_no_leidos(usuario_ids: List[int]):
+    """Suma a cada usuario sus entradas nuevas (crea el contador si no existe)"""
+    batch_size = settings.AVISOS_SETTINGS['BULK_BATCH_SIZE']
+    cuentas = Counter(usuario_ids)
+    for lote in _lotes(list(cuentas), batch_size):
+        ContadorNoLeidos.objects.bulk_create(
+            [ContadorNoLeidos(usuario_id=uid, no_leidos=0) for uid in lote],
+            ignore_conflicts=True,
+        )
+        # Un UPDATE por cantidad distinta (casi siempre una sola: un envío por usuario)
+        por_cantidad = defaultdict(list)
+        for uid in lote:
+            por_cantidad[cuentas[uid]].append(uid)
+        for cantidad, uids in por_cantidad.items():
+            ContadorNoLeidos.objects.filter(usuario_id__in=uids).update(no_leidos=F("no_leidos") + cantidad)
+
+
+def registrar_en_bandeja(notif: Notificaciones, envios: List[Envio], fecha=None):
+    """
+    Crea las entradas de bandeja de los envíos recién insertados (deben tener id)
+    y actualiza los contadores de no leídos. Se llama dentro de la misma
+    transacción que crea los envíos.
+    """
+    if not envios:
+        return
+    fecha = fecha or timezone.now()
+    BandejaNotificacion.objects.bulk_create(
+        [
+            BandejaNotificacion(
+                usuario_id=e.codigo_usuario_id,
+                envio_id=e.id,
+                notificacion=notif,
+                titulo=notif.descripcion,
+                tipo=notif.tipo,
+                fecha=fecha,
+            )
+            for e in envios
+        ],
+        batch_size=settings.AVISOS_SETTINGS['BULK_BATCH_SIZE'],
+    )
+    _incrementar_no_leidos([e.codigo_usuario_id for e in envios])
+
+
+def contar_no_leidos(usuario_id: int) -> int:
+    """Lectura O(1) del contador por clave primaria"""
+    valor = (
+        ContadorNoLeidos.objects
+        .filter(usuario_id=usuario_id)
+        .values_list("no_leidos", flat=True)
+        .first()
+    )
+    return max(valor or 0, 0)
+
+
+@transaction.atomic
+def marcar_leido(usuario_id: int, entrada_id: int) -> bool:
+    actualizadas = (
+        BandejaNotificacion.objects
+        .filter(pk=entrada_id, usuario_id=usuario_id, leido=False)
+        .update(leido=True, fecha_lectura=timezone.now())
+    )
+    if actualizadas:
+        ContadorNoLeidos.objects.filter(usuario_id=usuario_id).update(
+            no_leidos=Greatest(F("no_leidos") - actualizadas, Value(0))
+        )
+    return bool(actualizadas)
+
+
+@transaction.atomic
+def marcar_todo_leido(usuario_id: int) -> int:
+    actualizadas = (
+        BandejaNotificacion.objects
+        .filter(usuario_id=usuario_id, leido=False)
+        .update(leido=True, fecha_lectura=timezone.now())
+    )
+    if actualizadas:
+        ContadorNoLeidos.objects.filter(usuario_id=usuario_id).update(
+            no_leidos=Greatest(F("no_leidos") - actualizadas, Value(0))
+        )
+    return actualizadas
@@ -0,0 +1,156 @@
+# api/services/circuit_breaker.py
+"""
+Circuit breaker y plazo por request para las llamadas al microservicio de IA.
+
+Tras BREAKER_FALLOS fallos seguidos (errores de conexión, timeouts, 5xx o
+respuestas más lentas que BREAKER_LENTITUD_SEG) el circuito se abre y las
+llamadas fallan al instante durante BREAKER_ESPERA_SEG, sin ocupar un worker
+esperando al timeout. Después deja pasar una sola llamada de prueba
+(semiabierto): si responde bien se cierra, si no vuelve a abrirse.
+
+Plazo acota lo que puede durar un request de detección completo (inferencia
+más subida de la evidencia), sea cual sea el timeout de cada llamada.
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class CircuitoAbiertoError(Exception):
+    """El microservicio se considera caído: no se intenta la llamada"""
+
+
+class Plazo:
+    """Tiempo restante de un request, para repartir entre sus llamadas"""
+
+    def __init__(self, segundos: float):
+        self.segundos = segundos
+        self.vence = time.monotonic() + segundos
+
+    def restante(self) -> float:
+        return max(0.0, self.vence - time.monotonic())
+
+    @property
+    def vencido(self) -> bool:
+        return self.restante() <= 0
+
+    def acotar(self, segundos: float) -> float:
+        """El menor entre un timeout propio y lo que queda del plazo"""
+        return min(segundos, self.restante())
+
+
+class CircuitBreaker:
+    """Estado compartido por todos los hilos (y event loops) del proceso"""
+
+    def __init__(self, nombre: str, fallos_para_abrir: int, lentitud_seg: float, espera_seg: float):
+        self.nombre = nombre
+        self.fallos_para_abrir = fallos_para_abrir
+        self.lentitud_seg = lentitud_seg
+        self.espera_seg = espera_seg
+        self._estado = CERRADO
+        self._fallos_seguidos = 0
+        self._abierto_en = 0.0
+        self._sonda_en = None  # inicio de la llamada de prueba en curso
+        self._rechazadas = 0
+        self._aperturas = 0
+        self._lock = threading.Lock()
+
+    def _sonda_vencida(self, ahora: float) -> bool:
+        # Una sonda que nunca volvió no puede bloquear el circuito para siempre
+        return self._sonda_en is None or ahora - self._sonda_en > self.espera_seg
+
+    def rechazaria(self) -> bool:
+        """¿Se rechazaría una llamada ahora? (sin reservar la sonda)"""
+        with self._lock:
+            ahora = time.monotonic()
+            if self._estado == ABIERTO:
+                return ahora - self._abierto_en < self.espera_seg
+            if self._estado == SEMIABIERTO:
+                return not self._sonda_vencida(ahora)
+            return False
+
+    def permitir(self):
+        """Reserva el paso para una llamada o lanza CircuitoAbiertoError"""
+        with self._lock:
+            ahora = time.monotonic()
+            if self._estado == CERRADO:
+                return
+            if self._estado == ABIERTO and ahora - self._abierto_en >= self.espera_seg:
+                self._estado = SEMIABIERTO
+                self._sonda_en = None
+            if self._estado == SEMIABIERTO and self._sonda_vencida(ahora):
+                self._sonda_en = ahora
+                return
+            self._rechazadas += 1
+        raise CircuitoAbiertoError(f"{self.nombre}: circuito abierto")
+
+    def registrar(self, segundos: float, ok: bool):
+        """Resultado de una llamada permitida; las lentas cuentan como fallo"""
+        lenta = segundos > self.lentitud_seg
+        with self._lock:
+            if ok and not lenta:
+                if self._estado != CERRADO:
+                    logger.info(f"{self.nombre}: circuito cerrado, el servicio respondió")
+                self._estado = CERRADO
+                self._fallos_seguidos = 0
+                self._sonda_en = None
+                return
+
+            self._fallos_seguidos += 1
+            if self._estado == SEMIABIERTO or self._fallos_seguidos >= self.fallos_para_abrir:
+                if self._estado != ABIERTO:
+                    self._aperturas += 1
+                    motivo = "respuesta lenta" if ok else "error"
+                    logger.warning(
+                        f"{self.nombre}: circuito abierto tras {self._fallos_seguidos} fallo(s) ({motivo}); "
+                        f"reintento en {self.espera_seg:.0f}s"
+                    )
+                self._estado = ABIERTO
+                self._abierto_en = time.monotonic()
+                self._sonda_en = None
+
+    def estado(self) -> Dict:
+        with self._lock:
+            reintento = None
+            if self._estado == ABIERTO:
+                reintento = round(max(0.0, self.espera_seg - (time.monotonic() - self._abierto_en)), 1)
+            return {
+                "estado": self._estado,
+                "fallos_seguidos": self._fallos_seguidos,
+                "aperturas": self._aperturas,
+                "rechazadas": self._rechazadas,
+                "reintento_en_seg": reintento,
+            }
+
+
+_breaker: Optional[CircuitBreaker] = None
+_breaker_lock = threading.Lock()
+
+
+def get_ai_breaker() -> CircuitBreaker:
+    """Breaker del microservicio de IA, compartido por el cliente sync y el async"""
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                cfg = settings.AI_CLIENT_SETTINGS
+                _breaker = CircuitBreaker(
+                    "microservicio IA",
+                    fallos_para_abrir=cfg['BREAKER_FALLOS'],
+                    lentitud_seg=cfg['BREAKER_LENTITUD_SEG'],
+                    espera_seg=cfg['BREAKER_ESPERA_SEG'],
+                )
+    return _breaker
+
+
+def nuevo_plazo() -> Plazo:
+    return Plazo(settings.AI_CLIENT_SETTINGS['PLAZO_SEG'])
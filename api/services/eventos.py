@@ -0,0 +1,214 @@
+# api/services/eventos.py
+"""
+Hub de eventos en tiempo real (SSE) para comunicados, envíos y alertas de seguridad.
+
+Cada proceso ASGI mantiene un EventHub con las suscripciones abiertas (una
+asyncio.Queue por conexión, sin hilos por cliente). Los eventos se publican a
+través de un backend intercambiable:
+- LocalBackend: entrega directa al hub del mismo proceso (desarrollo).
+- PostgresNotifyBackend: NOTIFY/LISTEN, para que todos los workers reciban
+  los eventos publicados desde cualquier proceso (web, workers, comandos).
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+import psycopg2
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CANALES = ("comunicados", "envios", "seguridad")
+
+# NOTIFY admite payloads de hasta 8000 bytes: las listas de usuarios se parten
+MAX_USUARIOS_POR_EVENTO = 500
+
+
+@dataclass(eq=False)
+class Suscripcion:
+    usuario_id: int
+    canales: Set[str]
+    queue: asyncio.Queue = field(repr=False)
+    cerrada: bool = False
+
+
+class EventHub:
+    """Enruta eventos a las suscripciones abiertas del proceso"""
+
+    def __init__(self):
+        self._por_canal: Dict[str, Set[Suscripcion]] = {c: set() for c in CANALES}
+        self._por_usuario: Dict[int, Set[Suscripcion]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._backend_iniciado = False
+        self._lock = threading.Lock()
+
+    @property
+    def total_suscripciones(self) -> int:
+        return sum(len(s) for s in self._por_usuario.values())
+
+    def subscribe(self, usuario_id: int, canales: Iterable[str]) -> Suscripcion:
+        """Se llama desde el event loop del servidor ASGI"""
+        self._loop = asyncio.get_running_loop()
+        self._iniciar_backend()
+        sub = Suscripcion(
+            usuario_id=usuario_id,
+            canales=set(canales) & set(CANALES),
+            queue=asyncio.Queue(maxsize=settings.EVENTOS_SETTINGS['QUEUE_MAX']),
+        )
+        for canal in sub.canales:
+            self._por_canal[canal].add(sub)
+        self._por_usuario.setdefault(usuario_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Suscripcion):
+        sub.cerrada = True
+        for canal in sub.canales:
+            self._por_canal[canal].discard(sub)
+        subs = self._por_usuario.get(sub.usuario_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                self._por_usuario.pop(sub.usuario_id, None)
+
+    def deliver_threadsafe(self, evento: dict):
+        """Entrega un evento desde cualquier hilo; sin loop activo no hay suscriptores"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._entregar, evento)
+
+    def _entregar(self, evento: dict):
+        canal = evento.get("canal")
+        if canal not in self._por_canal:
+            return
+        usuarios = evento.get("usuarios")
+        if usuarios is not None:
+            destinos = [
+                sub for uid in usuarios for sub in self._por_usuario.get(uid, ())
+                if canal in sub.canales
+            ]
+        else:
+            destinos = list(self._por_canal[canal])
+
+        mensaje = {"canal": canal, "datos": evento.get("datos", {})}
+        for sub in destinos:
+            try:
+                sub.queue.put_nowait(mensaje)
+            except asyncio.QueueFull:
+                # Cliente que no consume: se le cierra para que reconecte
+                logger.warning(f"Suscripción SSE saturada (usuario {sub.usuario_id}), se cierra")
+                self.unsubscribe(sub)
+                _vaciar_y_cerrar(sub.queue)
+
+    def _iniciar_backend(self):
+        if self._backend_iniciado:
+            return
+        with self._lock:
+            if not self._backend_iniciado:
+                get_backend().start(self)
+                self._backend_iniciado = True
+
+
+def _vaciar_y_cerrar(queue: asyncio.Queue):
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(None)
+
+
+# ---------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------
+class LocalBackend:
+    """Entrega en el mismo proceso; suficiente con un solo worker"""
+
+    def start(self, hub: EventHub):
+        pass
+
+    def publish(self, evento: dict):
+        hub.deliver_threadsafe(evento)
+
+
+class PostgresNotifyBackend:
+    """
+    Publica con pg_notify y escucha con LISTEN en un hilo dedicado por proceso.
+    LISTEN necesita una conexión directa (no el pooler en modo transacción):
+    se configura con EVENTOS_SETTINGS['LISTEN_DATABASE_URL'].
+    """
+    channel = "condominio_eventos"
+
+    def start(self, hub: EventHub):
+        hilo = threading.Thread(target=self._escuchar, args=(hub,), name="eventos-listen", daemon=True)
+        hilo.start()
+
+    def publish(self, evento: dict):
+        with connection.cursor() as cur:
+            cur.execute("SELECT pg_notify(%s, %s)", [self.channel, json.dumps(evento, default=str)])
+
+    def _escuchar(self, hub: EventHub):
+        dsn = settings.EVENTOS_SETTINGS['LISTEN_DATABASE_URL']
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(dsn)
+                conn.set_session(autocommit=True)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel};")
+                logger.info("Escuchando eventos en Postgres (LISTEN)")
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            hub.deliver_threadsafe(json.loads(notify.payload))
+                        except ValueError:
+                            logger.warning("Payload de evento inválido descartado")
+            except Exception as e:
+                logger.error(f"Conexión LISTEN caída, reintentando: {e}")
+            finally:
+                if conn is not None:
+                    conn.close()
+            time.sleep(5)
+
+
+hub = EventHub()
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.EVENTOS_SETTINGS['BACKEND'])()
+    return _backend
+
+
+def publicar_evento(canal: str, datos: dict, usuarios: Optional[List[int]] = None):
+    """
+    Publica un evento tras el commit de la transacción actual (o de inmediato
+    si no hay transacción). Si se indican usuarios, solo les llega a ellos.
+    """
+    if usuarios is None:
+        eventos = [{"canal": canal, "datos": datos}]
+    else:
+        eventos = [
+            {"canal": canal, "datos": datos, "usuarios": usuarios[i:i + MAX_USUARIOS_POR_EVENTO]}
+            for i in range(0, len(usuarios), MAX_USUARIOS_POR_EVENTO)
+        ]
+
+    def _publicar():
+        backend = get_backend()
+        for evento in eventos:
+            try:
+                backend.publish(evento)
+            except Exception as e:
+                logger.error(f"Error publicando evento {canal}: {e}")
+
+    transaction.on_commit(_publicar)
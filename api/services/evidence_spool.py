@@ -0,0 +1,248 @@
+# api/services/evidence_spool.py
+"""
+Cola en disco de las imágenes de evidencia pendientes de subir a Storage.
+
+Con EVIDENCE_UPLOAD_MODE='spool' el request no espera a Storage: registra la
+detección sin imagen y, al confirmarse la transacción, deja el frame en
+SPOOL_DIR (<id>.jpg + <id>.json, el .json se escribe al final y marca la
+entrada como completa). Un worker (el hilo de warm_up() o el comando
+subir_evidencias) sube por lotes con SPOOL_WORKERS subidas concurrentes y
+completa imagen_path/imagen_url/imagen_variantes con un bulk_update por
+modelo.
+
+Las subidas fallidas se reintentan con backoff exponencial; tras
+SPOOL_MAX_INTENTOS la entrada pasa a SPOOL_DIR/fallidas para revisarla a
+mano, así que la evidencia no se pierde. Varios procesos pueden compartir el
+directorio: cada entrada se reclama renombrando su .json (atómico).
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from ..models import DeteccionPlaca, ReconocimientoFacial
+from .supabase_storage import SupabaseStorageService
+
+logger = logging.getLogger(__name__)
+
+MODELOS = {
+    "reconocimiento_facial": ReconocimientoFacial,
+    "deteccion_placa": DeteccionPlaca,
+}
+SUFIJO_RECLAMADA = ".enviando"
+# Una entrada reclamada por un worker que murió vuelve a la cola pasado este tiempo
+RECLAMO_VENCE_SEG = 600
+
+
+@dataclass(frozen=True)
+class EvidenciaPendiente:
+    """Frame que se sube después del registro en lugar de durante el request"""
+    data: bytes
+    folder: str
+    prefix: str
+
+
+def modo_spool() -> bool:
+    return settings.AI_CLIENT_SETTINGS['EVIDENCE_UPLOAD_MODE'] == "spool"
+
+
+def _escribir_atomico(ruta: str, contenido: bytes):
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(contenido)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+class EvidenceSpool:
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        self.fallidas = os.path.join(directorio, "fallidas")
+        os.makedirs(self.fallidas, exist_ok=True)
+
+    # ----------------------------- encolar -----------------------------
+    def encolar(self, modelo: str, registro_id: int, pendiente: EvidenciaPendiente):
+        """Deja el frame en disco (la clave en Storage sale del contenido: los reintentos no duplican)"""
+        clave = uuid.uuid4().hex
+        _escribir_atomico(os.path.join(self.directorio, f"{clave}.jpg"), pendiente.data)
+        _escribir_atomico(os.path.join(self.directorio, f"{clave}.json"), json.dumps({
+            "modelo": modelo,
+            "id": registro_id,
+            "folder": pendiente.folder,
+            "prefix": pendiente.prefix,
+            "intentos": 0,
+            "proximo_intento": 0,
+        }).encode())
+
+    def encolar_al_confirmar(self, modelo: str, registro_id: int, pendiente: EvidenciaPendiente):
+        """Solo se encola si el registro llega a la BD"""
+        def _encolar():
+            try:
+                self.encolar(modelo, registro_id, pendiente)
+            except OSError as e:
+                logger.error(f"No se pudo encolar la evidencia de {modelo} {registro_id}: {e}")
+
+        transaction.on_commit(_encolar)
+
+    # ----------------------------- estado ------------------------------
+    def pendientes(self) -> int:
+        return sum(1 for nombre in os.listdir(self.directorio)
+                   if nombre.endswith(".json") or nombre.endswith(".json" + SUFIJO_RECLAMADA))
+
+    def estado(self) -> Dict:
+        return {
+            "pendientes": self.pendientes(),
+            "fallidas": sum(1 for n in os.listdir(self.fallidas) if n.endswith(".json")),
+        }
+
+    # ----------------------------- procesar ----------------------------
+    def _reclamar(self, limite: int) -> List[Dict]:
+        ahora = time.time()
+        reclamadas = []
+        for nombre in sorted(os.listdir(self.directorio)):
+            if len(reclamadas) >= limite:
+                break
+            ruta = os.path.join(self.directorio, nombre)
+            if nombre.endswith(".json" + SUFIJO_RECLAMADA):
+                try:
+                    if ahora - os.path.getmtime(ruta) > RECLAMO_VENCE_SEG:
+                        os.replace(ruta, ruta[:-len(SUFIJO_RECLAMADA)])
+                except OSError:
+                    pass
+                continue
+            if not nombre.endswith(".json"):
+                continue
+            try:
+                with open(ruta, "rb") as f:
+                    entrada = json.loads(f.read())
+                if entrada["proximo_intento"] > ahora:
+                    continue
+                os.rename(ruta, ruta + SUFIJO_RECLAMADA)
+                os.utime(ruta + SUFIJO_RECLAMADA)
+            except (OSError, ValueError):
+                continue  # la reclamó otro worker o está a medio escribir
+            entrada["clave"] = nombre[:-len(".json")]
+            reclamadas.append(entrada)
+        return reclamadas
+
+    def _ruta(self, clave: str, extension: str) -> str:
+        return os.path.join(self.directorio, f"{clave}{extension}")
+
+    def _subir(self, storage: SupabaseStorageService, entrada: Dict) -> Optional[Dict]:
+        try:
+            with open(self._ruta(entrada["clave"], ".jpg"), "rb") as f:
+                data = f.read()
+        except OSError as e:
+            logger.error(f"Evidencia en cola sin imagen ({entrada['clave']}): {e}")
+            return None
+        return storage.upload_bytes(data, entrada["folder"], entrada["prefix"])
+
+    def _reprogramar(self, entrada: Dict):
+        cfg = settings.AI_CLIENT_SETTINGS
+        clave = entrada.pop("clave")
+        entrada["intentos"] += 1
+        reclamada = self._ruta(clave, ".json" + SUFIJO_RECLAMADA)
+        if entrada["intentos"] >= cfg['SPOOL_MAX_INTENTOS']:
+            logger.error(f"Evidencia de {entrada['modelo']} {entrada['id']} sin subir tras "
+                         f"{entrada['intentos']} intentos; queda en {self.fallidas}")
+            _escribir_atomico(os.path.join(self.fallidas, f"{clave}.json"), json.dumps(entrada).encode())
+            os.replace(self._ruta(clave, ".jpg"), os.path.join(self.fallidas, f"{clave}.jpg"))
+            os.remove(reclamada)
+            return
+        espera = min(cfg['SPOOL_BACKOFF_SEG'] * 2 ** (entrada["intentos"] - 1), 3600)
+        entrada["proximo_intento"] = time.time() + espera
+        _escribir_atomico(reclamada, json.dumps(entrada).encode())
+        os.replace(reclamada, self._ruta(clave, ".json"))
+
+    def procesar_lote(self, storage: SupabaseStorageService) -> Dict[str, int]:
+        """Sube un lote de entradas vencidas y actualiza los registros; devuelve los contadores"""
+        cfg = settings.AI_CLIENT_SETTINGS
+        entradas = self._reclamar(cfg['SPOOL_LOTE'])
+        if not entradas:
+            return {"subidas": 0, "errores": 0}
+
+        with ThreadPoolExecutor(max_workers=cfg['SPOOL_WORKERS'], thread_name_prefix="ai-spool") as pool:
+            subidas = list(pool.map(lambda entrada: self._subir(storage, entrada), entradas))
+
+        por_modelo: Dict[str, List] = {}
+        hechas, errores = [], 0
+        for entrada, subida in zip(entradas, subidas):
+            if subida is None:
+                self._reprogramar(entrada)
+                errores += 1
+                continue
+            modelo = MODELOS[entrada["modelo"]]
+            por_modelo.setdefault(entrada["modelo"], []).append(
+                modelo(pk=entrada["id"], imagen_path=subida["file_path"], imagen_url=subida["public_url"],
+                       imagen_variantes=subida["variantes"] or None)
+            )
+            hechas.append(entrada)
+
+        try:
+            with transaction.atomic():
+                for nombre, registros in por_modelo.items():
+                    MODELOS[nombre].objects.bulk_update(registros, ["imagen_path", "imagen_url", "imagen_variantes"])
+        except Exception as e:
+            # Los archivos ya están en Storage: el reintento los encuentra y no los vuelve a subir
+            logger.error(f"Error actualizando registros con su evidencia: {e}")
+            for entrada in hechas:
+                self._reprogramar(entrada)
+            return {"subidas": 0, "errores": errores + len(hechas)}
+
+        for entrada in hechas:
+            for extension in (".jpg", ".json" + SUFIJO_RECLAMADA):
+                try:
+                    os.remove(self._ruta(entrada["clave"], extension))
+                except OSError:
+                    pass
+        return {"subidas": len(hechas), "errores": errores}
+
+
+_spool: Optional[EvidenceSpool] = None
+_spool_lock = threading.Lock()
+
+
+def get_evidence_spool() -> EvidenceSpool:
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                _spool = EvidenceSpool(settings.AI_CLIENT_SETTINGS['SPOOL_DIR'])
+    return _spool
+
+
+_hilo: Optional[threading.Thread] = None
+
+
+def iniciar_hilo(storage_factory):
+    """Worker en el propio proceso (SPOOL_HILO); storage_factory evita importar el registro aquí"""
+    global _hilo
+    with _spool_lock:
+        if _hilo is not None:
+            return
+
+        def _bucle():
+            spool = get_evidence_spool()
+            while True:
+                resultado = {"subidas": 0, "errores": 0}
+                try:
+                    resultado = spool.procesar_lote(storage_factory())
+                except Exception as e:
+                    logger.error(f"Error en el worker de evidencias: {e}")
+                finally:
+                    close_old_connections()
+                # Lote lleno: hay más trabajo pendiente, se sigue sin esperar
+                if sum(resultado.values()) < settings.AI_CLIENT_SETTINGS['SPOOL_LOTE']:
+                    time.sleep(settings.AI_CLIENT_SETTINGS['SPOOL_POLL_SEG'])
+
+        _hilo = threading.Thread(target=_bucle, name="ai-spool-worker", daemon=True)
+        _hilo.start()
@@ -0,0 +1,275 @@
+# api/services/face_index.py
+"""
+Índice aproximado (IVF) para galerías grandes de rostros.
+
+Un cuantizador grueso (k-means sobre los encodings) reparte los perfiles en
+n_listas celdas; una búsqueda compara el embedding con los centroides y solo
+recorre las n_probe celdas más cercanas, en lugar de toda la galería. Cada
+celda guarda sus vectores contiguos, así que altas y bajas son O(d) como en
+FaceMatcher. El índice completo (centroides y celdas) se persiste con
+np.savez para no reentrenar el k-means en cada arranque.
+"""
+import logging
+import os
+import tempfile
+import zipfile
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VERSION_FORMATO = 1
+CAPACIDAD_CELDA = 16
+MUESTRAS_POR_LISTA = 64
+
+
+def n_listas_para(n: int) -> int:
+    """Regla habitual: ~√n celdas (acotado para galerías chicas)"""
+    return int(max(1, min(n // 8, round(np.sqrt(n)))))
+
+
+def _cuadrados(x: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", x, x)
+
+
+def _mas_cercanos(x: np.ndarray, centroides: np.ndarray, normas_c: np.ndarray, bloque: int = 8192) -> np.ndarray:
+    """Centroide más cercano de cada fila, por bloques para acotar memoria"""
+    asignacion = np.empty(x.shape[0], dtype=np.int64)
+    for inicio in range(0, x.shape[0], bloque):
+        parte = x[inicio:inicio + bloque]
+        # |x|² es constante por fila: no cambia el argmin
+        asignacion[inicio:inicio + bloque] = np.argmin(normas_c - 2.0 * (parte @ centroides.T), axis=1)
+    return asignacion
+
+
+def kmeans(x: np.ndarray, k: int, iteraciones: int = 15, semilla: int = 0) -> np.ndarray:
+    """Lloyd sobre una muestra de x; las celdas vacías se resiembran con puntos al azar"""
+    rng = np.random.default_rng(semilla)
+    if x.shape[0] > k * MUESTRAS_POR_LISTA:
+        x = x[rng.choice(x.shape[0], k * MUESTRAS_POR_LISTA, replace=False)]
+    centroides = x[rng.choice(x.shape[0], k, replace=False)].astype(np.float32, copy=True)
+    for _ in range(iteraciones):
+        asignacion = _mas_cercanos(x, centroides, _cuadrados(centroides))
+        cuentas = np.bincount(asignacion, minlength=k)
+        sumas = np.zeros_like(centroides)
+        np.add.at(sumas, asignacion, x)
+        llenas = cuentas > 0
+        centroides[llenas] = sumas[llenas] / cuentas[llenas, None]
+        vacias = np.flatnonzero(~llenas)
+        if vacias.size:
+            centroides[vacias] = x[rng.choice(x.shape[0], vacias.size, replace=False)]
+    return centroides
+
+
+class _Celda:
+    """Vectores de una lista invertida, contiguos y con capacidad que se duplica"""
+
+    __slots__ = ("vectores", "normas", "perfiles", "usuarios", "n")
+
+    def __init__(self, dim: int, capacidad: int = CAPACIDAD_CELDA):
+        self.vectores = np.empty((capacidad, dim), dtype=np.float32)
+        self.normas = np.empty(capacidad, dtype=np.float32)
+        self.perfiles = np.empty(capacidad, dtype=np.int64)
+        self.usuarios = np.empty(capacidad, dtype=np.int64)
+        self.n = 0
+
+    def reservar(self, capacidad: int):
+        if capacidad <= self.vectores.shape[0]:
+            return
+        for nombre in self.__slots__[:-1]:
+            actual = getattr(self, nombre)
+            nuevo = np.empty((capacidad,) + actual.shape[1:], dtype=actual.dtype)
+            nuevo[:self.n] = actual[:self.n]
+            setattr(self, nombre, nuevo)
+
+    def agregar(self, vector, norma, perfil_id, usuario_id) -> int:
+        if self.n == self.vectores.shape[0]:
+            self.reservar(self.vectores.shape[0] * 2)
+        fila = self.n
+        self.vectores[fila], self.normas[fila] = vector, norma
+        self.perfiles[fila], self.usuarios[fila] = perfil_id, usuario_id
+        self.n += 1
+        return fila
+
+    def quitar(self, fila: int) -> Optional[int]:
+        """Mueve la última fila al hueco; devuelve el perfil movido (o None)"""
+        ultima = self.n - 1
+        movido = None
+        if fila != ultima:
+            self.vectores[fila], self.normas[fila] = self.vectores[ultima], self.normas[ultima]
+            self.perfiles[fila], self.usuarios[fila] = self.perfiles[ultima], self.usuarios[ultima]
+            movido = int(self.perfiles[fila])
+        self.n = ultima
+        return movido
+
+
+class IVFIndex:
+    """Índice IVF-Flat: distancias exactas dentro de las celdas sondeadas. No es seguro entre hilos
+    por sí solo; FaceMatcher lo usa bajo su propio lock."""
+
+    def __init__(self, centroides: np.ndarray, n_entrenamiento: int = 0):
+        self.centroides = np.ascontiguousarray(centroides, dtype=np.float32)
+        self._normas_c = _cuadrados(self.centroides)
+        self.dim = self.centroides.shape[1]
+        self.n_entrenamiento = n_entrenamiento
+        self._celdas = [_Celda(self.dim) for _ in range(self.n_listas)]
+        self._posicion: Dict[int, Tuple[int, int]] = {}
+
+    @property
+    def n_listas(self) -> int:
+        return self.centroides.shape[0]
+
+    def __len__(self):
+        return len(self._posicion)
+
+    def __contains__(self, perfil_id: int):
+        return perfil_id in self._posicion
+
+    # ----------------------------- construcción -----------------------------
+    @classmethod
+    def entrenar(cls, vectores: np.ndarray, n_listas: Optional[int] = None, semilla: int = 0) -> "IVFIndex":
+        n_listas = n_listas or n_listas_para(vectores.shape[0])
+        return cls(kmeans(vectores, n_listas, semilla=semilla), n_entrenamiento=vectores.shape[0])
+
+    def agregar_lote(self, vectores: np.ndarray, perfiles: np.ndarray, usuarios: np.ndarray):
+        """Alta masiva: una sola asignación vectorizada y una copia por celda"""
+        vectores = np.ascontiguousarray(vectores, dtype=np.float32)
+        asignacion = _mas_cercanos(vectores, self.centroides, self._normas_c)
+        normas = _cuadrados(vectores)
+        orden = np.argsort(asignacion, kind="stable")
+        limites = np.searchsorted(asignacion[orden], np.arange(self.n_listas + 1))
+        for lista in range(self.n_listas):
+            filas = orden[limites[lista]:limites[lista + 1]]
+            if not filas.size:
+                continue
+            celda = self._celdas[lista]
+            celda.reservar(celda.n + filas.size)
+            inicio, fin = celda.n, celda.n + filas.size
+            celda.vectores[inicio:fin] = vectores[filas]
+            celda.normas[inicio:fin] = normas[filas]
+            celda.perfiles[inicio:fin] = perfiles[filas]
+            celda.usuarios[inicio:fin] = usuarios[filas]
+            celda.n = fin
+            for fila, perfil_id in enumerate(celda.perfiles[inicio:fin].tolist(), start=inicio):
+                self._posicion[perfil_id] = (lista, fila)
+
+    # ------------------------------ altas y bajas ------------------------------
+    def agregar(self, perfil_id: int, usuario_id: int, vector: np.ndarray):
+        self.quitar(perfil_id)
+        norma = float(vector @ vector)
+        lista = int(np.argmin(self._normas_c - 2.0 * (self.centroides @ vector)))
+        fila = self._celdas[lista].agregar(vector, norma, perfil_id, usuario_id)
+        self._posicion[perfil_id] = (lista, fila)
+
+    def quitar(self, perfil_id: int) -> bool:
+        posicion = self._posicion.pop(perfil_id, None)
+        if posicion is None:
+            return False
+        lista, fila = posicion
+        movido = self._celdas[lista].quitar(fila)
+        if movido is not None:
+            self._posicion[movido] = (lista, fila)
+        return True
+
+    # -------------------------------- búsqueda --------------------------------
+    def buscar(self, vector: np.ndarray, n_probe: int) -> Optional[Tuple[int, int, float]]:
+        """(perfil_id, usuario_id, distancia) del más cercano entre las n_probe celdas sondeadas"""
+        q2 = float(vector @ vector)
+        d_centroides = self._normas_c - 2.0 * (self.centroides @ vector)
+        n_probe = min(n_probe, self.n_listas)
+        sondeo = np.argpartition(d_centroides, n_probe - 1)[:n_probe] if n_probe < self.n_listas \
+            else np.arange(self.n_listas)
+
+        mejor, mejor_d2 = None, np.inf
+        for lista in sondeo:
+            celda = self._celdas[lista]
+            if not celda.n:
+                continue
+            d2 = celda.normas[:celda.n] - 2.0 * (celda.vectores[:celda.n] @ vector)
+            fila = int(np.argmin(d2))
+            if d2[fila] < mejor_d2:
+                mejor, mejor_d2 = (celda, fila), float(d2[fila])
+        if mejor is None:
+            return None
+        celda, fila = mejor
+        return int(celda.perfiles[fila]), int(celda.usuarios[fila]), float(np.sqrt(max(mejor_d2 + q2, 0.0)))
+
+    def contiene_exactamente(self, vectores: np.ndarray, perfiles: np.ndarray) -> bool:
+        """¿Tiene el índice justo estos perfiles con estos vectores? (firma independiente del orden)"""
+        if len(self) != perfiles.shape[0] or vectores.shape[1] != self.dim:
+            return False
+        propios_v = np.concatenate([c.vectores[:c.n] for c in self._celdas])
+        propios_p = np.concatenate([c.perfiles[:c.n] for c in self._celdas])
+        if not np.array_equal(np.sort(propios_p), np.sort(perfiles)):
+            return False
+
+        def firma(v: np.ndarray, p: np.ndarray) -> np.ndarray:
+            return (p[:, None].astype(np.float64) * v).sum(axis=0)
+
+        return np.allclose(firma(propios_v, propios_p), firma(vectores, perfiles), rtol=1e-6, atol=1e-3)
+
+    def desbalance(self) -> float:
+        """Tamaño de la celda más grande respecto a la media (1.0 = perfecto)"""
+        tamanos = np.array([c.n for c in self._celdas])
+        return float(tamanos.max() / max(tamanos.mean(), 1e-9)) if tamanos.size else 1.0
+
+    # ------------------------------ persistencia ------------------------------
+    def guardar(self, ruta: str):
+        """
+        Escritura atómica (archivo temporal + rename) para no dejar índices a
+        medias; el temporal es único por escritor, así varios workers que
+        entrenan al arrancar no se pisan
+        """
+        celdas = self._celdas
+        directorio = os.path.dirname(ruta) or "."
+        os.makedirs(directorio, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=directorio, prefix=f".{os.path.basename(ruta)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    version=np.int64(VERSION_FORMATO),
+                    n_entrenamiento=np.int64(self.n_entrenamiento),
+                    centroides=self.centroides,
+                    tamanos=np.array([c.n for c in celdas], dtype=np.int64),
+                    vectores=np.concatenate([c.vectores[:c.n] for c in celdas]),
+                    perfiles=np.concatenate([c.perfiles[:c.n] for c in celdas]),
+                    usuarios=np.concatenate([c.usuarios[:c.n] for c in celdas]),
+                )
+            os.replace(temporal, ruta)
+        except BaseException:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def cargar(cls, ruta: str) -> Optional["IVFIndex"]:
+        """Índice persistido, o None si no existe o es de otro formato"""
+        try:
+            with np.load(ruta) as data:
+                if int(data["version"]) != VERSION_FORMATO:
+                    return None
+                indice = cls(data["centroides"], int(data["n_entrenamiento"]))
+                vectores, perfiles, usuarios = data["vectores"], data["perfiles"], data["usuarios"]
+                limites = np.concatenate([[0], np.cumsum(data["tamanos"])])
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile) as e:
+            logger.warning(f"Índice facial en {ruta} ilegible, se reconstruirá: {e}")
+            return None
+
+        normas = _cuadrados(vectores)
+        for lista, celda in enumerate(indice._celdas):
+            inicio, fin = int(limites[lista]), int(limites[lista + 1])
+            celda.reservar(max(CAPACIDAD_CELDA, fin - inicio))
+            celda.vectores[:fin - inicio] = vectores[inicio:fin]
+            celda.normas[:fin - inicio] = normas[inicio:fin]
+            celda.perfiles[:fin - inicio] = perfiles[inicio:fin]
+            celda.usuarios[:fin - inicio] = usuarios[inicio:fin]
+            celda.n = fin - inicio
+            for fila, perfil_id in enumerate(perfiles[inicio:fin].tolist()):
+                indice._posicion[perfil_id] = (lista, fila)
+        return indice
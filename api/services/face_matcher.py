@@ -0,0 +1,393 @@
+# api/services/face_matcher.py
+"""
+Comparación de rostros en el proceso, sobre los encodings de PerfilFacial.
+
+Los encodings se guardan como float32 binario con cabecera versionada y se
+cargan en bloque con np.frombuffer. Todos los activos viven en una matriz
+float32 contigua (n, d); una coincidencia es una sola operación vectorizada
+de distancias euclídeas, así que el microservicio solo necesita devolver el
+embedding del rostro.
+
+La matriz se actualiza de forma incremental con las señales de PerfilFacial
+(altas, bajas y desactivaciones de este proceso) y se recarga entera cada
+FACE_MATCHER_RESYNC_SEG para recoger cambios hechos por otros procesos.
+
+A partir de FACE_INDEX_MIN_PERFILES la búsqueda pasa por un índice IVF
+aproximado (face_index) que se mantiene con las mismas altas y bajas; la
+matriz exacta sigue siendo la fuente para reconstruirlo.
+"""
+import asyncio
+import json
+import logging
+import struct
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from ..models import PerfilFacial
+from .face_index import IVFIndex
+
+logger = logging.getLogger(__name__)
+
+CAPACIDAD_INICIAL = 256
+
+
+@dataclass(frozen=True)
+class Coincidencia:
+    perfil_id: int
+    usuario_id: int
+    distancia: float
+
+    @property
+    def confianza(self) -> float:
+        return round(max(0.0, 1.0 - self.distancia), 4)
+
+
+# Formato binario de PerfilFacial.encoding_facial: cabecera de 8 bytes
+# (magia, versión, tipo, dimensión) seguida de dim float32 little-endian
+CABECERA = struct.Struct("<2sBBI")
+MAGIA = b"FE"
+VERSION_ENCODING = 1
+TIPO_FLOAT32 = 1
+_BINARIOS = (bytes, bytearray, memoryview)
+
+
+def _dtype_registro(dim: int) -> np.dtype:
+    """Un encoding binario completo como registro de NumPy (para leer lotes de una vez)"""
+    return np.dtype([
+        ("magia", "S2"), ("version", "u1"), ("tipo", "u1"), ("dim", "<u4"), ("vector", "<f4", (dim,)),
+    ])
+
+
+def parse_encoding(valor) -> Optional[np.ndarray]:
+    """Encoding binario versionado, o (formato anterior / respuesta del microservicio) JSON o texto"""
+    if valor is None:
+        return None
+    if isinstance(valor, _BINARIOS):
+        valor = bytes(valor)
+        if len(valor) < CABECERA.size:
+            return None
+        magia, version, tipo, dim = CABECERA.unpack_from(valor)
+        if magia != MAGIA or version != VERSION_ENCODING or tipo != TIPO_FLOAT32 \
+                or len(valor) != CABECERA.size + 4 * dim:
+            return None
+        return np.frombuffer(valor, dtype="<f4", count=dim, offset=CABECERA.size).astype(np.float32)
+    if isinstance(valor, np.ndarray):
+        return valor.astype(np.float32, copy=False).ravel()
+    if isinstance(valor, (list, tuple)):
+        return np.asarray(valor, dtype=np.float32)
+    texto = str(valor).strip()
+    if not texto:
+        return None
+    try:
+        if texto.startswith("["):
+            return np.asarray(json.loads(texto), dtype=np.float32)
+        return np.array(texto.replace(",", " ").split(), dtype=np.float32)
+    except (ValueError, TypeError):
+        return None
+
+
+def serializar_encoding(embedding) -> bytes:
+    vector = np.asarray(embedding, dtype="<f4").ravel()
+    return CABECERA.pack(MAGIA, VERSION_ENCODING, TIPO_FLOAT32, vector.shape[0]) + vector.tobytes()
+
+
+def decodificar_lote(valores: List) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (matriz (m, dim) float32, índices de los valores usados), con la dimensión
+    más frecuente. Los encodings binarios se leen todos con un único
+    np.frombuffer sobre sus bytes concatenados, sin parsear fila por fila; los
+    que quedan en otro formato (texto sin migrar, listas) se parsean aparte.
+    """
+    binarios = [i for i, v in enumerate(valores) if isinstance(v, _BINARIOS)]
+    if binarios:
+        largo = Counter(len(valores[i]) for i in binarios).most_common(1)[0][0]
+        dim = (largo - CABECERA.size) // 4
+        idx = np.array([i for i in binarios if len(valores[i]) == largo], dtype=np.int64)
+        if dim > 0 and largo == CABECERA.size + 4 * dim:
+            registros = np.frombuffer(b"".join(valores[i] for i in idx), dtype=_dtype_registro(dim))
+            validos = ((registros["magia"] == MAGIA) & (registros["version"] == VERSION_ENCODING)
+                       & (registros["tipo"] == TIPO_FLOAT32) & (registros["dim"] == dim))
+            matriz, idx = registros["vector"][validos], idx[validos]
+            resto = [(i, parse_encoding(v)) for i, v in enumerate(valores) if not isinstance(v, _BINARIOS)]
+            resto = [(i, v) for i, v in resto if v is not None and v.shape[0] == dim]
+            if resto:
+                matriz = np.concatenate([matriz, np.stack([v for _, v in resto])])
+                idx = np.concatenate([idx, np.array([i for i, _ in resto], dtype=np.int64)])
+                orden = np.argsort(idx, kind="stable")
+                matriz, idx = matriz[orden], idx[orden]
+            return np.ascontiguousarray(matriz, dtype=np.float32), idx
+
+    # Sin encodings binarios (filas en memoria o datos sin migrar): uno por uno
+    vectores = {i: parse_encoding(v) for i, v in enumerate(valores)}
+    vectores = {i: v for i, v in vectores.items() if v is not None and v.size}
+    if not vectores:
+        return np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64)
+    dim = Counter(v.shape[0] for v in vectores.values()).most_common(1)[0][0]
+    idx = np.array([i for i, v in vectores.items() if v.shape[0] == dim], dtype=np.int64)
+    return np.stack([vectores[i] for i in idx]), idx
+
+
+class FaceMatcher:
+    """Matriz de encodings con altas/bajas O(d) y búsqueda vectorizada; segura entre hilos"""
+
+    def __init__(self, tolerancia: float):
+        self.tolerancia = tolerancia
+        self.dim: Optional[int] = None
+        self._matriz = np.empty((0, 0), dtype=np.float32)
+        self._normas = np.empty(0, dtype=np.float32)  # |x|² de cada fila
+        self._perfiles = np.empty(0, dtype=np.int64)
+        self._usuarios = np.empty(0, dtype=np.int64)
+        self._fila: Dict[int, int] = {}
+        self._n = 0
+        self._lock = threading.RLock()
+        self._cargado = False
+        self._cargado_en = 0.0
+        self._recargando = threading.Lock()
+        self._indice: Optional[IVFIndex] = None
+
+    def __len__(self):
+        return self._n
+
+    # ----------------------------- carga -----------------------------
+    def cargar(self, filas: Optional[Iterable[Tuple[int, int, object]]] = None):
+        """Reconstruye la matriz; filas = (perfil_id, usuario_id, encoding)"""
+        if filas is None:
+            filas = (
+                PerfilFacial.objects.filter(activo=True)
+                .values_list("id", "codigo_usuario_id", "encoding_facial")
+                .iterator(chunk_size=2000)
+            )
+        perfiles, usuarios, encodings = [], [], []
+        for perfil_id, usuario_id, encoding in filas:
+            perfiles.append(perfil_id)
+            usuarios.append(usuario_id)
+            encodings.append(encoding)
+
+        vectores, validos = decodificar_lote(encodings)
+        n = len(validos)
+        dim = vectores.shape[1] if n else None
+        if n != len(encodings):
+            logger.warning(f"{len(encodings) - n} encoding(s) ilegibles o con dimensión distinta de {dim} ignorados")
+
+        matriz = np.empty((max(n, CAPACIDAD_INICIAL), dim or 0), dtype=np.float32)
+        matriz[:n] = vectores
+        p = np.zeros(matriz.shape[0], dtype=np.int64)
+        u = np.zeros(matriz.shape[0], dtype=np.int64)
+        p[:n] = np.asarray(perfiles, dtype=np.int64)[validos]
+        u[:n] = np.asarray(usuarios, dtype=np.int64)[validos]
+        normas = np.zeros(matriz.shape[0], dtype=np.float32)
+        normas[:n] = np.einsum("ij,ij->i", matriz[:n], matriz[:n])
+        indice = self._construir_indice(matriz[:n], p[:n], u[:n])
+
+        with self._lock:
+            self.dim = dim
+            self._matriz, self._normas, self._perfiles, self._usuarios = matriz, normas, p, u
+            self._fila = {int(pid): fila for fila, pid in enumerate(p[:n])}
+            self._n = n
+            self._indice = indice
+            self._cargado = True
+            self._cargado_en = time.monotonic()
+        modo = f"IVF de {indice.n_listas} listas" if indice else "búsqueda exacta"
+        logger.info(f"FaceMatcher: {n} perfil(es) cargados (dim={dim}, {modo})")
+
+    @staticmethod
+    def _construir_indice(matriz: np.ndarray, perfiles: np.ndarray, usuarios: np.ndarray) -> Optional[IVFIndex]:
+        """
+        IVF para galerías grandes. Reutiliza el índice persistido si coincide con
+        la BD; si no, reutiliza sus centroides (evita el k-means) y solo reentrena
+        cuando no existe o la galería creció mucho desde el entrenamiento.
+        """
+        cfg = settings.AI_IMAGE_SETTINGS
+        n = matriz.shape[0]
+        if n < cfg['FACE_INDEX_MIN_PERFILES']:
+            return None
+        ruta = cfg['FACE_INDEX_PATH']
+        persistido = IVFIndex.cargar(ruta)
+        if persistido is not None and persistido.dim == matriz.shape[1] and n <= 4 * persistido.n_entrenamiento:
+            if persistido.contiene_exactamente(matriz, perfiles):
+                return persistido
+            indice = IVFIndex(persistido.centroides, persistido.n_entrenamiento)
+            indice.agregar_lote(matriz, perfiles, usuarios)
+            return indice
+
+        indice = IVFIndex.entrenar(matriz)
+        indice.agregar_lote(matriz, perfiles, usuarios)
+        try:
+            indice.guardar(ruta)
+        except OSError as e:
+            logger.warning(f"No se pudo persistir el índice facial en {ruta}: {e}")
+        return indice
+
+    def _asegurar_cargado(self) -> bool:
+        """Carga en el primer uso; dentro de un event loop lo hace en segundo plano"""
+        if self._cargado:
+            if time.monotonic() - self._cargado_en > settings.AI_IMAGE_SETTINGS['FACE_MATCHER_RESYNC_SEG']:
+                self._recargar_en_segundo_plano()
+            return True
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            with self._recargando:
+                if not self._cargado:
+                    self.cargar()
+            return True
+        self._recargar_en_segundo_plano()
+        return False
+
+    def listo(self) -> bool:
+        """¿Puede decidir ya? Fuera de un event loop carga en el momento; dentro, no espera"""
+        return self._asegurar_cargado()
+
+    def _recargar_en_segundo_plano(self):
+        if not self._recargando.acquire(blocking=False):
+            return
+
+        def _recargar():
+            from django.db import close_old_connections
+            try:
+                self.cargar()
+            except Exception as e:
+                logger.error(f"Error recargando FaceMatcher: {e}")
+            finally:
+                close_old_connections()
+                self._recargando.release()
+
+        # Evita que se dispare otra recarga mientras esta corre
+        self._cargado_en = time.monotonic()
+        threading.Thread(target=_recargar, name="face-matcher-recarga", daemon=True).start()
+
+    # ------------------------ altas y bajas --------------------------
+    def agregar(self, perfil_id: int, usuario_id: int, encoding) -> bool:
+        vector = parse_encoding(encoding)
+        if vector is None:
+            return False
+        with self._lock:
+            if not self._cargado:
+                return False  # la carga inicial lo incluirá
+            if self.dim is None:
+                self.dim = vector.shape[0]
+                self._matriz = np.empty((CAPACIDAD_INICIAL, self.dim), dtype=np.float32)
+            if vector.shape[0] != self.dim:
+                logger.warning(f"Encoding del perfil {perfil_id} con dimensión {vector.shape[0]} != {self.dim}")
+                return False
+
+            fila = self._fila.get(perfil_id)
+            if fila is None:
+                if self._n == self._matriz.shape[0]:
+                    self._crecer()
+                fila = self._n
+                self._n += 1
+                self._fila[perfil_id] = fila
+            self._matriz[fila] = vector
+            self._normas[fila] = float(vector @ vector)
+            self._perfiles[fila] = perfil_id
+            self._usuarios[fila] = usuario_id
+            if self._indice is not None:
+                self._indice.agregar(perfil_id, usuario_id, vector)
+            return True
+
+    def quitar(self, perfil_id: int) -> bool:
+        """Quita la fila moviendo la última a su lugar (sin desplazar la matriz)"""
+        with self._lock:
+            fila = self._fila.pop(perfil_id, None)
+            if fila is None:
+                return False
+            if self._indice is not None:
+                self._indice.quitar(perfil_id)
+            ultima = self._n - 1
+            if fila != ultima:
+                self._matriz[fila] = self._matriz[ultima]
+                self._normas[fila] = self._normas[ultima]
+                self._perfiles[fila] = self._perfiles[ultima]
+                self._usuarios[fila] = self._usuarios[ultima]
+                self._fila[int(self._perfiles[fila])] = fila
+            self._n = ultima
+            return True
+
+    def _crecer(self):
+        capacidad = max(CAPACIDAD_INICIAL, self._matriz.shape[0] * 2)
+        matriz = np.empty((capacidad, self.dim), dtype=np.float32)
+        matriz[:self._n] = self._matriz[:self._n]
+        normas = np.zeros(capacidad, dtype=np.float32)
+        normas[:self._n] = self._normas[:self._n]
+        p = np.zeros(capacidad, dtype=np.int64)
+        p[:self._n] = self._perfiles[:self._n]
+        u = np.zeros(capacidad, dtype=np.int64)
+        u[:self._n] = self._usuarios[:self._n]
+        self._matriz, self._normas, self._perfiles, self._usuarios = matriz, normas, p, u
+
+    # --------------------------- búsqueda ----------------------------
+    def distancias(self, embedding: np.ndarray) -> np.ndarray:
+        """Distancia euclídea a cada perfil: |x|² - 2·x·q + |q|², en una pasada"""
+        with self._lock:
+            n = self._n
+            d2 = self._normas[:n] - 2.0 * (self._matriz[:n] @ embedding) + float(embedding @ embedding)
+        return np.sqrt(np.maximum(d2, 0.0))
+
+    def match(self, embedding, tolerancia: Optional[float] = None) -> Optional[Coincidencia]:
+        """Perfil más cercano dentro de la tolerancia, o None"""
+        vector = parse_encoding(embedding)
+        if vector is None or not self._asegurar_cargado():
+            return None
+        with self._lock:
+            if self._n == 0 or vector.shape[0] != self.dim:
+                return None
+            if self._indice is not None:
+                encontrado = self._indice.buscar(vector, settings.AI_IMAGE_SETTINGS['FACE_INDEX_N_PROBE'])
+                if encontrado is None:
+                    return None
+                perfil_id, usuario_id, distancia = encontrado
+            else:
+                dist = self.distancias(vector)
+                mejor = int(np.argmin(dist))
+                distancia = float(dist[mejor])
+                perfil_id, usuario_id = int(self._perfiles[mejor]), int(self._usuarios[mejor])
+        if distancia > (self.tolerancia if tolerancia is None else tolerancia):
+            return None
+        return Coincidencia(perfil_id, usuario_id, distancia)
+
+
+_matcher: Optional[FaceMatcher] = None
+_matcher_lock = threading.Lock()
+
+
+def get_face_matcher() -> FaceMatcher:
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = FaceMatcher(settings.AI_IMAGE_SETTINGS['FACE_TOLERANCE'])
+    return _matcher
+
+
+def completar_coincidencia(ai_result: Dict) -> Dict:
+    """
+    Si el microservicio devolvió solo el embedding ('embedding' o 'encoding'),
+    resuelve is_match/user_id/confidence localmente. Idempotente.
+    """
+    if "is_match" in ai_result:
+        return ai_result
+    embedding = ai_result.get("embedding", ai_result.get("encoding"))
+    if embedding is None:
+        return ai_result
+    matcher = get_face_matcher()
+    if not matcher.listo():
+        # Aún cargando en un event loop: sin is_match, lo resuelve registrar_reconocimiento en su hilo
+        return ai_result
+    coincidencia = matcher.match(embedding)
+    if coincidencia is None:
+        ai_result.update({"is_match": False, "user_id": None, "confidence": ai_result.get("confidence", 0.0)})
+    else:
+        ai_result.update({
+            "is_match": True,
+            "user_id": coincidencia.usuario_id,
+            "confidence": coincidencia.confianza,
+            "distance": round(coincidencia.distancia, 4),
+        })
+    return ai_result
@@ -0,0 +1,122 @@
+# api/services/frame_dedupe.py
+"""
+Supresión de frames casi idénticos por cámara.
+
+Una cámara fija manda el mismo cuadro una y otra vez mientras un auto espera
+en la barrera. Cada frame se resume en un dHash de 64 bits (diferencias de
+brillo sobre una miniatura en grises 9x8, decodificada con draft() para no
+abrir la imagen a tamaño completo). Si se parece a un frame registrado hace
+menos de DEDUPE_VENTANA_SEG en la misma cámara (hasta DEDUPE_HAMMING_MAX
+bits), ese frame es solo un candidato: la inferencia se hace igual y, si
+confirma la misma decisión (misma placa leída, misma persona), se omiten la
+subida, el registro y la alerta repetidos. El hash cubre toda la escena, y
+con un fondo fijo dos autos distintos pueden dar el mismo hash, así que la
+decisión de autorización nunca sale solo de él.
+
+La ventana es fija desde el registro: las coincidencias no la renuevan. El
+estado es por proceso.
+"""
+import io
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+LADO_HASH = 8
+MAX_FRAMES_POR_CAMARA = 8
+
+
+def dhash(data: bytes) -> Optional[int]:
+    """dHash de 64 bits del frame, o None si no es una imagen legible"""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # JPEG: decodifica directamente a 1/2, 1/4 u 1/8 de escala
+            img.draft("L", (LADO_HASH * 8, LADO_HASH * 8))
+            gris = img.convert("L").resize((LADO_HASH + 1, LADO_HASH), Image.Resampling.BOX)
+    except Exception as e:
+        logger.warning(f"No se pudo calcular el hash del frame: {e}")
+        return None
+    pixeles = np.asarray(gris, dtype=np.int16)
+    bits = (pixeles[:, 1:] > pixeles[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class _Visto:
+    __slots__ = ("huella", "registrado_en", "resultado")
+
+    def __init__(self, huella: int, resultado: Dict):
+        self.huella = huella
+        self.registrado_en = time.monotonic()
+        self.resultado = resultado
+
+
+class FrameDeduper:
+    """Frames recientes por cámara con su decisión; seguro entre hilos"""
+
+    def __init__(self, ventana_seg: float, hamming_max: int):
+        self.ventana_seg = ventana_seg
+        self.hamming_max = hamming_max
+        self._camaras: Dict[Hashable, Deque[_Visto]] = {}
+        self._lock = threading.Lock()
+        self.suprimidos = 0
+
+    @property
+    def activo(self) -> bool:
+        return self.ventana_seg > 0
+
+    def consultar(self, clave: Hashable, data: bytes) -> Tuple[Optional[int], Optional[Dict]]:
+        """(huella del frame, decisión de un frame parecido registrado hace poco, a confirmar)"""
+        if not self.activo:
+            return None, None
+        huella = dhash(data)
+        if huella is None:
+            return None, None
+        return huella, self.buscar(clave, huella)
+
+    def buscar(self, clave: Hashable, huella: int) -> Optional[Dict]:
+        ahora = time.monotonic()
+        with self._lock:
+            vistos = self._camaras.get(clave)
+            if not vistos:
+                return None
+            while vistos and ahora - vistos[0].registrado_en > self.ventana_seg:
+                vistos.popleft()
+            for visto in reversed(vistos):
+                if (visto.huella ^ huella).bit_count() <= self.hamming_max:
+                    return visto.resultado
+        return None
+
+    def suprimir(self, previo: Dict) -> Dict:
+        """Respuesta para un frame cuya inferencia confirmó la decisión previa"""
+        with self._lock:
+            self.suprimidos += 1
+        return {**previo, "duplicate": True}
+
+    def registrar(self, clave: Hashable, huella: Optional[int], resultado: Dict):
+        """Guarda la decisión de un frame procesado y registrado con éxito"""
+        if huella is None or not self.activo or not resultado.get("success") or resultado.get("duplicate"):
+            return
+        with self._lock:
+            vistos = self._camaras.setdefault(clave, deque(maxlen=MAX_FRAMES_POR_CAMARA))
+            vistos.append(_Visto(huella, resultado))
+
+
+_deduper: Optional[FrameDeduper] = None
+_deduper_lock = threading.Lock()
+
+
+def get_frame_deduper() -> FrameDeduper:
+    global _deduper
+    if _deduper is None:
+        with _deduper_lock:
+            if _deduper is None:
+                cfg = settings.AI_IMAGE_SETTINGS
+                _deduper = FrameDeduper(cfg['DEDUPE_VENTANA_SEG'], cfg['DEDUPE_HAMMING_MAX'])
+    return _deduper
@@ -0,0 +1,72 @@
+# api/services/image_prep.py
+"""
+Preparación de las imágenes de cámara antes de la inferencia.
+
+Los JPEG se decodifican directamente a escala reducida con draft() (el
+decodificador salta coeficientes: 1/2, 1/4 u 1/8 del tamaño) hasta quedar
+cerca de AI_IMAGE_SETTINGS['MAX_SIZE'], se ajustan a ese tamaño y se
+recodifican una sola vez. Ese mismo buffer va al microservicio y a Storage,
+así que bajan los bytes en la red y el trabajo de decodificación en ambos
+lados. Las imágenes que ya cumplen MAX_SIZE pasan sin tocar.
+"""
+import io
+import logging
+import os
+from typing import Optional, Tuple
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+Frame = Tuple[str, bytes, str]  # (nombre, datos, content_type)
+
+ORIENTACION_EXIF = 0x0112
+
+
+def limite_bytes() -> int:
+    return int(settings.AI_IMAGE_SETTINGS['MAX_FILE_SIZE_MB'] * 1024 * 1024)
+
+
+def excede_tamano(archivo) -> Optional[str]:
+    """Mensaje de error si el archivo subido supera MAX_FILE_SIZE_MB, o None"""
+    if archivo.size is not None and archivo.size > limite_bytes():
+        return (f"La imagen '{archivo.name}' pesa {archivo.size / 1024 / 1024:.1f} MB; "
+                f"el máximo es {settings.AI_IMAGE_SETTINGS['MAX_FILE_SIZE_MB']} MB")
+    return None
+
+
+def preparar_frame(nombre: str, data: bytes, content_type: Optional[str]) -> Frame:
+    """
+    Frame listo para inferir y guardar: a lo sumo MAX_SIZE, JPEG, orientación
+    EXIF aplicada. Si la imagen no se puede decodificar se devuelve tal cual y
+    decide el microservicio.
+    """
+    cfg = settings.AI_IMAGE_SETTINGS
+    max_size = tuple(cfg['MAX_SIZE'])
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            orientacion = img.getexif().get(ORIENTACION_EXIF, 1)
+            if img.format == "JPEG" and img.width <= max_size[0] and img.height <= max_size[1] \
+                    and img.mode in ("RGB", "L") and orientacion == 1:
+                return nombre, data, "image/jpeg"
+
+            original = img.size
+            if img.format == "JPEG":
+                # Las orientaciones 5-8 intercambian ancho y alto al rotar
+                img.draft("RGB", max_size[::-1] if orientacion in (5, 6, 7, 8) else max_size)
+            procesada = ImageOps.exif_transpose(img)
+            if procesada.mode != "RGB":
+                procesada = procesada.convert("RGB")
+            procesada.thumbnail(max_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+            salida = io.BytesIO()
+            procesada.save(salida, format="JPEG", quality=cfg['JPEG_QUALITY'])
+    except Exception as e:
+        logger.warning(f"No se pudo preparar la imagen '{nombre}', se envía sin cambios: {e}")
+        return nombre, data, content_type or "application/octet-stream"
+
+    preparada = salida.getvalue()
+    logger.debug(f"Imagen '{nombre}': {original} {len(data)} B -> {procesada.size} {len(preparada)} B")
+    return f"{os.path.splitext(nombre or 'frame')[0]}.jpg", preparada, "image/jpeg"
+
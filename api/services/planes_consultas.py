@@ -0,0 +1,96 @@
+# api/services/planes_consultas.py
+"""
+Planes de ejecución de las consultas frecuentes de las vistas.
+
+Se usa desde api/tests.py (PostgreSQL sembrado) y desde el comando
+verificar_planes (datos reales): cada consulta pasa por EXPLAIN (FORMAT
+JSON) y se reportan las tablas grandes leídas con Seq Scan, que delatan un
+índice que falta o que el planificador dejó de usar.
+"""
+import json
+from datetime import timedelta
+from typing import Dict, List, Tuple
+
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from ..models import DeteccionPlaca, DetalleMulta, Factura, Pertenece, ReconocimientoFacial, ReporteSeguridad, \
+    Reserva, Usuario
+
+
+def consultas_frecuentes(m: Dict) -> List[Tuple[str, QuerySet]]:
+    """(nombre, queryset) de los filtros calientes de las vistas, con los valores de muestra m"""
+    hoy = timezone.localdate()
+    ahora = timezone.now()
+    vigente = Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=hoy)
+    return [
+        ("usuario por correo", Usuario.objects.filter(correo=m["correo"])),
+        ("vinculación activa del usuario",
+         Pertenece.objects.filter(codigo_usuario=m["usuario"], fecha_ini__lte=hoy).filter(vigente)),
+        ("residente actual de la propiedad",
+         Pertenece.objects.filter(codigo_propiedad=m["propiedad"], fecha_ini__lte=hoy).filter(vigente)
+         .order_by("-fecha_ini")[:1]),
+        ("reservas del área en el día",
+         Reserva.objects.filter(idareac=m["area"], fecha=m["fecha_reserva"]).exclude(estado__iexact="cancelada")),
+        ("multas de la propiedad", DetalleMulta.objects.filter(codigo_propiedad=m["propiedad"]).order_by("-fecha_emi")),
+        ("facturas del usuario por estado",
+         Factura.objects.filter(codigo_usuario=m["usuario"], estado=m["estado_factura"]).order_by("-fecha")),
+        ("rostros últimas 24h", ReconocimientoFacial.objects.filter(fecha_deteccion__gte=ahora - timedelta(hours=24))),
+        ("placas últimas 24h", DeteccionPlaca.objects.filter(fecha_deteccion__gte=ahora - timedelta(hours=24))),
+        ("alertas de la semana", ReporteSeguridad.objects.filter(fecha_evento__gte=ahora - timedelta(days=7))),
+        ("listado de rostros", ReconocimientoFacial.objects.order_by("-fecha_deteccion")[:50]),
+        ("listado de placas", DeteccionPlaca.objects.order_by("-fecha_deteccion")[:50]),
+        ("listado de reportes", ReporteSeguridad.objects.order_by("-fecha_evento")[:50]),
+    ]
+
+
+def muestra() -> Dict:
+    """Valores que existen en la BD, para que cada filtro tenga la selectividad real"""
+    reserva = Reserva.objects.exclude(idareac=None).values("idareac", "fecha").first() or {}
+    return {
+        "correo": Usuario.objects.exclude(correo=None).values_list("correo", flat=True).first() or "",
+        "usuario": Pertenece.objects.values_list("codigo_usuario", flat=True).first() or 0,
+        "propiedad": DetalleMulta.objects.values_list("codigo_propiedad", flat=True).first() or 0,
+        "area": reserva.get("idareac") or 0,
+        "fecha_reserva": reserva.get("fecha") or timezone.localdate(),
+        "estado_factura": Factura.objects.exclude(estado=None).values_list("estado", flat=True).first() or "",
+    }
+
+
+def _recorrer_plan(nodo: Dict):
+    yield nodo
+    for hijo in nodo.get("Plans", []):
+        yield from _recorrer_plan(hijo)
+
+
+def escaneos_secuenciales(plan_json: str) -> List[str]:
+    """Tablas leídas con Seq Scan (incluye los paralelos) en la salida de EXPLAIN (FORMAT JSON)"""
+    plan = json.loads(plan_json)
+    if isinstance(plan, list):
+        plan = plan[0]
+    return sorted({
+        nodo["Relation Name"] for nodo in _recorrer_plan(plan["Plan"])
+        if nodo.get("Node Type") == "Seq Scan" and "Relation Name" in nodo
+    })
+
+
+def filas_de(tabla: str) -> int:
+    """Filas estimadas por el último ANALYZE (o contadas, si la tabla nunca se analizó)"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [connection.ops.quote_name(tabla)])
+        filas = cursor.fetchone()[0]
+        if filas < 0:
+            cursor.execute(f"SELECT count(*) FROM {connection.ops.quote_name(tabla)}")
+            filas = cursor.fetchone()[0]
+    return int(filas)
+
+
+def escaneos_grandes(queryset: QuerySet, umbral: int) -> List[str]:
+    """'Tabla (~N filas)' por cada Seq Scan del plan sobre una tabla de más de umbral filas"""
+    grandes = []
+    for tabla in escaneos_secuenciales(queryset.explain(format="json")):
+        filas = filas_de(tabla)
+        if filas > umbral:
+            grandes.append(f"{tabla} (~{filas} filas)")
+    return grandes
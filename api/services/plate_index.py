@@ -0,0 +1,230 @@
+# api/services/plate_index.py
+"""
+Índice en memoria de las placas de Vehiculo activos, tolerante a errores de OCR.
+
+Las placas se normalizan (mayúsculas, sin guiones ni espacios) y se llevan a
+una forma canónica donde los caracteres que el OCR confunde (0/O/D/Q, 1/I/L,
+5/S, 8/B, 2/Z, 6/G) son el mismo símbolo. Un índice de borrados (la placa y
+todas sus variantes con un carácter menos) resuelve distancia de edición ≤1
+con unas pocas búsquedas en un dict, sin consultar la BD por cada frame.
+
+Se reconstruye entero (la tabla es chica) cuando VehiculoViewSet escribe y
+cada PLATE_INDEX_RESYNC_SEG para recoger cambios hechos por otros procesos.
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from ..models import Vehiculo
+
+logger = logging.getLogger(__name__)
+
+CONFUSIBLES = str.maketrans({
+    "O": "0", "D": "0", "Q": "0",
+    "I": "1", "L": "1",
+    "Z": "2",
+    "S": "5",
+    "G": "6",
+    "B": "8",
+})
+_SEPARADORES = re.compile(r"[^A-Z0-9]")
+
+# Penalizaciones sobre 1.0 (coincidencia exacta de la placa normalizada)
+PENALIZACION_CONFUSIBLE = 0.05
+PENALIZACION_EDICION = 0.2
+
+
+def normalizar_placa(texto: Optional[str]) -> str:
+    """'abc-123 ' -> 'ABC123'"""
+    return _SEPARADORES.sub("", (texto or "").upper())
+
+
+def canonica(normalizada: str) -> str:
+    return normalizada.translate(CONFUSIBLES)
+
+
+def _borrados(texto: str) -> Iterable[str]:
+    return {texto[:i] + texto[i + 1:] for i in range(len(texto))}
+
+
+def _distancia_hasta_uno(a: str, b: str) -> Optional[int]:
+    """Levenshtein si es 0 o 1; None si es mayor"""
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > 1:
+        return None
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return 1 if a[i + 1:] == b[i + 1:] else None  # sustitución
+    return 1 if a[i:] == b[i + 1:] else None  # inserción/borrado
+
+
+@dataclass(frozen=True)
+class PlacaRegistrada:
+    vehiculo_id: int
+    nro_placa: str
+    descripcion: Optional[str]
+    normalizada: str
+
+
+@dataclass(frozen=True)
+class CoincidenciaPlaca:
+    placa: PlacaRegistrada
+    confianza: float
+    distancia: int
+
+    @property
+    def vehiculo_id(self) -> int:
+        return self.placa.vehiculo_id
+
+
+class PlateIndex:
+    """Índice de borrados sobre la forma canónica; seguro entre hilos"""
+
+    def __init__(self):
+        self._por_clave: Dict[str, List[PlacaRegistrada]] = {}
+        self._n = 0
+        self._lock = threading.Lock()
+        self._recargando = threading.Lock()
+        self._vigente = False
+        self._cargado_en = 0.0
+
+    def __len__(self):
+        return self._n
+
+    # ----------------------------- carga -----------------------------
+    def cargar(self, filas: Optional[Iterable[Tuple[int, str, Optional[str]]]] = None):
+        """Reconstruye el índice; filas = (vehiculo_id, nro_placa, descripcion)"""
+        if filas is None:
+            filas = (
+                Vehiculo.objects.filter(estado__iexact="activo")
+                .exclude(nro_placa__isnull=True)
+                .values_list("id", "nro_placa", "descripcion")
+            )
+        por_clave: Dict[str, List[PlacaRegistrada]] = {}
+        n = 0
+        for vehiculo_id, nro_placa, descripcion in filas:
+            normalizada = normalizar_placa(nro_placa)
+            if not normalizada:
+                continue
+            placa = PlacaRegistrada(vehiculo_id, nro_placa, descripcion, normalizada)
+            clave = canonica(normalizada)
+            for k in {clave, *_borrados(clave)}:
+                por_clave.setdefault(k, []).append(placa)
+            n += 1
+
+        with self._lock:
+            self._por_clave, self._n = por_clave, n
+            self._vigente = True
+            self._cargado_en = time.monotonic()
+        logger.info(f"PlateIndex: {n} placa(s) activas indexadas")
+
+    def invalidar(self):
+        """Llamar tras escribir en Vehiculo; la próxima búsqueda reconstruye el índice"""
+        self._vigente = False
+
+    def _asegurar_cargado(self):
+        """Recarga si está invalidado o vencido; dentro de un event loop lo hace en segundo plano"""
+        if self._al_dia():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            with self._recargando:
+                if not self._al_dia():
+                    self.cargar()
+            return
+        self._recargar_en_segundo_plano()
+
+    def _al_dia(self) -> bool:
+        return self._vigente and \
+            time.monotonic() - self._cargado_en <= settings.AI_IMAGE_SETTINGS['PLATE_INDEX_RESYNC_SEG']
+
+    def _recargar_en_segundo_plano(self):
+        if not self._recargando.acquire(blocking=False):
+            return
+
+        def _recargar():
+            from django.db import close_old_connections
+            try:
+                self.cargar()
+            except Exception as e:
+                logger.error(f"Error recargando PlateIndex: {e}")
+            finally:
+                close_old_connections()
+                self._recargando.release()
+
+        threading.Thread(target=_recargar, name="plate-index-recarga", daemon=True).start()
+
+    # --------------------------- búsqueda ----------------------------
+    def buscar(self, texto: Optional[str]) -> Optional[CoincidenciaPlaca]:
+        """
+        Vehículo activo cuya placa coincide con el texto leído (exacta, con
+        caracteres confundibles o a distancia de edición 1), o None si no hay
+        ninguno o si dos placas distintas empatan.
+        """
+        normalizada = normalizar_placa(texto)
+        if not normalizada:
+            return None
+        self._asegurar_cargado()
+        clave = canonica(normalizada)
+        with self._lock:
+            candidatos = {
+                placa for k in {clave, *_borrados(clave)} for placa in self._por_clave.get(k, ())
+            }
+
+        mejores: List[CoincidenciaPlaca] = []
+        for placa in candidatos:
+            distancia = _distancia_hasta_uno(clave, canonica(placa.normalizada))
+            if distancia is None:
+                continue
+            coincidencia = CoincidenciaPlaca(placa, self._confianza(normalizada, placa.normalizada, distancia),
+                                             distancia)
+            if not mejores or coincidencia.confianza > mejores[0].confianza:
+                mejores = [coincidencia]
+            elif coincidencia.confianza == mejores[0].confianza:
+                mejores.append(coincidencia)
+
+        if not mejores:
+            return None
+        if len({c.placa.normalizada for c in mejores}) > 1:
+            logger.warning(f"Placa '{texto}' ambigua entre {sorted(c.placa.nro_placa for c in mejores)}")
+            return None
+        if mejores[0].confianza < settings.AI_IMAGE_SETTINGS['PLATE_MATCH_MIN_CONFIANZA']:
+            return None
+        # La misma placa registrada en varias filas: la más antigua
+        return min(mejores, key=lambda c: c.vehiculo_id)
+
+    @staticmethod
+    def _confianza(leida: str, registrada: str, distancia: int) -> float:
+        """1.0 exacta; se descuenta por cada carácter confundible y por la edición"""
+        if leida == registrada:
+            return 1.0
+        if len(leida) == len(registrada):
+            confusibles = sum(1 for a, b in zip(leida, registrada) if a != b and canonica(a) == canonica(b))
+        else:
+            confusibles = 0
+        return round(max(0.0, 1.0 - confusibles * PENALIZACION_CONFUSIBLE - distancia * PENALIZACION_EDICION), 4)
+
+
+_indice: Optional[PlateIndex] = None
+_indice_lock = threading.Lock()
+
+
+def get_plate_index() -> PlateIndex:
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                _indice = PlateIndex()
+    return _indice
@@ -0,0 +1,227 @@
+# api/services/push_dispatch.py
+import logging
+import random
+from abc import ABC, abstractmethod
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PushDestino:
+    envio_id: int
+    usuario_id: int
+
+
+@dataclass(frozen=True)
+class PushRespuesta:
+    """Respuesta del proveedor para un destinatario"""
+    ok: bool
+    detalle: str = "ok"
+    transitorio: bool = False
+
+
+@dataclass(frozen=True)
+class PushResultado:
+    """Resultado final de un envío, tras los reintentos"""
+    envio_id: int
+    ok: bool
+    detalle: str
+    intentos: int
+
+
+class PushTransitorioError(Exception):
+    """Fallo recuperable de todo el lote (timeout, 429, 5xx del proveedor)"""
+
+
+# ---------------------------------------------------------------------
+# Proveedores
+# ---------------------------------------------------------------------
+class PushProvider(ABC):
+    """
+    Interfaz de proveedor push (FCM/OneSignal/etc.).
+    send_multicast recibe un lote de hasta max_batch_size destinatarios y
+    devuelve una respuesta por envio_id. Un fallo de todo el lote que valga
+    la pena reintentar se señala con PushTransitorioError.
+    """
+    max_batch_size = 500
+
+    @abstractmethod
+    def send_multicast(self, destinos: Sequence[PushDestino], titulo: str, cuerpo: str) -> Dict[int, PushRespuesta]:
+        ...
+
+
+class LogPushProvider(PushProvider):
+    """Proveedor por defecto mientras no haya integración real: solo registra en log"""
+
+    def send_multicast(self, destinos, titulo, cuerpo):
+        logger.debug(f"Push '{titulo}' a {len(destinos)} destinatario(s)")
+        return {d.envio_id: PushRespuesta(ok=True) for d in destinos}
+
+
+class FakePushProvider(PushProvider):
+    """
+    Proveedor local para pruebas y desarrollo. Simula latencia y fallos:
+    - fallos_lote: cuántas llamadas iniciales fallan con PushTransitorioError
+    - usuarios_transitorios / usuarios_rechazados: ids que fallan (recuperable / definitivo)
+    Guarda cada lote recibido en self.lotes.
+    """
+
+    def __init__(self, latencia: float = 0.0, fallos_lote: int = 0,
+                 usuarios_transitorios=None, usuarios_rechazados=None, max_batch_size: int = 500):
+        self.latencia = latencia
+        self.fallos_lote = fallos_lote
+        self.usuarios_transitorios = set(usuarios_transitorios or [])
+        self.usuarios_rechazados = set(usuarios_rechazados or [])
+        self.max_batch_size = max_batch_size
+        self.lotes: List[List[PushDestino]] = []
+        self._lock = threading.Lock()
+
+    def send_multicast(self, destinos, titulo, cuerpo):
+        with self._lock:
+            self.lotes.append(list(destinos))
+            fallar = self.fallos_lote > 0
+            if fallar:
+                self.fallos_lote -= 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        if fallar:
+            raise PushTransitorioError("Proveedor no disponible (simulado)")
+
+        respuestas = {}
+        for d in destinos:
+            if d.usuario_id in self.usuarios_rechazados:
+                respuestas[d.envio_id] = PushRespuesta(ok=False, detalle="destinatario inválido")
+            elif d.usuario_id in self.usuarios_transitorios:
+                respuestas[d.envio_id] = PushRespuesta(ok=False, detalle="no disponible", transitorio=True)
+            else:
+                respuestas[d.envio_id] = PushRespuesta(ok=True)
+        return respuestas
+
+
+# ---------------------------------------------------------------------
+# Control de tasa
+# ---------------------------------------------------------------------
+class RateLimiter:
+    """
+    Token bucket compartido entre hilos. Un lote grande puede dejar el
+    balance en negativo; el hilo espera lo necesario para que la tasa
+    promedio no supere rate_per_second.
+    """
+
+    def __init__(self, rate_per_second: float):
+        self.rate = float(rate_per_second or 0)
+        self._tokens = self.rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: int = 1):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= n
+            espera = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if espera:
+            time.sleep(espera)
+
+
+# ---------------------------------------------------------------------
+# Despachador
+# ---------------------------------------------------------------------
+class PushDispatcher:
+    """Agrupa destinatarios en lotes, los envía en paralelo y reintenta fallos transitorios"""
+
+    def __init__(self, provider: PushProvider, batch_size: int = 500, max_workers: int = 4,
+                 max_reintentos: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 rate_per_second: float = 0):
+        self.provider = provider
+        self.batch_size = max(1, min(batch_size, provider.max_batch_size))
+        self.max_workers = max(1, max_workers)
+        self.max_reintentos = max(0, max_reintentos)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = RateLimiter(rate_per_second)
+
+    def dispatch(self, destinos: Sequence[PushDestino], titulo: str, cuerpo: str) -> Dict[int, PushResultado]:
+        """Envía a todos los destinos y devuelve el resultado por envio_id"""
+        lotes = [destinos[i:i + self.batch_size] for i in range(0, len(destinos), self.batch_size)]
+        if not lotes:
+            return {}
+        if len(lotes) == 1:
+            return self._enviar_lote(lotes[0], titulo, cuerpo)
+
+        resultados: Dict[int, PushResultado] = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(lotes)),
+                                thread_name_prefix="push-lote") as pool:
+            for parcial in pool.map(lambda lote: self._enviar_lote(lote, titulo, cuerpo), lotes):
+                resultados.update(parcial)
+        return resultados
+
+    def _backoff(self, intento: int) -> float:
+        # Exponencial con jitter completo
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (intento - 1))))
+
+    def _enviar_lote(self, lote: Sequence[PushDestino], titulo: str, cuerpo: str) -> Dict[int, PushResultado]:
+        resultados: Dict[int, PushResultado] = {}
+        pendientes = list(lote)
+        intento = 0
+
+        while pendientes:
+            intento += 1
+            self.rate_limiter.acquire(len(pendientes))
+            try:
+                respuestas = self.provider.send_multicast(pendientes, titulo, cuerpo)
+            except PushTransitorioError as e:
+                respuestas = {d.envio_id: PushRespuesta(False, str(e), transitorio=True) for d in pendientes}
+            except Exception as e:
+                logger.error(f"Error del proveedor push: {e}")
+                respuestas = {d.envio_id: PushRespuesta(False, str(e)) for d in pendientes}
+
+            reintentar = []
+            for d in pendientes:
+                r = respuestas.get(d.envio_id) or PushRespuesta(False, "sin respuesta del proveedor", transitorio=True)
+                if r.ok or not r.transitorio or intento > self.max_reintentos:
+                    resultados[d.envio_id] = PushResultado(d.envio_id, r.ok, r.detalle, intento)
+                else:
+                    reintentar.append(d)
+
+            if reintentar:
+                logger.warning(f"Reintentando {len(reintentar)} push (intento {intento + 1})")
+                time.sleep(self._backoff(intento))
+            pendientes = reintentar
+
+        return resultados
+
+
+_dispatcher: Optional[PushDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> PushDispatcher:
+    """Despachador del proceso, configurado desde settings.PUSH_SETTINGS"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                cfg = settings.PUSH_SETTINGS
+                provider = import_string(cfg['PROVIDER'])()
+                _dispatcher = PushDispatcher(
+                    provider,
+                    batch_size=cfg['BATCH_SIZE'],
+                    max_workers=cfg['MAX_WORKERS'],
+                    max_reintentos=cfg['MAX_REINTENTOS'],
+                    backoff_base=cfg['BACKOFF_BASE'],
+                    backoff_max=cfg['BACKOFF_MAX'],
+                    rate_per_second=cfg['RATE_PER_SECOND'],
+                )
+    return _dispatcher
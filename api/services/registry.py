@@ -0,0 +1,79 @@
+# api/services/registry.py
+"""
+Registro de servicios compartidos por proceso.
+
+Los servicios de IA y de Storage son seguros entre hilos y caros de construir
+(create_client + verificación del bucket por red), así que se crean una sola
+vez, en el primer uso o en warm_up(), y se reutilizan en todos los requests.
+"""
+import logging
+import threading
+from typing import Callable, Dict, TypeVar
+
+from django.conf import settings
+
+from .ai_client import get_ai_client
+from .ai_detection import FacialRecognitionService, PlateDetectionService
+from .evidence_spool import iniciar_hilo, modo_spool
+from .face_matcher import get_face_matcher
+from .plate_index import get_plate_index
+from .supabase_storage import SupabaseStorageService
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ServiceRegistry:
+    """Instancias únicas creadas de forma perezosa (double-checked locking)"""
+
+    def __init__(self):
+        self._instancias: Dict[str, object] = {}
+        self._lock = threading.RLock()
+
+    def get(self, nombre: str, fabrica: Callable[[], T]) -> T:
+        instancia = self._instancias.get(nombre)
+        if instancia is None:
+            # RLock: una fábrica puede pedir otro servicio del registro
+            with self._lock:
+                instancia = self._instancias.get(nombre)
+                if instancia is None:
+                    instancia = self._instancias[nombre] = fabrica()
+        return instancia
+
+    def reset(self):
+        """Descarta las instancias (p. ej. tras cambiar credenciales en settings)"""
+        with self._lock:
+            self._instancias.clear()
+
+
+registry = ServiceRegistry()
+
+
+def get_storage_service() -> SupabaseStorageService:
+    return registry.get("storage", SupabaseStorageService)
+
+
+def get_facial_service() -> FacialRecognitionService:
+    return registry.get("facial", lambda: FacialRecognitionService(get_storage_service()))
+
+
+def get_plate_service() -> PlateDetectionService:
+    return registry.get("plate", lambda: PlateDetectionService(get_storage_service()))
+
+
+def warm_up():
+    """Crea los servicios (y verifica el bucket) antes del primer request"""
+    if modo_spool() and settings.AI_CLIENT_SETTINGS['SPOOL_HILO']:
+        # El worker crea el servicio de Storage en su primer lote, aunque falle lo de abajo
+        iniciar_hilo(get_storage_service)
+    try:
+        get_ai_client()
+        get_facial_service()
+        get_plate_service()
+        get_face_matcher().cargar()
+        get_plate_index().cargar()
+        logger.info("Servicios de IA y Storage inicializados")
+    except Exception as e:
+        # El primer request volverá a intentarlo
+        logger.error(f"Error inicializando servicios de IA: {e}")
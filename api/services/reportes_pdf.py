@@ -0,0 +1,167 @@
+# api/services/reportes_pdf.py
+import tempfile
+from decimal import Decimal
+from typing import Dict, IO, Iterable, List, Tuple
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+# Hasta este tamaño el PDF vive en memoria; por encima se vuelca a disco
+SPOOL_MAX_BYTES = 1024 * 1024
+
+MARGEN_X = 40
+MARGEN_INFERIOR = 60
+ALTO_ENCABEZADO = 130
+ALTO_FILA = 16
+
+FORM_ENCABEZADO = "encabezado_estado_cuenta"
+
+
+def _fmt_monto(value) -> str:
+    try:
+        return f"{Decimal(value):.2f}"
+    except Exception:
+        return "0.00"
+
+
+def _fmt_fecha(value) -> str:
+    if not value:
+        return "-"
+    return value.strftime("%Y-%m-%d") if hasattr(value, "strftime") else str(value)
+
+
+def _recortar(texto, max_chars: int) -> str:
+    texto = str(texto or "")
+    return texto if len(texto) <= max_chars else texto[: max_chars - 1] + "…"
+
+
+class _EstadoCuentaCanvas:
+    """Dibuja el estado de cuenta paginando y reutilizando el encabezado como Form XObject"""
+
+    def __init__(self, output: IO[bytes], titular: str, payload: Dict):
+        self.c = canvas.Canvas(output, pagesize=A4)
+        self.w, self.h = A4
+        self.pagina = 0
+        self._definir_encabezado(titular, payload)
+        self._nueva_pagina()
+
+    def _definir_encabezado(self, titular: str, payload: Dict):
+        """El encabezado se define una sola vez y cada página solo lo referencia"""
+        c = self.c
+        c.beginForm(FORM_ENCABEZADO)
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(MARGEN_X, self.h - 60, "Smart Condominium - Estado de Cuenta")
+        c.setFont("Helvetica", 11)
+        c.drawString(MARGEN_X, self.h - 85, f"Titular: {titular}")
+        c.drawString(MARGEN_X, self.h - 100, f"Período: {payload.get('mes', '')}")
+        propiedades = ", ".join(p for p in payload.get("propiedades", []) if p) or "-"
+        c.drawString(MARGEN_X, self.h - 115, f"Propiedades: {_recortar(propiedades, 80)}")
+        c.line(MARGEN_X, self.h - 125, self.w - MARGEN_X, self.h - 125)
+        c.endForm()
+
+    def _nueva_pagina(self):
+        if self.pagina:
+            self.c.showPage()
+        self.pagina += 1
+        self.c.doForm(FORM_ENCABEZADO)
+        self.c.setFont("Helvetica", 9)
+        self.c.drawRightString(self.w - MARGEN_X, MARGEN_INFERIOR - 30, f"Página {self.pagina}")
+        self.y = self.h - ALTO_ENCABEZADO - 20
+
+    def _reservar(self, alto: float):
+        if self.y - alto < MARGEN_INFERIOR:
+            self._nueva_pagina()
+
+    def seccion(self, titulo: str, columnas: List[Tuple[str, float]]):
+        self._reservar(ALTO_FILA * 3)
+        self.c.setFont("Helvetica-Bold", 12)
+        self.c.drawString(MARGEN_X, self.y, titulo)
+        self.y -= ALTO_FILA
+        self._cabecera_columnas(columnas)
+
+    def _cabecera_columnas(self, columnas: List[Tuple[str, float]]):
+        self.c.setFont("Helvetica-Bold", 10)
+        for texto, x in columnas:
+            self.c.drawString(x, self.y, texto)
+        self.y -= ALTO_FILA
+
+    def filas(self, columnas: List[Tuple[str, float]], filas: Iterable[Tuple], monto_x: float):
+        self.c.setFont("Helvetica", 10)
+        hubo_filas = False
+        for fila in filas:
+            hubo_filas = True
+            if self.y - ALTO_FILA < MARGEN_INFERIOR:
+                self._nueva_pagina()
+                self._cabecera_columnas(columnas)
+                self.c.setFont("Helvetica", 10)
+            *textos, monto = fila
+            for (_, x), texto in zip(columnas, textos):
+                self.c.drawString(x, self.y, texto)
+            self.c.drawRightString(monto_x, self.y, monto)
+            self.y -= ALTO_FILA
+        if not hubo_filas:
+            self.c.drawString(MARGEN_X, self.y, "Sin registros.")
+            self.y -= ALTO_FILA
+        self.y -= ALTO_FILA / 2
+
+    def totales(self, totales: Dict, mensaje: str):
+        self._reservar(ALTO_FILA * 5)
+        c = self.c
+        c.line(MARGEN_X, self.y + ALTO_FILA / 2, self.w - MARGEN_X, self.y + ALTO_FILA / 2)
+        c.setFont("Helvetica-Bold", 11)
+        for etiqueta, clave in (("Total cargos", "cargos"), ("Total pagos", "pagos"), ("Saldo", "saldo")):
+            c.drawString(MARGEN_X, self.y, etiqueta)
+            c.drawRightString(self.w - MARGEN_X, self.y, totales.get(clave, "0.00"))
+            self.y -= ALTO_FILA
+        if mensaje:
+            c.setFont("Helvetica-Oblique", 10)
+            c.drawString(MARGEN_X, self.y - ALTO_FILA / 2, mensaje)
+
+    def guardar(self):
+        self.c.showPage()
+        self.c.save()
+
+
+def render_estado_cuenta_pdf(payload: Dict, pagos: List[Dict], titular: str) -> IO[bytes]:
+    """
+    Genera el PDF del estado de cuenta a partir de los datos ya calculados.
+    Devuelve un archivo temporal (spooled) posicionado al inicio; quien lo
+    recibe es responsable de cerrarlo (FileResponse lo hace al terminar).
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+b")
+    try:
+        doc = _EstadoCuentaCanvas(output, titular, payload)
+        w = doc.w
+
+        cols_cargos = [("Fecha", MARGEN_X), ("Tipo", MARGEN_X + 75), ("Descripción", MARGEN_X + 180)]
+        doc.seccion("Cargos", cols_cargos + [("Monto", w - MARGEN_X - 40)])
+        doc.filas(
+            cols_cargos,
+            (
+                (_fmt_fecha(c.get("fecha")), _recortar(c.get("tipo"), 18),
+                 _recortar(c.get("descripcion"), 50), _fmt_monto(c.get("monto")))
+                for c in payload.get("cargos", [])
+            ),
+            monto_x=w - MARGEN_X,
+        )
+
+        cols_pagos = [("Fecha", MARGEN_X), ("Concepto", MARGEN_X + 75), ("Tipo de pago", MARGEN_X + 300)]
+        doc.seccion("Pagos", cols_pagos + [("Monto", w - MARGEN_X - 40)])
+        doc.filas(
+            cols_pagos,
+            (
+                (_fmt_fecha(p.get("fecha")), _recortar(p.get("concepto"), 40),
+                 _recortar(p.get("tipo_pago"), 18), _fmt_monto(p.get("monto")))
+                for p in pagos
+            ),
+            monto_x=w - MARGEN_X,
+        )
+
+        doc.totales(payload.get("totales", {}), payload.get("mensaje", ""))
+        doc.guardar()
+    except Exception:
+        output.close()
+        raise
+
+    output.seek(0)
+    return output
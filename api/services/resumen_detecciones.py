@@ -0,0 +1,131 @@
+# api/services/resumen_detecciones.py
+"""
+Resumen horario de detecciones (ResumenDeteccionHora).
+
+Cada ReconocimientoFacial / DeteccionPlaca suma 1 a la fila de su hora,
+cámara, tipo y resultado dentro de la misma transacción que lo crea (señales
+en api/signals.py), así que los gráficos de cualquier rango leen unas pocas
+filas por hora en lugar de las detecciones crudas. Si el resumen se desfasa
+(cargas directas en BD, cambios de zona horaria) se recalcula con
+`manage.py reconstruir_resumen_detecciones`.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Greatest, TruncDay, TruncHour
+
+from ..models import DeteccionPlaca, ReconocimientoFacial, ResumenDeteccionHora
+
+Clave = Tuple[datetime, str, str, str]  # (hora, tipo, ubicacion_camara, resultado)
+
+INTERVALOS = {
+    "hora": TruncHour,
+    "dia": TruncDay,
+}
+
+
+def inicio_de_hora(fecha: datetime) -> datetime:
+    return fecha.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def clave_de(instancia) -> Optional[Clave]:
+    """Fila del resumen a la que cuenta una detección"""
+    if instancia.fecha_deteccion is None:
+        return None
+    camara = instancia.ubicacion_camara or ""
+    if isinstance(instancia, ReconocimientoFacial):
+        resultado = "residente" if instancia.es_residente else "desconocido"
+        return inicio_de_hora(instancia.fecha_deteccion), "rostro", camara, resultado
+    resultado = "autorizado" if instancia.es_autorizado else "no_autorizado"
+    return inicio_de_hora(instancia.fecha_deteccion), "placa", camara, resultado
+
+
+def sumar(clave: Clave, delta: int):
+    """
+    Suma delta a la fila, dentro de la transacción del llamador. Un alta crea
+    la fila en 0 si no existe; una baja sin fila (resumen reconstruido desde
+    entonces) no la crea, y ninguna deja el total bajo cero.
+    """
+    hora, tipo, camara, resultado = clave
+    filtro = dict(hora=hora, tipo=tipo, ubicacion_camara=camara, resultado=resultado)
+    if delta > 0:
+        ResumenDeteccionHora.objects.bulk_create([ResumenDeteccionHora(total=0, **filtro)], ignore_conflicts=True)
+    ResumenDeteccionHora.objects.filter(**filtro).update(total=Greatest(F("total") + delta, Value(0)))
+
+
+def serie(desde: datetime, hasta: datetime, intervalo: str = "hora", tipo: Optional[str] = None,
+          camara: Optional[str] = None, por_camara: bool = False) -> List[Dict]:
+    """
+    Puntos [{inicio, tipo, resultado[, ubicacion_camara], total}] del rango
+    [desde, hasta), agrupados por hora o por día (en la zona horaria del sitio)
+    """
+    filas = ResumenDeteccionHora.objects.filter(hora__gte=inicio_de_hora(desde), hora__lt=hasta)
+    if tipo:
+        filas = filas.filter(tipo=tipo)
+    if camara is not None:
+        filas = filas.filter(ubicacion_camara=camara)
+
+    grupos = ["inicio", "tipo", "resultado"] + (["ubicacion_camara"] if por_camara else [])
+    return list(
+        filas.annotate(inicio=INTERVALOS[intervalo]("hora"))
+        .values(*grupos)
+        .annotate(total=Sum("total"))
+        .order_by(*grupos)
+    )
+
+
+def _conteos_crudos(modelo, tipo: str, campo_resultado: str, si: str, no: str, desde: Optional[datetime]):
+    filas = modelo.objects.all()
+    if desde is not None:
+        filas = filas.filter(fecha_deteccion__gte=desde)
+    # TruncHour en UTC, igual que inicio_de_hora
+    conteos = (
+        filas.annotate(hora=TruncHour("fecha_deteccion", tzinfo=dt_timezone.utc))
+        .values("hora", "ubicacion_camara", campo_resultado)
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    for c in conteos.iterator(chunk_size=settings.AVISOS_SETTINGS['BULK_BATCH_SIZE']):
+        yield ResumenDeteccionHora(
+            hora=c["hora"],
+            tipo=tipo,
+            ubicacion_camara=c["ubicacion_camara"] or "",
+            resultado=si if c[campo_resultado] else no,
+            total=c["n"],
+        )
+
+
+def reconstruir(desde: Optional[datetime] = None) -> int:
+    """Recalcula el resumen desde las detecciones crudas (todo, o a partir de la hora de desde)"""
+    if desde is not None:
+        desde = inicio_de_hora(desde)
+    filas: Dict[Clave, ResumenDeteccionHora] = {}
+    for fila in (
+        *_conteos_crudos(ReconocimientoFacial, "rostro", "es_residente", "residente", "desconocido", desde),
+        *_conteos_crudos(DeteccionPlaca, "placa", "es_autorizado", "autorizado", "no_autorizado", desde),
+    ):
+        # Cámara NULL y '' caen en la misma fila
+        clave = (fila.hora, fila.tipo, fila.ubicacion_camara, fila.resultado)
+        if clave in filas:
+            filas[clave].total += fila.total
+        else:
+            filas[clave] = fila
+
+    with transaction.atomic():
+        existentes = ResumenDeteccionHora.objects.all()
+        if desde is not None:
+            existentes = existentes.filter(hora__gte=desde)
+        existentes.delete()
+        ResumenDeteccionHora.objects.bulk_create(
+            filas.values(), batch_size=settings.AVISOS_SETTINGS['BULK_BATCH_SIZE']
+        )
+    return len(filas)
+
+
+def rango_por_defecto(ahora: datetime) -> Tuple[datetime, datetime]:
+    """Últimas 24 horas completas más la hora en curso"""
+    hasta = inicio_de_hora(ahora) + timedelta(hours=1)
+    return hasta - timedelta(hours=25), hasta
@@ -1,21 +1,235 @@
 # api/services/supabase_storage.py
 import base64
+import hashlib
 import io
-import uuid
-from datetime import datetime
-from typing import Optional, Dict, Any
-from PIL import Image
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
+import requests
+from PIL import Image, ImageOps
 from supabase import create_client, Client
 from django.conf import settings
 import logging
 from django.core.files.uploadedfile import InMemoryUploadedFile
 
+from .image_prep import ORIENTACION_EXIF
+
 logger = logging.getLogger(__name__)
 
 
+# Tabla de cuantización de luminancia estándar (IJG, calidad 50)
+_LUMA_IJG = (
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99,
+)
+
+
+def preset_almacenamiento(nombre: Optional[str] = None) -> Dict[str, Any]:
+    """Preset de AI_IMAGE_SETTINGS['STORAGE_PRESETS'] (por defecto STORAGE_PRESET)"""
+    cfg = settings.AI_IMAGE_SETTINGS
+    nombre = nombre or cfg['STORAGE_PRESET']
+    try:
+        return cfg['STORAGE_PRESETS'][nombre]
+    except KeyError:
+        raise ValueError(f"Preset de almacenamiento desconocido: '{nombre}'") from None
+
+
+def calidad_jpeg_estimada(image: Image.Image) -> Optional[int]:
+    """Calidad IJG aproximada a partir de la tabla de luminancia del JPEG"""
+    tablas = getattr(image, 'quantization', None)
+    if not tablas or 0 not in tablas:
+        return None
+    escala = sum(tablas[0]) * 100 / sum(_LUMA_IJG)
+    calidad = 5000 / escala if escala > 100 else (200 - escala) / 2
+    return max(1, min(100, round(calidad)))
+
+
+def _sirve_sin_recodificar(image: Image.Image, max_size, calidad_max: int) -> bool:
+    """JPEG ya dentro de tamaño y calidad: recodificarlo solo perdería tiempo y nitidez"""
+    if image.format != 'JPEG' or image.mode not in ('RGB', 'L'):
+        return False
+    if image.width > max_size[0] or image.height > max_size[1]:
+        return False
+    if image.getexif().get(ORIENTACION_EXIF, 1) != 1:
+        return False
+    calidad = calidad_jpeg_estimada(image)
+    return calidad is not None and calidad <= calidad_max
+
+
+def variantes_configuradas() -> Dict[str, Tuple[int, int]]:
+    """AI_IMAGE_SETTINGS['VARIANTES'] de mayor a menor"""
+    variantes = settings.AI_IMAGE_SETTINGS['VARIANTES']
+    return dict(sorted(variantes.items(), key=lambda kv: kv[1][0] * kv[1][1], reverse=True))
+
+
+def generar_variantes(file_data: bytes, variantes: Optional[Dict[str, Tuple[int, int]]] = None,
+                      preset: Optional[str] = None) -> Optional[Dict[str, bytes]]:
+    """
+    JPEG de cada variante ({nombre: (ancho, alto)}, por defecto VARIANTES) a
+    partir de una sola decodificación (CPU, sin red). Los JPEG se decodifican
+    ya a escala reducida con draft() y cada variante se reduce desde la
+    anterior, de mayor a menor. Si el original ya sirve para la variante mayor
+    (tamaño y calidad dentro del preset) se usa tal cual.
+    """
+    try:
+        opciones = preset_almacenamiento(preset)
+        variantes = variantes or variantes_configuradas()
+        orden = sorted(variantes.items(), key=lambda kv: kv[1][0] * kv[1][1], reverse=True)
+        mayor = orden[0][1]
+        salida: Dict[str, bytes] = {}
+        anterior = None  # (tamaño, bytes) de la última variante codificada
+        with Image.open(io.BytesIO(file_data)) as image:
+            if _sirve_sin_recodificar(image, mayor, opciones['quality']):
+                salida[orden[0][0]] = file_data
+                anterior = (image.size, file_data)
+                orden = orden[1:]
+                if not orden:
+                    return salida
+
+            if image.format == 'JPEG':
+                orientacion = image.getexif().get(ORIENTACION_EXIF, 1)
+                image.draft('RGB', mayor[::-1] if orientacion in (5, 6, 7, 8) else mayor)
+            procesada = ImageOps.exif_transpose(image)
+            if procesada.mode != 'RGB':
+                procesada = procesada.convert('RGB')
+
+            for nombre, tamano in orden:
+                # thumbnail reduce en el lugar: la siguiente variante parte de esta
+                procesada.thumbnail(tamano, Image.Resampling[opciones['resample']],
+                                    reducing_gap=opciones['reducing_gap'])
+                if anterior and anterior[0] == procesada.size:
+                    # La imagen ya cabía en esta variante: mismos bytes que la anterior
+                    salida[nombre] = anterior[1]
+                    continue
+                output = io.BytesIO()
+                procesada.save(
+                    output,
+                    format='JPEG',
+                    quality=opciones['quality'],
+                    optimize=opciones['optimize'],
+                    progressive=opciones['progressive'],
+                )
+                salida[nombre] = output.getvalue()
+                anterior = (procesada.size, salida[nombre])
+
+        return salida
+
+    except Exception as e:
+        logger.error(f"Error generando variantes de la imagen ({len(file_data)} bytes): {e}")
+        return None
+
+
+def optimizar_imagen(file_data: bytes, preset: Optional[str] = None) -> Optional[bytes]:
+    """Una sola variante de THUMBNAIL_SIZE, recodificada según el preset"""
+    variantes = generar_variantes(file_data, {'thumbnail': settings.AI_IMAGE_SETTINGS['THUMBNAIL_SIZE']}, preset)
+    return variantes['thumbnail'] if variantes else None
+
+
+def ruta_por_contenido(folder: str, prefix: str, data: bytes) -> Tuple[str, str]:
+    """
+    (filename, file_path) derivados del SHA-256 de los bytes ya procesados:
+    la misma imagen siempre cae en la misma ruta y se guarda una sola vez
+    """
+    filename = f"{prefix}_{hashlib.sha256(data).hexdigest()}.jpg"
+    return filename, f"{folder}/{filename}"
+
+
+class IndiceContenido:
+    """
+    Rutas que ya se sabe que están en el bucket (LRU acotado, por proceso).
+    Un borrado hecho por otro proceso no se ve aquí: por eso cada entrada
+    vence a los ttl_seg y se vuelve a confirmar con HEAD.
+    """
+
+    def __init__(self, maximo: int, ttl_seg: float):
+        self.maximo = maximo
+        self.ttl_seg = ttl_seg
+        self._rutas: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.omitidas = 0
+
+    def contiene(self, file_path: str) -> bool:
+        with self._lock:
+            agregada = self._rutas.get(file_path)
+            if agregada is None:
+                return False
+            if time.monotonic() - agregada > self.ttl_seg:
+                del self._rutas[file_path]
+                return False
+            self._rutas.move_to_end(file_path)
+            return True
+
+    def agregar(self, file_path: str):
+        with self._lock:
+            self._rutas[file_path] = time.monotonic()
+            self._rutas.move_to_end(file_path)
+            while len(self._rutas) > self.maximo:
+                self._rutas.popitem(last=False)
+
+    def contar_omitida(self):
+        with self._lock:
+            self.omitidas += 1
+
+    def quitar(self, file_path: str):
+        with self._lock:
+            self._rutas.pop(file_path, None)
+
+
+_indice: Optional[IndiceContenido] = None
+_indice_lock = threading.Lock()
+
+
+def get_indice_contenido() -> IndiceContenido:
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                cfg = settings.AI_IMAGE_SETTINGS
+                _indice = IndiceContenido(cfg['STORAGE_INDICE_MAX'], cfg['STORAGE_INDICE_TTL_SEG'])
+    return _indice
+
+
+def url_publica(file_path: str) -> str:
+    return f"{settings.SUPABASE_STORAGE_URL}/{file_path}"
+
+
+def urls_variantes(variantes: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+    """{nombre: file_path} guardado en imagen_variantes -> {nombre: URL pública}"""
+    if not variantes:
+        return None
+    return {nombre: url_publica(file_path) for nombre, file_path in variantes.items()}
+
+
+def resultado_subida(file_path: str, filename: str, folder: str, size: int,
+                     variantes: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        'file_path': file_path,
+        'public_url': url_publica(file_path),
+        'filename': filename,
+        'folder': folder,
+        'size_bytes': size,
+        'variantes': variantes or {},
+    }
+
+
+# Subida en paralelo de las variantes de una imagen (solo red)
+_variantes_executor = ThreadPoolExecutor(
+    max_workers=settings.AI_CLIENT_SETTINGS['UPLOAD_WORKERS'],
+    thread_name_prefix="storage-variantes",
+)
+
+
 class SupabaseStorageService:
     """Servicio para manejar almacenamiento de imágenes en Supabase Storage"""
 
+    # Buckets ya verificados en este proceso: list_buckets va por red
+    _buckets_verificados = set()
+    _verificacion_lock = threading.Lock()
+
     def __init__(self):
         self.supabase: Client = create_client(
             settings.SUPABASE_URL,
@@ -25,7 +239,16 @@ class SupabaseStorageService:
         self._ensure_bucket_exists()
 
     def _ensure_bucket_exists(self):
-        """Asegura que el bucket existe"""
+        """Asegura que el bucket existe (una sola vez por proceso)"""
+        if self.bucket_name in self._buckets_verificados:
+            return
+        with self._verificacion_lock:
+            if self.bucket_name in self._buckets_verificados:
+                return
+            if self._verificar_bucket():
+                self._buckets_verificados.add(self.bucket_name)
+
+    def _verificar_bucket(self) -> bool:
         try:
             buckets = self.supabase.storage.list_buckets()
             bucket_exists = any(bucket.name == self.bucket_name for bucket in buckets)
@@ -36,72 +259,33 @@ class SupabaseStorageService:
                     options={"public": True}
                 )
                 logger.info(f"Bucket '{self.bucket_name}' creado exitosamente")
+            return True
 
         except Exception as e:
             logger.error(f"Error verificando/creando bucket: {e}")
+            return False
 
     def upload_base64_image(self, base64_string: str, folder: str, prefix: str = "img") -> Optional[Dict[str, Any]]:
         """Sube una imagen Base64 a Supabase Storage"""
         try:
-            processed_image = self._process_base64_image(base64_string)
-            if not processed_image:
+            variantes = self._process_base64_image(base64_string)
+            if not variantes:
                 return None
 
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = uuid.uuid4().hex[:8]
-            filename = f"{prefix}_{timestamp}_{unique_id}.jpg"
-            file_path = f"{folder}/{filename}"
-
-            response = self.supabase.storage.from_(self.bucket_name).upload(
-                file_path,
-                processed_image,
-                file_options={
-                    "content-type": "image/jpeg",
-                    "cache-control": "3600"
-                }
-            )
-
-            if response:
-                public_url = self.get_public_url(file_path)
-
-                return {
-                    'file_path': file_path,
-                    'public_url': public_url,
-                    'filename': filename,
-                    'folder': folder,
-                    'size_bytes': len(processed_image)
-                }
-
-            return None
+            return self._subir_variantes(variantes, folder, prefix)
 
         except Exception as e:
             logger.error(f"Error subiendo imagen a Supabase: {e}")
             return None
 
-    def _process_base64_image(self, base64_string: str) -> Optional[bytes]:
-        """Procesa y optimiza imagen Base64"""
+    def _process_base64_image(self, base64_string: str) -> Optional[Dict[str, bytes]]:
+        """Procesa imagen Base64 y genera sus variantes"""
         try:
             if base64_string.startswith('data:image'):
                 base64_string = base64_string.split(',', 1)[1]
 
             image_data = base64.b64decode(base64_string)
-            image = Image.open(io.BytesIO(image_data))
-
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-
-            max_size = settings.AI_IMAGE_SETTINGS['THUMBNAIL_SIZE']
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
-
-            output = io.BytesIO()
-            image.save(
-                output,
-                format='JPEG',
-                quality=settings.AI_IMAGE_SETTINGS['JPEG_QUALITY'],
-                optimize=True
-            )
-
-            return output.getvalue()
+            return generar_variantes(image_data)
 
         except Exception as e:
             logger.error(f"Error procesando imagen Base64: {e}")
@@ -109,15 +293,24 @@ class SupabaseStorageService:
 
     def get_public_url(self, file_path: str) -> str:
         """Obtiene URL pública de un archivo"""
-        return f"{settings.SUPABASE_STORAGE_URL}/{file_path}"
+        return url_publica(file_path)
 
     def delete_file(self, file_path: str) -> bool:
-        """Elimina un archivo del storage"""
+        """
+        Elimina un archivo del storage. Con claves por contenido un objeto puede
+        estar referenciado por varios registros: ver ai_detection.borrar_evidencia_sin_uso
+        """
+        return self.delete_files([file_path])
+
+    def delete_files(self, file_paths: List[str]) -> bool:
+        """Elimina varios archivos (p. ej. las variantes de una imagen) en una sola llamada"""
+        for file_path in file_paths:
+            get_indice_contenido().quitar(file_path)
         try:
-            response = self.supabase.storage.from_(self.bucket_name).remove([file_path])
+            response = self.supabase.storage.from_(self.bucket_name).remove(list(file_paths))
             return len(response) > 0
         except Exception as e:
-            logger.error(f"Error eliminando archivo {file_path}: {e}")
+            logger.error(f"Error eliminando archivos {file_paths}: {e}")
             return False
 
     def upload_django_file(self, django_file: InMemoryUploadedFile, folder: str, prefix: str = "img") -> Optional[
@@ -127,64 +320,80 @@ class SupabaseStorageService:
             # Leer y procesar el archivo
             django_file.seek(0)  # Asegurar que estamos al inicio
             file_data = django_file.read()
-
+        except Exception as e:
+            logger.error(f"Error leyendo archivo Django: {e}")
+            return None
+        return self.upload_bytes(file_data, folder, prefix)
+
+    def upload_bytes(self, file_data: bytes, folder: str, prefix: str = "img") -> Optional[Dict[str, Any]]:
+        """
+        Genera las variantes de una imagen ya leída en memoria y las sube.
+        Permite compartir el mismo buffer con la inferencia sin volver a leer
+        el archivo.
+        """
+        try:
             # Procesar la imagen
-            processed_image = self._process_django_file_data(file_data)
-            if not processed_image:
+            variantes = self._process_django_file_data(file_data)
+            if not variantes:
                 return None
-
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = uuid.uuid4().hex[:8]
-            filename = f"{prefix}_{timestamp}_{unique_id}.jpg"
-            file_path = f"{folder}/{filename}"
-
-            response = self.supabase.storage.from_(self.bucket_name).upload(
-                file_path,
-                processed_image,
-                file_options={
-                    "content-type": "image/jpeg",
-                    "cache-control": "3600"
-                }
-            )
-
-            if response:
-                public_url = self.get_public_url(file_path)
-
-                return {
-                    'file_path': file_path,
-                    'public_url': public_url,
-                    'filename': filename,
-                    'folder': folder,
-                    'size_bytes': len(processed_image)
-                }
-
-            return None
+            return self._subir_variantes(variantes, folder, prefix)
 
         except Exception as e:
             logger.error(f"Error subiendo archivo Django a Supabase: {e}")
             return None
 
-    def _process_django_file_data(self, file_data: bytes) -> Optional[bytes]:
-        """Procesa y optimiza datos de archivo Django"""
-        try:
-            image = Image.open(io.BytesIO(file_data))
-
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-
-            max_size = settings.AI_IMAGE_SETTINGS['THUMBNAIL_SIZE']
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
+    def _subir_variantes(self, variantes: Dict[str, bytes], folder: str, prefix: str) -> Optional[Dict[str, Any]]:
+        """Sube las variantes en paralelo; file_path/public_url son los de la variante principal"""
+        rutas = {nombre: ruta_por_contenido(f"{folder}/{nombre}", prefix, data) for nombre, data in variantes.items()}
+        subidas = list(_variantes_executor.map(
+            lambda nombre: self._subir_objeto(rutas[nombre][1], variantes[nombre]), variantes
+        ))
+        if not all(subidas):
+            return None
 
-            output = io.BytesIO()
-            image.save(
-                output,
-                format='JPEG',
-                quality=settings.AI_IMAGE_SETTINGS['JPEG_QUALITY'],
-                optimize=True
-            )
+        principal = settings.AI_IMAGE_SETTINGS['VARIANTE_PRINCIPAL']
+        filename, file_path = rutas[principal]
+        return resultado_subida(file_path, filename, folder, len(variantes[principal]),
+                                {nombre: ruta for nombre, (_, ruta) in rutas.items()})
+
+    def _subir_objeto(self, file_path: str, data: bytes) -> bool:
+        """Sube con clave por contenido; si el objeto ya está en el bucket no se transfiere de nuevo"""
+        indice = get_indice_contenido()
+        if indice.contiene(file_path):
+            indice.contar_omitida()
+            return True
+        if self._existe(file_path):
+            indice.agregar(file_path)
+            indice.contar_omitida()
+            return True
+
+        response = self.supabase.storage.from_(self.bucket_name).upload(
+            file_path,
+            data,
+            file_options={
+                "content-type": "image/jpeg",
+                # El contenido de una ruta nunca cambia
+                "cache-control": "31536000",
+                # Dos subidas simultáneas de la misma imagen no deben fallar
+                "upsert": "true",
+            }
+        )
+        if not response:
+            return False
+        indice.agregar(file_path)
+        return True
 
-            return output.getvalue()
+    def _existe(self, file_path: str) -> bool:
+        """HEAD sobre la URL pública (el bucket es público); ante la duda se sube"""
+        if not settings.AI_IMAGE_SETTINGS['STORAGE_HEAD_CHECK']:
+            return False
+        try:
+            response = requests.head(self.get_public_url(file_path),
+                                     timeout=settings.AI_CLIENT_SETTINGS['CONNECT_TIMEOUT'])
+        except requests.exceptions.RequestException:
+            return False
+        return response.status_code == 200
 
-        except Exception as e:
-            logger.error(f"Error procesando datos de archivo Django: {e}")
-            return None
\ No newline at end of file
+    def _process_django_file_data(self, file_data: bytes) -> Optional[Dict[str, bytes]]:
+        """Procesa datos de archivo Django y genera sus variantes"""
+        return generar_variantes(file_data)
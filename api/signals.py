@@ -0,0 +1,75 @@
+# api/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import DeteccionPlaca, PerfilFacial, ReconocimientoFacial, ReporteSeguridad
+from .services import resumen_detecciones
+from .services.eventos import publicar_evento
+from .services.face_matcher import get_face_matcher
+
+
+@receiver(post_save, sender=ReporteSeguridad)
+def reporte_seguridad_creado(sender, instance: ReporteSeguridad, created, **kwargs):
+    """Las alertas altas/críticas se empujan a las consolas de guardia"""
+    if not created or instance.nivel_alerta not in ("alto", "critico"):
+        return
+    publicar_evento("seguridad", {
+        "id": instance.id,
+        "tipo_evento": instance.tipo_evento,
+        "nivel_alerta": instance.nivel_alerta,
+        "descripcion": instance.descripcion,
+        "fecha_evento": instance.fecha_evento,
+        "reconocimiento_facial": instance.reconocimiento_facial_id,
+        "deteccion_placa": instance.deteccion_placa_id,
+    })
+
+
+@receiver(post_save, sender=PerfilFacial)
+def perfil_facial_guardado(sender, instance: PerfilFacial, **kwargs):
+    """Alta, cambio de encoding o desactivación: se refleja en el FaceMatcher tras el commit"""
+    matcher = get_face_matcher()
+    if instance.activo:
+        perfil_id, usuario_id, encoding = instance.id, instance.codigo_usuario_id, instance.encoding_facial
+        transaction.on_commit(lambda: matcher.agregar(perfil_id, usuario_id, encoding))
+    else:
+        perfil_id = instance.id
+        transaction.on_commit(lambda: matcher.quitar(perfil_id))
+
+
+@receiver(post_delete, sender=PerfilFacial)
+def perfil_facial_eliminado(sender, instance: PerfilFacial, **kwargs):
+    perfil_id = instance.id
+    transaction.on_commit(lambda: get_face_matcher().quitar(perfil_id))
+
+
+# ---- Resumen horario de detecciones (misma transacción que la detección) ----
+@receiver(pre_save, sender=ReconocimientoFacial)
+@receiver(pre_save, sender=DeteccionPlaca)
+def deteccion_por_guardar(sender, instance, **kwargs):
+    """En una edición se recuerda a qué fila contaba antes (hora, cámara o resultado pueden cambiar)"""
+    if instance._state.adding:
+        return
+    anterior = sender.objects.filter(pk=instance.pk).first()
+    instance._clave_resumen_anterior = resumen_detecciones.clave_de(anterior) if anterior else None
+
+
+@receiver(post_save, sender=ReconocimientoFacial)
+@receiver(post_save, sender=DeteccionPlaca)
+def deteccion_guardada(sender, instance, created, **kwargs):
+    clave = resumen_detecciones.clave_de(instance)
+    anterior = None if created else getattr(instance, "_clave_resumen_anterior", None)
+    if clave == anterior:
+        return
+    if anterior:
+        resumen_detecciones.sumar(anterior, -1)
+    if clave:
+        resumen_detecciones.sumar(clave, 1)
+
+
+@receiver(post_delete, sender=ReconocimientoFacial)
+@receiver(post_delete, sender=DeteccionPlaca)
+def deteccion_eliminada(sender, instance, **kwargs):
+    clave = resumen_detecciones.clave_de(instance)
+    if clave:
+        resumen_detecciones.sumar(clave, -1)
@@ -1,3 +1,701 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import AreasComunes, BandejaNotificacion, ContadorNoLeidos, DeteccionPlaca, DetalleMulta, Envio, \
+    Factura, Multa, Notificaciones, Pagos, Pertenece, Propiedad, ReconocimientoFacial, ReporteSeguridad, Reserva, \
+    ResumenDeteccionHora, Usuario
+from .services import avisos, face_matcher, resumen_detecciones
+from .services.bandeja import contar_no_leidos, marcar_leido, marcar_todo_leido, registrar_en_bandeja
+from .services.circuit_breaker import ABIERTO, CERRADO, SEMIABIERTO, CircuitBreaker, CircuitoAbiertoError
+from .services.face_index import IVFIndex
+from .services.face_matcher import CABECERA, FaceMatcher, decodificar_lote, parse_encoding, serializar_encoding
+from .services.planes_consultas import consultas_frecuentes, escaneos_grandes, muestra
+from .services.plate_index import PlateIndex, _distancia_hasta_uno
+from .services.push_dispatch import FakePushProvider, PushDestino, PushDispatcher, PushProvider
+from .services.reportes_pdf import render_estado_cuenta_pdf
+
+def _destinos(n):
+    return [PushDestino(envio_id=i, usuario_id=100 + i) for i in range(1, n + 1)]
+
+
+def _despachador(provider, **kwargs):
+    # Sin espera entre reintentos
+    return PushDispatcher(provider, backoff_base=0, backoff_max=0, **kwargs)
+
+
+class PushDispatcherTests(SimpleTestCase):
+    def test_proveedor_es_abstracto(self):
+        with self.assertRaises(TypeError):
+            PushProvider()
+
+    def test_agrupa_en_lotes_del_tamano_del_proveedor(self):
+        provider = FakePushProvider(max_batch_size=3)
+        resultados = _despachador(provider, batch_size=500).dispatch(_destinos(7), "t", "c")
+
+        self.assertEqual(sorted(len(lote) for lote in provider.lotes), [1, 3, 3])
+        self.assertEqual(sorted(resultados), list(range(1, 8)))
+        self.assertTrue(all(r.ok and r.intentos == 1 for r in resultados.values()))
+
+    def test_reintenta_el_lote_ante_fallo_transitorio(self):
+        provider = FakePushProvider(fallos_lote=2)
+        resultados = _despachador(provider, max_reintentos=3).dispatch(_destinos(4), "t", "c")
+
+        self.assertEqual(len(provider.lotes), 3)
+        self.assertTrue(all(r.ok and r.intentos == 3 for r in resultados.values()))
+
+    def test_transitorio_agota_reintentos(self):
+        provider = FakePushProvider(usuarios_transitorios={101})
+        resultados = _despachador(provider, max_reintentos=2).dispatch(_destinos(2), "t", "c")
+
+        self.assertFalse(resultados[1].ok)
+        self.assertEqual(resultados[1].intentos, 3)
+        self.assertTrue(resultados[2].ok)
+        self.assertEqual(resultados[2].intentos, 1)
+        # Los reintentos solo llevan al destinatario que falló
+        self.assertEqual([len(lote) for lote in provider.lotes], [2, 1, 1])
+
+    def test_rechazo_definitivo_no_se_reintenta(self):
+        provider = FakePushProvider(usuarios_rechazados={101})
+        resultados = _despachador(provider, max_reintentos=3).dispatch(_destinos(3), "t", "c")
+
+        self.assertEqual(len(provider.lotes), 1)
+        self.assertFalse(resultados[1].ok)
+        self.assertEqual(resultados[1].detalle, "destinatario inválido")
+        self.assertEqual(resultados[1].intentos, 1)
+        self.assertTrue(resultados[2].ok and resultados[3].ok)
+
+
+
+class PlateIndexTests(SimpleTestCase):
+    def _indice(self, *filas):
+        indice = PlateIndex()
+        indice.cargar(filas)
+        return indice
+
+    def test_distancia_hasta_uno(self):
+        self.assertEqual(_distancia_hasta_uno("ABC123", "ABC123"), 0)
+        self.assertEqual(_distancia_hasta_uno("ABC123", "ABC129"), 1)
+        self.assertEqual(_distancia_hasta_uno("ABC123", "ABC1234"), 1)
+        self.assertEqual(_distancia_hasta_uno("ABC123", "AC123"), 1)
+        self.assertIsNone(_distancia_hasta_uno("ABC123", "ABD124"))
+        self.assertIsNone(_distancia_hasta_uno("ABC123", "ABC12345"))
+
+    def test_coincidencia_exacta(self):
+        coincidencia = self._indice((1, "ABC-123", "auto")).buscar("abc 123")
+        self.assertEqual(coincidencia.vehiculo_id, 1)
+        self.assertEqual(coincidencia.confianza, 1.0)
+        self.assertEqual(coincidencia.distancia, 0)
+
+    def test_caracter_confundible(self):
+        coincidencia = self._indice((1, "ABC123", None)).buscar("A8C123")
+        self.assertEqual(coincidencia.vehiculo_id, 1)
+        self.assertEqual(coincidencia.confianza, 0.95)
+        self.assertEqual(coincidencia.distancia, 0)
+
+    def test_una_edicion(self):
+        indice = self._indice((1, "ABC123", None))
+        for leida in ("ABC1234", "ABC12", "ABC129"):
+            with self.subTest(leida):
+                coincidencia = indice.buscar(leida)
+                self.assertEqual(coincidencia.vehiculo_id, 1)
+                self.assertEqual(coincidencia.confianza, 0.8)
+                self.assertEqual(coincidencia.distancia, 1)
+
+    def test_dos_ediciones_no_coinciden(self):
+        self.assertIsNone(self._indice((1, "ABC123", None)).buscar("ABD124"))
+
+    def test_empate_entre_placas_distintas(self):
+        self.assertIsNone(self._indice((1, "ABC123", None), (2, "ABC124", None)).buscar("ABC12"))
+
+    def test_misma_placa_en_varias_filas(self):
+        self.assertEqual(self._indice((7, "ABC123", None), (3, "abc-123", None)).buscar("ABC123").vehiculo_id, 3)
+
+    def test_bajo_la_confianza_minima(self):
+        # Cuatro confundibles y una sustitución: 1 - 4 * 0.05 - 0.2 = 0.6
+        indice = self._indice((1, "BOSZ13", None))
+        self.assertLess(PlateIndex._confianza("805219", "BOSZ13", 1),
+                        settings.AI_IMAGE_SETTINGS['PLATE_MATCH_MIN_CONFIANZA'])
+        self.assertIsNone(indice.buscar("805219"))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        # Reloj controlado: time.monotonic del módulo devuelve self.ahora
+        self.ahora = 1000.0
+        reloj = mock.patch("api.services.circuit_breaker.time.monotonic", side_effect=lambda: self.ahora)
+        reloj.start()
+        self.addCleanup(reloj.stop)
+        self.breaker = CircuitBreaker("prueba", fallos_para_abrir=3, lentitud_seg=1.0, espera_seg=30.0)
+
+    def _abrir(self):
+        for _ in range(3):
+            self.breaker.permitir()
+            self.breaker.registrar(0.1, ok=False)
+
+    def test_abre_tras_fallos_seguidos(self):
+        for _ in range(2):
+            self.breaker.permitir()
+            self.breaker.registrar(0.1, ok=False)
+        self.assertEqual(self.breaker.estado()["estado"], CERRADO)
+        self.breaker.registrar(0.1, ok=False)
+        self.assertEqual(self.breaker.estado()["estado"], ABIERTO)
+        self.assertEqual(self.breaker.estado()["aperturas"], 1)
+
+    def test_un_exito_reinicia_la_cuenta(self):
+        self.breaker.registrar(0.1, ok=False)
+        self.breaker.registrar(0.1, ok=False)
+        self.breaker.registrar(0.1, ok=True)
+        self.breaker.registrar(0.1, ok=False)
+        self.assertEqual(self.breaker.estado()["estado"], CERRADO)
+        self.assertEqual(self.breaker.estado()["fallos_seguidos"], 1)
+
+    def test_respuesta_lenta_cuenta_como_fallo(self):
+        for _ in range(3):
+            self.breaker.registrar(5.0, ok=True)
+        self.assertEqual(self.breaker.estado()["estado"], ABIERTO)
+
+    def test_abierto_rechaza_llamadas(self):
+        self._abrir()
+        self.ahora += 29
+        self.assertTrue(self.breaker.rechazaria())
+        with self.assertRaises(CircuitoAbiertoError):
+            self.breaker.permitir()
+        self.assertEqual(self.breaker.estado()["rechazadas"], 1)
+
+    def test_semiabierto_deja_pasar_una_sola_sonda(self):
+        self._abrir()
+        self.ahora += 30
+        self.assertFalse(self.breaker.rechazaria())
+        self.breaker.permitir()
+        self.assertEqual(self.breaker.estado()["estado"], SEMIABIERTO)
+        self.assertTrue(self.breaker.rechazaria())
+        with self.assertRaises(CircuitoAbiertoError):
+            self.breaker.permitir()
+
+    def test_sonda_exitosa_cierra(self):
+        self._abrir()
+        self.ahora += 30
+        self.breaker.permitir()
+        self.breaker.registrar(0.1, ok=True)
+        self.assertEqual(self.breaker.estado()["estado"], CERRADO)
+        self.breaker.permitir()
+
+    def test_sonda_fallida_reabre(self):
+        self._abrir()
+        self.ahora += 30
+        self.breaker.permitir()
+        self.breaker.registrar(0.1, ok=False)
+        self.assertEqual(self.breaker.estado()["estado"], ABIERTO)
+        self.assertEqual(self.breaker.estado()["aperturas"], 2)
+        with self.assertRaises(CircuitoAbiertoError):
+            self.breaker.permitir()
+
+    def test_sonda_sin_respuesta_no_bloquea_para_siempre(self):
+        self._abrir()
+        self.ahora += 30
+        self.breaker.permitir()  # la sonda nunca registra resultado
+        self.ahora += 30
+        self.assertTrue(self.breaker.rechazaria())
+        self.ahora += 1
+        self.assertFalse(self.breaker.rechazaria())
+        self.breaker.permitir()
+
+
+class EncodingFacialTests(SimpleTestCase):
+    vector = [0.25, -1.5, 3.0, 0.125]
+
+    def test_ida_y_vuelta_binaria(self):
+        binario = serializar_encoding(self.vector)
+        self.assertEqual(len(binario), CABECERA.size + 4 * len(self.vector))
+        self.assertEqual(parse_encoding(binario).tolist(), self.vector)
+        self.assertEqual(parse_encoding(memoryview(binario)).tolist(), self.vector)
+
+    def test_formato_anterior_en_texto(self):
+        self.assertEqual(parse_encoding(json.dumps(self.vector)).tolist(), self.vector)
+        self.assertEqual(parse_encoding("0.25, -1.5 3.0 0.125").tolist(), self.vector)
+        self.assertIsNone(parse_encoding(""))
+        self.assertIsNone(parse_encoding("[1, 'x']"))
+
+    def test_cabecera_invalida(self):
+        binario = serializar_encoding(self.vector)
+        cuerpo = binario[CABECERA.size:]
+        for nombre, malo in (
+            ("magia", CABECERA.pack(b"XX", 1, 1, 4) + cuerpo),
+            ("versión", CABECERA.pack(b"FE", 2, 1, 4) + cuerpo),
+            ("tipo", CABECERA.pack(b"FE", 1, 9, 4) + cuerpo),
+            ("dimensión", CABECERA.pack(b"FE", 1, 1, 5) + cuerpo),
+            ("truncado", binario[:-1]),
+            ("sin cabecera", binario[:3]),
+        ):
+            with self.subTest(nombre):
+                self.assertIsNone(parse_encoding(malo))
+
+    def test_migracion_usa_el_mismo_formato(self):
+        migracion = importlib.import_module("api.migrations.0005_perfilfacial_encoding_binario")
+        self.assertEqual(migracion.CABECERA.format, CABECERA.format)
+        self.assertEqual((migracion.MAGIA, migracion.VERSION_ENCODING, migracion.TIPO_FLOAT32),
+                         (face_matcher.MAGIA, face_matcher.VERSION_ENCODING, face_matcher.TIPO_FLOAT32))
+        self.assertEqual(migracion._texto_a_vector(json.dumps(self.vector)), self.vector)
+
+    def test_lote_binario_con_largos_distintos(self):
+        valores = [
+            serializar_encoding([1, 2, 3]),
+            serializar_encoding([1, 2]),
+            serializar_encoding([4, 5, 6]),
+            CABECERA.pack(b"XX", 1, 1, 3) + np.zeros(3, dtype="<f4").tobytes(),
+            None,
+            serializar_encoding([7, 8, 9]),
+        ]
+        matriz, idx = decodificar_lote(valores)
+        self.assertEqual(idx.tolist(), [0, 2, 5])
+        self.assertEqual(matriz.tolist(), [[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+        self.assertEqual(matriz.dtype, np.float32)
+
+    def test_lote_mixto_incluye_filas_sin_migrar(self):
+        valores = [serializar_encoding([1, 2, 3]), "[4, 5, 6]", [7, 8, 9], "[1, 2]", serializar_encoding([0, 0, 1])]
+        matriz, idx = decodificar_lote(valores)
+        self.assertEqual(idx.tolist(), [0, 1, 2, 4])
+        self.assertEqual(matriz.tolist(), [[1, 2, 3], [4, 5, 6], [7, 8, 9], [0, 0, 1]])
+
+    def test_lote_sin_binarios(self):
+        matriz, idx = decodificar_lote(["[1, 2]", "3 4", "x", "[5, 6, 7]"])
+        self.assertEqual(idx.tolist(), [0, 1])
+        self.assertEqual(matriz.tolist(), [[1, 2], [3, 4]])
+        matriz, idx = decodificar_lote([None, ""])
+        self.assertEqual(matriz.shape, (0, 0))
+        self.assertEqual(idx.size, 0)
+
+
+class IVFIndexTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.vectores = rng.normal(size=(200, 8)).astype(np.float32)
+        self.perfiles = np.arange(1, 201, dtype=np.int64)
+        self.usuarios = self.perfiles + 1000
+        self.indice = IVFIndex.entrenar(self.vectores, n_listas=8)
+        self.indice.agregar_lote(self.vectores, self.perfiles, self.usuarios)
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = os.path.join(directorio.name, "face_index.npz")
+
+    def test_busca_el_perfil_exacto(self):
+        for fila in (0, 57, 199):
+            with self.subTest(fila):
+                perfil, usuario, distancia = self.indice.buscar(self.vectores[fila], n_probe=8)
+                self.assertEqual((perfil, usuario), (fila + 1, fila + 1001))
+                self.assertAlmostEqual(distancia, 0.0, places=3)
+
+    def test_altas_y_bajas(self):
+        self.assertTrue(self.indice.quitar(1))
+        self.assertFalse(self.indice.quitar(1))
+        self.assertNotIn(1, self.indice)
+        self.assertNotEqual(self.indice.buscar(self.vectores[0], n_probe=8)[0], 1)
+
+        nuevo = np.full(8, 5.0, dtype=np.float32)
+        self.indice.agregar(500, 77, nuevo)
+        self.assertEqual(len(self.indice), 200)
+        self.assertEqual(self.indice.buscar(nuevo, n_probe=8)[:2], (500, 77))
+        # Re-agregar un perfil lo mueve, no lo duplica
+        self.indice.agregar(500, 77, -nuevo)
+        self.assertEqual(len(self.indice), 200)
+        self.assertEqual(self.indice.buscar(-nuevo, n_probe=8)[:2], (500, 77))
+        # El resto sigue localizable después de los huecos rellenados
+        self.assertEqual(self.indice.buscar(self.vectores[199], n_probe=8)[0], 200)
+
+    def test_guardar_y_cargar(self):
+        self.indice.quitar(10)
+        self.indice.guardar(self.ruta)
+        self.assertEqual([n for n in os.listdir(os.path.dirname(self.ruta)) if n.endswith(".tmp")], [])
+
+        cargado = IVFIndex.cargar(self.ruta)
+        self.assertEqual(len(cargado), 199)
+        self.assertNotIn(10, cargado)
+        self.assertEqual(cargado.buscar(self.vectores[42], n_probe=8)[:2], (43, 1043))
+        self.assertTrue(cargado.contiene_exactamente(np.delete(self.vectores, 9, axis=0),
+                                                     np.delete(self.perfiles, 9)))
+
+    def test_archivo_inexistente_o_corrupto(self):
+        self.assertIsNone(IVFIndex.cargar(self.ruta))
+        self.indice.guardar(self.ruta)
+        with open(self.ruta, "rb") as f:
+            completo = f.read()
+        for nombre, contenido in (("truncado", completo[:len(completo) // 2]), ("basura", b"no es un npz")):
+            with self.subTest(nombre):
+                with open(self.ruta, "wb") as f:
+                    f.write(contenido)
+                self.assertIsNone(IVFIndex.cargar(self.ruta))
+
+    def test_matcher_reconstruye_un_indice_corrupto(self):
+        with open(self.ruta, "wb") as f:
+            f.write(b"no es un npz")
+        cfg = {**settings.AI_IMAGE_SETTINGS, 'FACE_INDEX_MIN_PERFILES': 100, 'FACE_INDEX_PATH': self.ruta}
+        with override_settings(AI_IMAGE_SETTINGS=cfg):
+            indice = FaceMatcher._construir_indice(self.vectores, self.perfiles, self.usuarios)
+        self.assertEqual(len(indice), 200)
+        self.assertTrue(IVFIndex.cargar(self.ruta).contiene_exactamente(self.vectores, self.perfiles))
+
+
+class BandejaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = Usuario.objects.create(nombre="Ana", correo="ana@bandeja.test")
+        cls.beto = Usuario.objects.create(nombre="Beto", correo="beto@bandeja.test")
+        notif = Notificaciones.objects.create(tipo="comunicado", descripcion="Corte de agua")
+        envios = [Envio.objects.create(codigo_usuario=u, id_notific=notif, estado="pendiente")
+                  for u in (cls.ana, cls.ana, cls.beto)]
+        registrar_en_bandeja(notif, envios)
+        cls.entradas_ana = list(
+            BandejaNotificacion.objects.filter(usuario=cls.ana).order_by("id").values_list("id", flat=True)
+        )
+        cls.entrada_beto = BandejaNotificacion.objects.get(usuario=cls.beto).id
+
+    def _cliente(self, usuario):
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user(usuario.correo, email=usuario.correo))
+        return cliente
+
+    def test_registrar_incrementa_el_contador(self):
+        self.assertEqual(contar_no_leidos(self.ana.codigo), 2)
+        self.assertEqual(contar_no_leidos(self.beto.codigo), 1)
+
+    def test_leer_dos_veces_descuenta_una(self):
+        self.assertTrue(marcar_leido(self.ana.codigo, self.entradas_ana[0]))
+        self.assertFalse(marcar_leido(self.ana.codigo, self.entradas_ana[0]))
+        self.assertEqual(contar_no_leidos(self.ana.codigo), 1)
+
+    def test_leer_todo_no_descuenta_las_ya_leidas(self):
+        marcar_leido(self.ana.codigo, self.entradas_ana[0])
+        self.assertEqual(marcar_todo_leido(self.ana.codigo), 1)
+        self.assertEqual(marcar_todo_leido(self.ana.codigo), 0)
+        self.assertEqual(ContadorNoLeidos.objects.get(usuario=self.ana).no_leidos, 0)
+        self.assertEqual(contar_no_leidos(self.beto.codigo), 1)
+
+    def test_contador_nunca_negativo(self):
+        # Contador desfasado (p. ej. reiniciado a mano): la lectura no lo lleva bajo cero
+        ContadorNoLeidos.objects.filter(usuario=self.ana).update(no_leidos=0)
+        self.assertEqual(marcar_todo_leido(self.ana.codigo), 2)
+        self.assertEqual(ContadorNoLeidos.objects.get(usuario=self.ana).no_leidos, 0)
+
+    def test_no_marca_la_entrada_de_otro_usuario(self):
+        self.assertFalse(marcar_leido(self.ana.codigo, self.entrada_beto))
+        self.assertFalse(BandejaNotificacion.objects.get(pk=self.entrada_beto).leido)
+        self.assertEqual(contar_no_leidos(self.ana.codigo), 2)
+
+    def test_leer_por_api(self):
+        cliente = self._cliente(self.ana)
+        url = f"/api/bandeja/{self.entradas_ana[0]}/leer/"
+        self.assertEqual(cliente.post(url).json(), {"no_leidos": 1})
+        # Ya leída: 200 sin volver a descontar
+        self.assertEqual(cliente.post(url).json(), {"no_leidos": 1})
+        self.assertEqual(cliente.get("/api/bandeja/no-leidos/").json(), {"no_leidos": 1})
+
+    def test_leer_entrada_ajena_o_inexistente_por_api(self):
+        cliente = self._cliente(self.ana)
+        for pk in (self.entrada_beto, 999999, "abc"):
+            with self.subTest(pk):
+                self.assertEqual(cliente.post(f"/api/bandeja/{pk}/leer/").status_code, 404)
+        self.assertFalse(BandejaNotificacion.objects.get(pk=self.entrada_beto).leido)
+
+
+class ResumenDeteccionesTests(TestCase):
+    def _totales(self):
+        return {
+            (r.hora, r.tipo, r.ubicacion_camara, r.resultado): r.total
+            for r in ResumenDeteccionHora.objects.exclude(total=0)
+        }
+
+    def _rostro(self, **campos):
+        return ReconocimientoFacial.objects.create(confianza=90, **{"es_residente": True,
+                                                                    "ubicacion_camara": "Portón", **campos})
+
+    def test_alta_suma_a_su_hora_camara_y_resultado(self):
+        rostro = self._rostro()
+        placa = DeteccionPlaca.objects.create(placa_detectada="ABC123", confianza=80, es_autorizado=False,
+                                              ubicacion_camara="Garaje", tipo_acceso="entrada")
+        self._rostro()
+        self.assertEqual(self._totales(), {
+            resumen_detecciones.clave_de(rostro): 2,
+            resumen_detecciones.clave_de(placa): 1,
+        })
+        self.assertEqual(resumen_detecciones.clave_de(placa)[1:], ("placa", "Garaje", "no_autorizado"))
+
+    def test_edicion_mueve_la_cuenta(self):
+        rostro = self._rostro()
+        hora = resumen_detecciones.clave_de(rostro)[0]
+        for campo, valor, clave in (
+            ("fecha_deteccion", rostro.fecha_deteccion - timedelta(hours=3),
+             (hora - timedelta(hours=3), "rostro", "Portón", "residente")),
+            ("ubicacion_camara", "Garaje", (hora - timedelta(hours=3), "rostro", "Garaje", "residente")),
+            ("es_residente", False, (hora - timedelta(hours=3), "rostro", "Garaje", "desconocido")),
+        ):
+            with self.subTest(campo):
+                setattr(rostro, campo, valor)
+                rostro.save()
+                self.assertEqual(self._totales(), {clave: 1})
+
+    def test_guardar_sin_cambios_no_suma(self):
+        rostro = self._rostro()
+        rostro.confianza = 95
+        rostro.save()
+        self.assertEqual(self._totales(), {resumen_detecciones.clave_de(rostro): 1})
+
+    def test_baja_resta(self):
+        rostro = self._rostro()
+        self._rostro().delete()
+        self.assertEqual(self._totales(), {resumen_detecciones.clave_de(rostro): 1})
+        rostro.delete()
+        self.assertEqual(self._totales(), {})
+
+    def test_restar_sin_fila_no_la_crea(self):
+        clave = (resumen_detecciones.inicio_de_hora(timezone.now()), "placa", "Garaje", "autorizado")
+        resumen_detecciones.sumar(clave, -1)
+        self.assertFalse(ResumenDeteccionHora.objects.exists())
+        resumen_detecciones.sumar(clave, 1)
+        resumen_detecciones.sumar(clave, -1)
+        resumen_detecciones.sumar(clave, -1)
+        self.assertEqual(ResumenDeteccionHora.objects.get().total, 0)
+
+    # La vista arma los servicios de IA y Storage al instanciarse: aquí no hacen falta
+    @mock.patch("api.views.get_storage_service")
+    @mock.patch("api.views.get_plate_service")
+    @mock.patch("api.views.get_facial_service")
+    def test_endpoint_serie(self, *servicios):
+        for camara, residente in (("Portón", True), ("Portón", False), ("Garaje", True)):
+            self._rostro(ubicacion_camara=camara, es_residente=residente)
+        DeteccionPlaca.objects.create(placa_detectada="ABC123", confianza=80, es_autorizado=True,
+                                      ubicacion_camara="Garaje", tipo_acceso="entrada")
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user("operador"))
+        url = "/api/ai-detection/detection_timeseries/"
+
+        puntos = cliente.get(url).json()["puntos"]
+        self.assertEqual(sorted((p["tipo"], p["resultado"], p["total"]) for p in puntos), [
+            ("placa", "autorizado", 1), ("rostro", "desconocido", 1), ("rostro", "residente", 2),
+        ])
+        puntos = cliente.get(url, {"tipo": "rostro", "por_camara": "true", "intervalo": "dia"}).json()["puntos"]
+        self.assertEqual(sorted((p["ubicacion_camara"], p["resultado"], p["total"]) for p in puntos), [
+            ("Garaje", "residente", 1), ("Portón", "desconocido", 1), ("Portón", "residente", 1),
+        ])
+        puntos = cliente.get(url, {"camara": "Garaje"}).json()["puntos"]
+        self.assertEqual(sum(p["total"] for p in puntos), 2)
+
+        antes = {"desde": (timezone.now() - timedelta(days=3)).isoformat(),
+                 "hasta": (timezone.now() - timedelta(days=2)).isoformat()}
+        self.assertEqual(cliente.get(url, antes).json()["puntos"], [])
+        self.assertEqual(cliente.get(url, {"intervalo": "semana"}).status_code, 400)
+        self.assertEqual(cliente.get(url, {"tipo": "otro"}).status_code, 400)
+        self.assertEqual(cliente.get(url, {"desde": "ayer"}).status_code, 400)
+
+
+class EstadoCuentaPDFTests(TestCase):
+    MES = "2026-03"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create(nombre="Ana", apellido="Paz", correo="ana@cuenta.test")
+        propiedad = Propiedad.objects.create(nro_casa=12, descripcion="Casa 12")
+        Pertenece.objects.create(codigo_usuario=cls.usuario, codigo_propiedad=propiedad, fecha_ini=date(2025, 1, 1))
+        multa = Multa.objects.create(descripcion="Ruido", monto=Decimal("50.00"), estado="activo")
+        DetalleMulta.objects.create(codigo_propiedad=propiedad, id_multa=multa, fecha_emi=date(2026, 3, 10))
+        DetalleMulta.objects.create(codigo_propiedad=propiedad, id_multa=multa, fecha_emi=date(2026, 4, 10))
+        cuota = Pagos.objects.create(tipo="Cuota", descripcion="Expensas", monto=Decimal("300.00"), estado="activo")
+        Factura.objects.create(codigo_usuario=cls.usuario, id_pago=cuota, fecha=date(2026, 3, 5),
+                               tipo_pago="QR", estado="pagado")
+
+    def _cliente(self):
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user("ana", email=self.usuario.correo))
+        return cliente
+
+    def test_render_varias_paginas(self):
+        payload = {
+            "mes": self.MES,
+            "propiedades": ["Casa 12"],
+            "cargos": [{"tipo": "Multa", "descripcion": f"Cargo {i}", "monto": Decimal("10.00"),
+                        "fecha": date(2026, 3, 1 + i % 28)} for i in range(150)],
+            "totales": {"cargos": "1500.00", "pagos": "0.00", "saldo": "1500.00"},
+            "mensaje": "",
+        }
+        pagos = [{"fecha": "2026-03-05", "concepto": f"Pago {i}", "tipo_pago": "QR", "monto": "5.00"}
+                 for i in range(60)]
+        with render_estado_cuenta_pdf(payload, pagos, "Ana Paz") as pdf:
+            contenido = pdf.read()
+        self.assertTrue(contenido.startswith(b"%PDF"))
+        self.assertGreater(contenido.count(b"/Type /Page\n"), 1)
+
+    def test_descarga_como_adjunto(self):
+        respuesta = self._cliente().get("/api/estado-cuenta.pdf", {"mes": self.MES})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta["Content-Type"], "application/pdf")
+        self.assertEqual(respuesta["Content-Disposition"], f'attachment; filename="estado_cuenta_{self.MES}.pdf"')
+        self.assertTrue(b"".join(respuesta.streaming_content).startswith(b"%PDF"))
+
+    def test_sin_usuario_en_catalogo(self):
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user("otro", email="otro@cuenta.test"))
+        self.assertEqual(cliente.get("/api/estado-cuenta.pdf").status_code, 404)
+
+    def test_json_incluye_las_multas_del_mes(self):
+        datos = self._cliente().get("/api/estado-cuenta/", {"mes": self.MES}).json()
+        multas = [c for c in datos["cargos"] if c["origen"] == "multa"]
+        self.assertEqual(len(multas), 1)
+        self.assertEqual(datos["totales"], {"cargos": "350.00", "pagos": "300.00", "saldo": "50.00"})
+
+
+class DespachoEnviosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create(nombre="Ana", correo="ana@avisos.test")
+        cls.notif = Notificaciones.objects.create(tipo="comunicado", descripcion="Corte de agua")
+
+    def _envio(self, estado, hace: timedelta):
+        momento = timezone.now() - hace
+        return Envio.objects.create(codigo_usuario=self.usuario, id_notific=self.notif, fecha=momento.date(),
+                                    hora=momento.time(), estado=estado).id
+
+    def _despachar(self, limite=10):
+        """Despacha con el proveedor de prueba; devuelve (resultado, [(atomic anidados, estados) por lote])"""
+        vistos = []
+        # TestCase envuelve el test en atomic: cada atomic anidado abre un savepoint
+        base = len(connection.savepoint_ids)
+        despachador = PushDispatcher(FakePushProvider(), backoff_base=0, backoff_max=0)
+        original = despachador.dispatch
+
+        def dispatch(destinos, titulo, cuerpo):
+            estados = dict(Envio.objects.filter(id__in=[d.envio_id for d in destinos]).values_list("id", "estado"))
+            vistos.append((len(connection.savepoint_ids) - base, set(estados.values())))
+            return original(destinos, titulo, cuerpo)
+
+        despachador.dispatch = dispatch
+        with mock.patch.object(avisos, "get_dispatcher", return_value=despachador):
+            return avisos.despachar_envios_programados(limite), vistos
+
+    def _estado(self, envio_id):
+        return Envio.objects.get(pk=envio_id).estado
+
+    def test_push_sale_con_las_filas_reclamadas_y_sin_transaccion(self):
+        vencido = self._envio("programado", timedelta(minutes=1))
+        futuro = self._envio("programado", -timedelta(hours=1))
+        resultado, vistos = self._despachar()
+        self.assertEqual(resultado, (1, 0))
+        self.assertEqual(vistos, [(0, {"enviando"})])
+        self.assertEqual(self._estado(vencido), "enviado")
+        self.assertEqual(self._estado(futuro), "programado")
+
+    def test_reclamos_y_pendientes_abandonados_vuelven_a_la_cola(self):
+        cfg = settings.AVISOS_SETTINGS
+        reclamo_viejo = self._envio("enviando", timedelta(seconds=cfg['RECLAMO_VENCIDO_SEG'] + 60))
+        reclamo_en_curso = self._envio("enviando", timedelta(seconds=5))
+        pendiente_viejo = self._envio("pendiente", timedelta(seconds=cfg['PENDIENTE_VENCIDO_SEG'] + 60))
+        pendiente_reciente = self._envio("pendiente", timedelta(seconds=5))
+        resultado, _ = self._despachar()
+        self.assertEqual(resultado, (2, 0))
+        self.assertEqual(self._estado(reclamo_viejo), "enviado")
+        self.assertEqual(self._estado(pendiente_viejo), "enviado")
+        self.assertEqual(self._estado(reclamo_en_curso), "enviando")
+        self.assertEqual(self._estado(pendiente_reciente), "pendiente")
+
+    def test_despacho_inmediato_reclama_por_lotes(self):
+        ids = [self._envio("pendiente", timedelta(0)) for _ in range(5)]
+        otro = Envio.objects.create(codigo_usuario=self.usuario, estado="pendiente",
+                                    id_notific=Notificaciones.objects.create(tipo="comunicado"))
+        despachador = PushDispatcher(FakePushProvider(), backoff_base=0, backoff_max=0)
+        # El worker cierra su conexión al terminar: aquí es la del test
+        with mock.patch.object(avisos, "get_dispatcher", return_value=despachador), \
+                mock.patch.object(avisos, "close_old_connections"), \
+                mock.patch.dict(settings.AVISOS_SETTINGS, {'BULK_BATCH_SIZE': 2}):
+            avisos._despachar_envios(self.notif.id, "Corte de agua", "Mañana de 8 a 12")
+        self.assertEqual({self._estado(i) for i in ids}, {"enviado"})
+        self.assertEqual(self._estado(otro.id), "pendiente")
+        self.assertEqual([len(lote) for lote in despachador.provider.lotes], [2, 2, 1])
+
+
+def _crear(modelo, filas):
+    return modelo.objects.bulk_create(filas, batch_size=settings.AVISOS_SETTINGS['BULK_BATCH_SIZE'])
+
+
+def _sembrar(n):
+    """n filas por tabla consultada, con fechas repartidas para que los filtros sean selectivos"""
+    hoy = date.today()
+    usuarios = _crear(Usuario, [Usuario(nombre=f"Usuario {i}", correo=f"plan{i}@verificar.test", estado="activo")
+                                for i in range(n // 10)])
+    propiedades = _crear(Propiedad, [Propiedad(nro_casa=i, piso=i % 20) for i in range(n // 20)])
+    areas = _crear(AreasComunes, [AreasComunes(descripcion=f"Área {i}", estado="activo") for i in range(20)])
+    multas = _crear(Multa, [Multa(descripcion=f"Multa {i}") for i in range(10)])
+    pagos = _crear(Pagos, [Pagos(tipo=f"Pago {i}") for i in range(10)])
+
+    _crear(Pertenece, [
+        Pertenece(codigo_usuario=usuarios[i % len(usuarios)], codigo_propiedad=propiedades[i % len(propiedades)],
+                  fecha_ini=hoy - timedelta(days=i % 3650),
+                  fecha_fin=None if i % 3 else hoy - timedelta(days=i % 365))
+        for i in range(n)
+    ])
+    _crear(Reserva, [
+        Reserva(codigousuario=usuarios[i % len(usuarios)], idareac=areas[i % len(areas)],
+                fecha=hoy + timedelta(days=i % 365 - 180), estado="cancelada" if i % 7 == 0 else "confirmada")
+        for i in range(n)
+    ])
+    _crear(DetalleMulta, [
+        DetalleMulta(codigo_propiedad=propiedades[i % len(propiedades)], id_multa=multas[i % len(multas)],
+                     fecha_emi=hoy - timedelta(days=i % 730))
+        for i in range(n)
+    ])
+    _crear(Factura, [
+        Factura(codigo_usuario=usuarios[i % len(usuarios)], id_pago=pagos[i % len(pagos)],
+                fecha=hoy - timedelta(days=i % 730), estado=("pagado", "pendiente", "anulado")[i % 3])
+        for i in range(n)
+    ])
+    _crear(ReconocimientoFacial, [
+        ReconocimientoFacial(confianza=90, es_residente=i % 2 == 0, ubicacion_camara=f"cam{i % 5}")
+        for i in range(n)
+    ])
+    _crear(DeteccionPlaca, [
+        DeteccionPlaca(placa_detectada=f"PLC{i:05d}", confianza=90, es_autorizado=i % 2 == 0,
+                       ubicacion_camara=f"cam{i % 5}", tipo_acceso="entrada")
+        for i in range(n)
+    ])
+    _crear(ReporteSeguridad, [ReporteSeguridad(tipo_evento="acceso_facial", descripcion=f"Evento {i}")
+                              for i in range(n)])
+
+    q = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        # auto_now_add pone la misma fecha a todo el lote: se reparte en un año hacia atrás
+        for modelo, campo in ((ReconocimientoFacial, "fecha_deteccion"), (DeteccionPlaca, "fecha_deteccion"),
+                              (ReporteSeguridad, "fecha_evento")):
+            cursor.execute(
+                f"UPDATE {q(modelo._meta.db_table)} SET {q(modelo._meta.get_field(campo).column)} = "
+                f"%s - ({q(modelo._meta.pk.column)} %% %s) * interval '1 hour'",
+                [timezone.now(), 365 * 24],
+            )
+        for modelo in (Usuario, Propiedad, Pertenece, Reserva, DetalleMulta, Factura,
+                       ReconocimientoFacial, DeteccionPlaca, ReporteSeguridad):
+            cursor.execute(f"ANALYZE {q(modelo._meta.db_table)}")
+
+
+@skipUnless(connection.vendor == "postgresql", "Los planes se verifican con EXPLAIN de PostgreSQL")
+class PlanesConsultasTests(TestCase):
+    FILAS = 20000
+    # Tablas más chicas que esto se leen enteras más rápido que por índice
+    UMBRAL = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        _sembrar(cls.FILAS)
+
+    def test_consultas_frecuentes_sin_seq_scan_en_tablas_grandes(self):
+        for nombre, queryset in consultas_frecuentes(muestra()):
+            with self.subTest(nombre):
+                self.assertEqual(escaneos_grandes(queryset, self.UMBRAL), [], queryset.explain())
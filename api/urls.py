@@ -6,9 +6,10 @@ from .views import (
     NotificacionesViewSet, AreasComunesViewSet, TareasViewSet, VehiculoViewSet,
     PerteneceViewSet, ListaVisitantesViewSet, DetalleMultaViewSet, FacturaViewSet,
     FinanzasViewSet, ComunicadosViewSet, HorariosViewSet, ReservaViewSet,
-    AsignacionViewSet, EnvioViewSet, RegistroViewSet, BitacoraViewSet,
+    AsignacionViewSet, EnvioViewSet, BandejaViewSet, RegistroViewSet, BitacoraViewSet,
     LoginView, RegisterView, LogoutView, AIDetectionViewSet, ReconocimientoFacialViewSet, DeteccionPlacaViewSet,
-    PerfilFacialViewSet, ReporteSeguridadViewSet, EstadoCuentaView, ComprobantePDFView, HealthView
+    PerfilFacialViewSet, ReporteSeguridadViewSet, EstadoCuentaView, eventos_stream, recognize_face_async, detect_plate_async,
+    recognize_face_burst_async, detect_plate_burst_async, EstadoCuentaPDFView, ComprobantePDFView, HealthView
 )
 
 router = DefaultRouter()
@@ -31,6 +32,7 @@ router.register(r'horarios', HorariosViewSet)
 router.register(r'reservas', ReservaViewSet)
 router.register(r'asignaciones', AsignacionViewSet)
 router.register(r'envios', EnvioViewSet)
+router.register(r'bandeja', BandejaViewSet, basename='bandeja')
 router.register(r'registros', RegistroViewSet)
 router.register(r'bitacora', BitacoraViewSet)
 router.register(r'ai-detection', AIDetectionViewSet, basename='ai-detection')
@@ -40,9 +42,18 @@ router.register(r'perfiles-faciales', PerfilFacialViewSet)
 router.register(r'reportes-seguridad', ReporteSeguridadViewSet)
 
 urlpatterns = [
+    # Detección asíncrona para cámaras (servida por ASGI)
+    path('ai-detection/async/recognize-face/', recognize_face_async, name='ai-recognize-face-async'),
+    path('ai-detection/async/detect-plate/',   detect_plate_async,   name='ai-detect-plate-async'),
+    path('ai-detection/async/recognize-face-burst/', recognize_face_burst_async, name='ai-recognize-face-burst-async'),
+    path('ai-detection/async/detect-plate-burst/',   detect_plate_burst_async,   name='ai-detect-plate-burst-async'),
+
     # Todas las rutas de los viewsets
     path('', include(router.urls)),
 
+    # Eventos en tiempo real (SSE, servido por ASGI)
+    path('eventos/', eventos_stream, name='eventos-stream'),
+
     # Health
     path('health/', HealthView.as_view(), name='api-health'),
 
@@ -53,5 +64,6 @@ urlpatterns = [
 
     # Estado de cuenta y comprobante PDF
     path('estado-cuenta/',              EstadoCuentaView.as_view(),   name='estado-cuenta'),
+    path('estado-cuenta.pdf',           EstadoCuentaPDFView.as_view(), name='estado-cuenta-pdf'),
     path('comprobantes/<int:pk>.pdf',   ComprobantePDFView.as_view(), name='comprobante-pdf'),
 ]
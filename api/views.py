@@ -1,6 +1,11 @@
 from decimal import Decimal
-from django.http import FileResponse, Http404
-from rest_framework import viewsets, permissions
+import asyncio
+import json
+from django.conf import settings
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import viewsets, permissions, mixins
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.permissions import IsAuthenticated
@@ -12,8 +17,17 @@ from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
 from django.utils import timezone
 from datetime import timedelta
-from .services.ai_detection import FacialRecognitionService, PlateDetectionService
-from .services.supabase_storage import SupabaseStorageService
+from .services import ai_async
+from .services.ai_client import get_ai_client
+from .services.circuit_breaker import CERRADO, get_ai_breaker
+from .services.ai_detection import borrar_evidencia_sin_uso, leer_frames
+from .services.evidence_spool import get_evidence_spool, modo_spool
+from .services.frame_dedupe import dhash, get_frame_deduper
+from .services.image_prep import excede_tamano
+from .services.plate_index import get_plate_index
+from .services import resumen_detecciones
+from .services.registry import get_facial_service, get_plate_service, get_storage_service
+from .services.supabase_storage import get_indice_contenido
 import logging
 from rest_framework.parsers import MultiPartParser, FormParser
 import traceback
@@ -26,14 +40,20 @@ from io import BytesIO
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from datetime import datetime, timedelta
-from django.db.models import Q, Sum
-from .services.avisos import publicar_comunicado_y_notificar
+from django.db.models import Count, Q, Sum
+from asgiref.sync import sync_to_async
+from .services.audiencias import invalidar_audiencias, pertenece_a_audiencia
+from .services.avisos import publicar_comunicado_y_notificar, programar_comunicado
+from .services.eventos import CANALES as CANALES_EVENTOS, hub as event_hub
+from .services.reportes_pdf import render_estado_cuenta_pdf
+from .services.bandeja import contar_no_leidos, marcar_leido, marcar_todo_leido
 
 from .models import (
     Rol, Usuario, Propiedad, Multa, Pagos, Notificaciones, AreasComunes, Tareas,
     Vehiculo, Pertenece, ListaVisitantes, DetalleMulta, Factura, Finanzas,
     Comunicados, Horarios, Reserva, Asignacion, Envio, Registro, Bitacora,
-    PerfilFacial, ReconocimientoFacial, DeteccionPlaca, ReporteSeguridad
+    PerfilFacial, ReconocimientoFacial, DeteccionPlaca, ReporteSeguridad,
+    BandejaNotificacion, ResumenDeteccionHora
 )
 from .serializers import (
     RolSerializer, UsuarioSerializer, PropiedadSerializer, MultaSerializer,
@@ -44,6 +64,7 @@ from .serializers import (
     BitacoraSerializer, ReconocimientoFacialSerializer, PerfilFacialSerializer, DeteccionPlacaSerializer,
     ReporteSeguridadSerializer, EstadoCuentaSerializer, PagoRealizadoSerializer,
     PublicarComunicadoSerializer, ReservaCreateSerializer, ReservaCancelarSerializer, ReservaReprogramarSerializer,
+    BandejaNotificacionSerializer,
 )
 
 
@@ -56,10 +77,42 @@ class BaseModelViewSet(viewsets.ModelViewSet):
     # Cada viewset define: queryset, serializer_class, filterset_fields, search_fields, ordering_fields
 
 
+class InvalidaAudienciasMixin:
+    """Roles y usuarios alimentan el mapa de audiencias de comunicados: se invalida al escribir"""
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        invalidar_audiencias()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidar_audiencias()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidar_audiencias()
+
+
+class InvalidaIndicePlacasMixin:
+    """Los vehículos activos alimentan el índice de placas de la detección: se invalida al escribir"""
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        get_plate_index().invalidar()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        get_plate_index().invalidar()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        get_plate_index().invalidar()
+
+
 # ---------------------------------------------------------------------
 # Catálogos / tablas simples
 # ---------------------------------------------------------------------
-class RolViewSet(BaseModelViewSet):
+class RolViewSet(InvalidaAudienciasMixin, BaseModelViewSet):
     queryset = Rol.objects.all().order_by('id')
     serializer_class = RolSerializer
     filterset_fields = ['tipo', 'estado']
@@ -462,7 +515,7 @@ class TareasViewSet(BaseModelViewSet):
     ordering_fields = ['id', 'vigencia', 'costos']
 
 
-class VehiculoViewSet(BaseModelViewSet):
+class VehiculoViewSet(InvalidaIndicePlacasMixin, BaseModelViewSet):
     queryset = Vehiculo.objects.all().order_by('id')
     serializer_class = VehiculoSerializer
     filterset_fields = ['estado', 'nroplaca']
@@ -473,7 +526,7 @@ class VehiculoViewSet(BaseModelViewSet):
 # ---------------------------------------------------------------------
 # Entidades con FK
 # ---------------------------------------------------------------------
-class UsuarioViewSet(BaseModelViewSet):
+class UsuarioViewSet(InvalidaAudienciasMixin, BaseModelViewSet):
     queryset = Usuario.objects.all().order_by('codigo')
     serializer_class = UsuarioSerializer
     filterset_fields = ['idrol', 'sexo', 'estado', 'correo', 'telefono']
@@ -660,6 +713,28 @@ class ComunicadosViewSet(BaseModelViewSet):
         fecha_pub = data.get("fecha_publicacion") or now.date()
         hora_pub  = data.get("hora_publicacion")  or now.time()
 
+        # Fecha/hora futura: se programa y la publica el worker publicar_programados
+        publicar_en = timezone.make_aware(datetime.combine(fecha_pub, hora_pub))
+        if publicar_en > now:
+            try:
+                comunicado, programacion = programar_comunicado(
+                    admin=admin,
+                    titulo=data["titulo"],
+                    contenido=data["contenido"],
+                    prioridad=data["prioridad"],
+                    destinatarios=data["destinatarios"],
+                    publicar_en=publicar_en,
+                    usuario_ids=data.get("usuario_ids"),
+                )
+            except Exception as e:
+                return Response({"detail": "Error al programar en la base de datos.", "error": str(e)},
+                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return Response({
+                "comunicado": ComunicadosSerializer(comunicado).data,
+                "programado_para": timezone.localtime(programacion.publicar_en).isoformat(),
+                "mensaje": "Comunicado programado.",
+            }, status=status.HTTP_202_ACCEPTED)
+
         try:
             comunicado, stats = publicar_comunicado_y_notificar(
                 admin=admin,
@@ -678,8 +753,8 @@ class ComunicadosViewSet(BaseModelViewSet):
         body = {
             "comunicado": ComunicadosSerializer(comunicado).data,
             "envio": stats,
-            "mensaje": "Publicado y notificado." if stats["errores"] == 0 else
-                       "Publicado con errores de envío.",
+            "mensaje": "Publicado. Notificaciones en cola de envío." if stats["encolados"] else
+                       "Publicado sin destinatarios.",
         }
         return Response(body, status=200)
 
@@ -1097,6 +1172,59 @@ class EnvioViewSet(BaseModelViewSet):
     ordering_fields = ['id', 'fecha']
 
 
+class BandejaViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Bandeja de notificaciones del usuario autenticado.
+    GET  /api/bandeja/                -> lista (título, tipo, fecha, leído) en una sola consulta
+    GET  /api/bandeja/no-leidos/      -> contador O(1) para polling
+    POST /api/bandeja/<id>/leer/
+    POST /api/bandeja/leer-todo/
+    """
+    serializer_class = BandejaNotificacionSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['leido', 'tipo']
+    # Un id no numérico no llega a marcar_leido (sería un 500 en vez de 404)
+    lookup_value_regex = r"\d+"
+
+    def get_queryset(self):
+        return (
+            BandejaNotificacion.objects
+            .filter(usuario__correo=self.request.user.email)
+            .only("id", "notificacion_id", "titulo", "tipo", "fecha", "leido", "fecha_lectura")
+            .order_by("-fecha", "-id")
+        )
+
+    def _usuario_id(self, request):
+        return Usuario.objects.filter(correo=request.user.email).values_list("codigo", flat=True).first()
+
+    @action(detail=False, methods=['get'], url_path='no-leidos')
+    def no_leidos(self, request):
+        usuario_id = self._usuario_id(request)
+        if usuario_id is None:
+            return Response({"detail": "Usuario no registrado en catálogo."}, status=400)
+        return Response({"no_leidos": contar_no_leidos(usuario_id)}, status=200)
+
+    @action(detail=True, methods=['post'], url_path='leer')
+    def leer(self, request, pk=None):
+        usuario_id = self._usuario_id(request)
+        if usuario_id is None:
+            return Response({"detail": "Usuario no registrado en catálogo."}, status=400)
+        # Sin filas actualizadas: o ya estaba leída, o no existe / es de otro usuario
+        if not marcar_leido(usuario_id, pk) and \
+                not BandejaNotificacion.objects.filter(pk=pk, usuario_id=usuario_id).exists():
+            return Response({"detail": "Notificación no encontrada."}, status=404)
+        return Response({"no_leidos": contar_no_leidos(usuario_id)}, status=200)
+
+    @action(detail=False, methods=['post'], url_path='leer-todo')
+    def leer_todo(self, request):
+        usuario_id = self._usuario_id(request)
+        if usuario_id is None:
+            return Response({"detail": "Usuario no registrado en catálogo."}, status=400)
+        marcadas = marcar_todo_leido(usuario_id)
+        return Response({"marcadas": marcadas, "no_leidos": 0}, status=200)
+
+
 class RegistroViewSet(BaseModelViewSet):
     queryset = Registro.objects.all().order_by('id')
     serializer_class = RegistroSerializer
@@ -1228,6 +1356,7 @@ class RegisterView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         u = serializer.save()  # Usuario creado
+        invalidar_audiencias()
 
         # Sincroniza auth.User (para emitir token y usar TokenAuth)
         dj_user, created = User.objects.get_or_create(
@@ -1318,6 +1447,14 @@ class HealthView(APIView):
                 info["authtoken_token"] = bool(cur.fetchone()[0])
         except Exception:
             info["authtoken_token"] = False
+        info["ai_client"] = get_ai_client().metricas()
+        # Degradado = microservicio de IA caído; el resto de la API sigue atendiendo
+        info["ai_breaker"] = get_ai_breaker().estado()
+        info["ai_status"] = "ok" if info["ai_breaker"]["estado"] == CERRADO else "degraded"
+        info["frames_duplicados_suprimidos"] = get_frame_deduper().suprimidos
+        info["subidas_omitidas_por_contenido"] = get_indice_contenido().omitidas
+        if modo_spool():
+            info["evidencias_en_cola"] = get_evidence_spool().estado()
         return Response(info, status=200)
 
 # Agregar estos ViewSets al final de api/views.py, después de LogoutView y antes de AIDetectionViewSet:
@@ -1363,9 +1500,21 @@ class AIDetectionViewSet(viewsets.ViewSet):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.facial_service = FacialRecognitionService()
-        self.plate_service = PlateDetectionService()
-        self.storage_service = SupabaseStorageService()
+        # Servicios compartidos por proceso (ver services/registry.py)
+        self.facial_service = get_facial_service()
+        self.plate_service = get_plate_service()
+        self.storage_service = get_storage_service()
+
+    @staticmethod
+    def _frame_repetido(clave, image_file):
+        """(huella, decisión de un frame parecido a confirmar) según frame_dedupe; deja el archivo listo para releer"""
+        deduper = get_frame_deduper()
+        if not deduper.activo:
+            return None, None
+        image_file.seek(0)
+        huella, previo = deduper.consultar(clave, image_file.read())
+        image_file.seek(0)
+        return huella, previo
 
     # ============= RECONOCIMIENTO FACIAL =============
     @action(detail=False, methods=['post'])
@@ -1380,20 +1529,23 @@ class AIDetectionViewSet(viewsets.ViewSet):
                     {'error': 'La imagen es requerida como archivo'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            error = excede_tamano(image_file)
+            if error:
+                return Response({'error': error}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
 
             logger.info(f"Procesando reconocimiento facial - cámara: {camera_location}")
 
+            # Frame parecido a uno reciente de esta cámara: se infiere igual y, si se
+            # confirma la misma decisión, no se vuelve a registrar ni a alertar
+            clave = ("face", camera_location)
+            huella, previo = self._frame_repetido(clave, image_file)
+
             # USAR EL NUEVO MÉTODO QUE MANEJA ARCHIVOS DIRECTAMENTE
-            result = self.facial_service.recognize_face_from_file(image_file, camera_location)
-
-            # Crear reporte de seguridad si es necesario
-            if not result['is_resident']:
-                ReporteSeguridad.objects.create(
-                    tipo_evento='intruso_detectado',
-                    reconocimiento_facial_id=result['id'],
-                    descripcion=f"Persona no identificada detectada en {camera_location}",
-                    nivel_alerta='alto'
-                )
+            # (el reporte de intruso se crea junto con el reconocimiento)
+            result = self.facial_service.recognize_face_from_file(image_file, camera_location, previo)
+            if not result.get('success'):
+                return Response(result, status=status.HTTP_502_BAD_GATEWAY)
+            get_frame_deduper().registrar(clave, huella, result)
 
             logger.info(f"Reconocimiento completado - residente: {result['is_resident']}")
             return Response(result, status=status.HTTP_200_OK)
@@ -1419,6 +1571,10 @@ class AIDetectionViewSet(viewsets.ViewSet):
                     'success': False,
                     'error': 'user_id e imagen son requeridos'
                 }, status=status.HTTP_400_BAD_REQUEST)
+            error = excede_tamano(image_file)
+            if error:
+                return Response({'success': False, 'error': error},
+                                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
 
             # Verificar que el usuario existe
             try:
@@ -1476,6 +1632,10 @@ class AIDetectionViewSet(viewsets.ViewSet):
                     'success': False,
                     'error': 'La imagen es requerida como archivo'
                 }, status=status.HTTP_400_BAD_REQUEST)
+            error = excede_tamano(image_file)
+            if error:
+                return Response({'success': False, 'error': error},
+                                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
 
             # Obtener usuario autenticado desde token
             try:
@@ -1662,16 +1822,14 @@ class AIDetectionViewSet(viewsets.ViewSet):
         try:
             perfil = PerfilFacial.objects.get(id=pk)
 
-            # Eliminar imagen de Supabase Storage
-            if perfil.imagen_path:
-                self.storage_service.delete_file(perfil.imagen_path)
-
             # Eliminar registro
             user_name = f"{perfil.codigo_usuario.nombre} {perfil.codigo_usuario.apellido}"
+            # (el FaceMatcher se actualiza por señal)
             perfil.delete()
 
-            # Recargar perfiles faciales en el servicio
-            self.facial_service.load_known_faces()
+            # Eliminar imagen (y variantes) de Supabase Storage si ningún otro registro la usa
+            if perfil.imagen_path:
+                borrar_evidencia_sin_uso(self.storage_service, perfil.imagen_path, perfil.imagen_variantes)
 
             return Response({
                 'success': True,
@@ -1704,22 +1862,25 @@ class AIDetectionViewSet(viewsets.ViewSet):
                     {'error': 'La imagen es requerida como archivo'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            error = excede_tamano(image_file)
+            if error:
+                return Response({'error': error}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
 
             logger.info(f"Procesando detección de placa - cámara: {camera_location}, tipo: {access_type}")
 
+            # Auto esperando en la barrera: si se lee la misma placa que en un frame
+            # parecido reciente, no hay nueva detección ni alerta
+            clave = ("plate", camera_location, access_type)
+            huella, previo = self._frame_repetido(clave, image_file)
+
             # USAR EL NUEVO MÉTODO QUE MANEJA ARCHIVOS DIRECTAMENTE
+            # (el reporte de placa no autorizada se crea junto con la detección)
             result = self.plate_service.detect_plate_from_file(
-                image_file, camera_location, access_type
+                image_file, camera_location, access_type, previo
             )
-
-            # Crear reporte de seguridad si la placa no está autorizada
-            if result['plate'] and not result['is_authorized']:
-                ReporteSeguridad.objects.create(
-                    tipo_evento='placa_no_autorizada',
-                    deteccion_placa_id=result['id'],
-                    descripcion=f"Placa no autorizada detectada: {result['plate']} en {camera_location}",
-                    nivel_alerta='medio'
-                )
+            if not result.get('success'):
+                return Response(result, status=status.HTTP_502_BAD_GATEWAY)
+            get_frame_deduper().registrar(clave, huella, result)
 
             logger.info(f"Detección completada - placa: {result.get('plate', 'No detectada')}")
             return Response(result, status=status.HTTP_200_OK)
@@ -1731,6 +1892,55 @@ class AIDetectionViewSet(viewsets.ViewSet):
                 {'error': 'Error interno del servidor'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+    # ============= RÁFAGAS (varios frames por evento) =============
+    def _frames_de_request(self, request):
+        frames = request.FILES.getlist('images') or request.FILES.getlist('image')
+        if not frames:
+            return None, Response({'error': 'Se requiere al menos un frame en "images"'},
+                                  status=status.HTTP_400_BAD_REQUEST)
+        max_frames = settings.AI_CLIENT_SETTINGS['MAX_FRAMES_RAFAGA']
+        if len(frames) > max_frames:
+            return None, Response({'error': f'Máximo {max_frames} frames por ráfaga'},
+                                  status=status.HTTP_400_BAD_REQUEST)
+        for frame in frames:
+            error = excede_tamano(frame)
+            if error:
+                return None, Response({'error': error}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        return frames, None
+
+    @action(detail=False, methods=['post'])
+    def recognize_face_burst(self, request):
+        """Varios frames de un mismo evento -> un reconocimiento (el más confiable)"""
+        frames, error = self._frames_de_request(request)
+        if error:
+            return error
+        camera_location = request.data.get('camera_location', 'Principal')
+        guardar_evidencia = str(request.data.get('save_evidence', 'true')).lower() != 'false'
+
+        result = self.facial_service.recognize_face_burst(frames, camera_location, guardar_evidencia)
+        if not result.get('success'):
+            return Response(result, status=status.HTTP_502_BAD_GATEWAY)
+        logger.info(f"Ráfaga facial: {result['frames_ok']}/{result['frames']} frames, "
+                    f"residente: {result['is_resident']}")
+        return Response(result, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def detect_plate_burst(self, request):
+        """Varios frames de un mismo vehículo -> una detección (la mejor lectura)"""
+        frames, error = self._frames_de_request(request)
+        if error:
+            return error
+        camera_location = request.data.get('camera_location', 'Estacionamiento')
+        access_type = request.data.get('access_type', 'entrada')
+        guardar_evidencia = str(request.data.get('save_evidence', 'true')).lower() != 'false'
+
+        result = self.plate_service.detect_plate_burst(frames, camera_location, access_type, guardar_evidencia)
+        if not result.get('success'):
+            return Response(result, status=status.HTTP_502_BAD_GATEWAY)
+        logger.info(f"Ráfaga de placa: {result['frames_ok']}/{result['frames']} frames, "
+                    f"placa: {result.get('plate') or 'No detectada'}")
+        return Response(result, status=status.HTTP_200_OK)
+
     # ============= ESTADÍSTICAS =============
     @action(detail=False, methods=['get'])
     def detection_stats(self, request):
@@ -1739,21 +1949,21 @@ class AIDetectionViewSet(viewsets.ViewSet):
             last_24h = now - timedelta(hours=24)
             last_week = now - timedelta(days=7)
 
+            # Una consulta por tabla: cada cifra es un COUNT condicional sobre el mismo recorrido
+            rostros = ReconocimientoFacial.objects.filter(fecha_deteccion__gte=last_24h).aggregate(
+                total=Count('id'),
+                residentes=Count('id', filter=Q(es_residente=True)),
+            )
+            placas = DeteccionPlaca.objects.filter(fecha_deteccion__gte=last_24h).aggregate(
+                total=Count('id'),
+                no_autorizadas=Count('id', filter=Q(es_autorizado=False)),
+            )
+
             stats = {
-                'facial_recognitions_today': ReconocimientoFacial.objects.filter(
-                    fecha_deteccion__gte=last_24h
-                ).count(),
-                'plate_detections_today': DeteccionPlaca.objects.filter(
-                    fecha_deteccion__gte=last_24h
-                ).count(),
-                'residents_detected_today': ReconocimientoFacial.objects.filter(
-                    fecha_deteccion__gte=last_24h,
-                    es_residente=True
-                ).count(),
-                'unauthorized_plates_today': DeteccionPlaca.objects.filter(
-                    fecha_deteccion__gte=last_24h,
-                    es_autorizado=False
-                ).count(),
+                'facial_recognitions_today': rostros['total'],
+                'plate_detections_today': placas['total'],
+                'residents_detected_today': rostros['residentes'],
+                'unauthorized_plates_today': placas['no_autorizadas'],
                 'security_alerts_week': ReporteSeguridad.objects.filter(
                     fecha_evento__gte=last_week,
                     nivel_alerta__in=['alto', 'critico']
@@ -1770,6 +1980,263 @@ class AIDetectionViewSet(viewsets.ViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['get'])
+    def detection_timeseries(self, request):
+        """
+        GET /api/ai-detection/detection_timeseries/?desde=ISO&hasta=ISO&intervalo=hora|dia
+            [&tipo=rostro|placa][&camara=...][&por_camara=true]
+        Serie para gráficos desde el resumen horario (sin leer detecciones crudas).
+        Por defecto, las últimas 24 horas por hora.
+        """
+        params = request.query_params
+        desde, hasta = resumen_detecciones.rango_por_defecto(timezone.now())
+        try:
+            if params.get('desde'):
+                desde = self._parse_instante(params['desde'])
+            if params.get('hasta'):
+                hasta = self._parse_instante(params['hasta'])
+        except ValueError:
+            return Response({'error': 'desde/hasta deben ser fechas ISO 8601 (YYYY-MM-DD o YYYY-MM-DDTHH:MM)'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        intervalo = params.get('intervalo', 'hora')
+        if intervalo not in resumen_detecciones.INTERVALOS:
+            return Response({'error': f"intervalo debe ser uno de {list(resumen_detecciones.INTERVALOS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        tipo = params.get('tipo')
+        if tipo and tipo not in dict(ResumenDeteccionHora.TIPOS):
+            return Response({'error': "tipo debe ser 'rostro' o 'placa'"}, status=status.HTTP_400_BAD_REQUEST)
+        if hasta <= desde:
+            return Response({'error': 'hasta debe ser posterior a desde'}, status=status.HTTP_400_BAD_REQUEST)
+
+        puntos = resumen_detecciones.serie(
+            desde, hasta, intervalo, tipo=tipo, camara=params.get('camara'),
+            por_camara=params.get('por_camara', '').lower() in ('1', 'true'),
+        )
+        return Response({
+            'desde': desde,
+            'hasta': hasta,
+            'intervalo': intervalo,
+            'puntos': puntos,
+        }, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _parse_instante(valor: str) -> datetime:
+        """ISO 8601; sin zona horaria se interpreta en la del sitio"""
+        instante = datetime.fromisoformat(valor)
+        if timezone.is_naive(instante):
+            instante = timezone.make_aware(instante)
+        return instante
+
+
+# -------- Endpoint: Eventos en tiempo real (SSE) ----------
+async def _usuario_desde_token(request):
+    """
+    EventSource no permite cabeceras: el token llega como ?token=, o en
+    Authorization si el cliente sí puede enviarla.
+    """
+    key = request.GET.get("token")
+    auth = request.headers.get("Authorization", "")
+    if not key and auth.startswith("Token "):
+        key = auth.split(" ", 1)[1].strip()
+    if not key:
+        return None
+    token = await Token.objects.select_related("user").filter(key=key).afirst()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+async def eventos_stream(request):
+    """
+    GET /api/eventos/?token=<token>&canales=comunicados,envios,seguridad
+    Stream SSE. Pensado para servirse con ASGI (uvicorn): cada conexión es una
+    corrutina en espera, de modo que un worker sostiene miles de clientes.
+    """
+    dj_user = await _usuario_desde_token(request)
+    if dj_user is None:
+        return JsonResponse({"detail": "Token inválido o ausente."}, status=401)
+
+    fila = await (
+        Usuario.objects.filter(correo=dj_user.email).values_list("codigo", "idrol_id", "estado").afirst()
+    )
+    if fila is None:
+        return JsonResponse({"detail": "Usuario no registrado en catálogo."}, status=400)
+    usuario_id, idrol_id, estado = fila
+
+    pedidos = request.GET.get("canales") or "comunicados,envios"
+    canales = {c.strip() for c in pedidos.split(",") if c.strip() in CANALES_EVENTOS}
+    if "seguridad" in canales and not dj_user.is_staff:
+        es_personal = await sync_to_async(pertenece_a_audiencia)("personal", idrol_id, estado)
+        if not es_personal:
+            canales.discard("seguridad")
+    if not canales:
+        return JsonResponse({"detail": "Ningún canal válido solicitado."}, status=400)
+
+    heartbeat = settings.EVENTOS_SETTINGS['HEARTBEAT_SEG']
+    sub = event_hub.subscribe(usuario_id, canales)
+
+    async def stream():
+        try:
+            yield f"retry: 5000\nevent: conectado\ndata: {json.dumps(sorted(canales))}\n\n"
+            while True:
+                try:
+                    evento = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if evento is None:
+                    break
+                data = json.dumps(evento["datos"], default=str)
+                yield f"event: {evento['canal']}\ndata: {data}\n\n"
+        finally:
+            event_hub.unsubscribe(sub)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+# -------- Endpoints de detección asíncronos (ASGI) ----------
+async def _leer_imagen(request):
+    """Valida token e imagen; devuelve (dj_user, archivo, bytes) o una respuesta de error"""
+    dj_user = await _usuario_desde_token(request)
+    if dj_user is None:
+        return JsonResponse({"detail": "Token inválido o ausente."}, status=401)
+    image_file = request.FILES.get('image')
+    if not image_file:
+        return JsonResponse({'error': 'La imagen es requerida como archivo'}, status=400)
+    error = excede_tamano(image_file)
+    if error:
+        return JsonResponse({'error': error}, status=413)
+    return dj_user, image_file, image_file.read()
+
+
+async def _frame_repetido(clave, data: bytes):
+    """Como AIDetectionViewSet._frame_repetido; el hash se calcula fuera del event loop"""
+    deduper = get_frame_deduper()
+    if not deduper.activo:
+        return None, None
+    huella = await asyncio.to_thread(dhash, data)
+    if huella is None:
+        return None, None
+    return huella, deduper.buscar(clave, huella)
+
+
+@csrf_exempt
+@require_POST
+async def recognize_face_async(request):
+    """
+    POST /api/ai-detection/async/recognize-face/ (multipart: image, camera_location)
+    Igual que ai-detection/recognize_face/, pero sin bloquear un worker mientras
+    esperan el microservicio y Storage.
+    """
+    leido = await _leer_imagen(request)
+    if isinstance(leido, JsonResponse):
+        return leido
+    _, image_file, data = leido
+    camera_location = request.POST.get('camera_location', 'Principal')
+
+    clave = ("face", camera_location)
+    huella, previo = await _frame_repetido(clave, data)
+
+    try:
+        result = await ai_async.reconocer_rostro(
+            data, image_file.name, image_file.content_type, camera_location, previo
+        )
+    except Exception as e:
+        logger.error(f"Error en reconocimiento facial async: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        return JsonResponse({'error': 'Error interno del servidor'}, status=500)
+    get_frame_deduper().registrar(clave, huella, result)
+    return JsonResponse(result, status=200 if result.get('success') else 502)
+
+
+@csrf_exempt
+@require_POST
+async def detect_plate_async(request):
+    """
+    POST /api/ai-detection/async/detect-plate/ (multipart: image, camera_location, access_type)
+    """
+    leido = await _leer_imagen(request)
+    if isinstance(leido, JsonResponse):
+        return leido
+    _, image_file, data = leido
+    camera_location = request.POST.get('camera_location', 'Estacionamiento')
+    access_type = request.POST.get('access_type', 'entrada')
+
+    clave = ("plate", camera_location, access_type)
+    huella, previo = await _frame_repetido(clave, data)
+
+    try:
+        result = await ai_async.detectar_placa(
+            data, image_file.name, image_file.content_type, camera_location, access_type, previo
+        )
+    except Exception as e:
+        logger.error(f"Error en detección de placa async: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        return JsonResponse({'error': 'Error interno del servidor'}, status=500)
+    get_frame_deduper().registrar(clave, huella, result)
+    return JsonResponse(result, status=200 if result.get('success') else 502)
+
+
+async def _leer_rafaga(request):
+    """Como _leer_imagen, para varios frames en 'images'"""
+    dj_user = await _usuario_desde_token(request)
+    if dj_user is None:
+        return JsonResponse({"detail": "Token inválido o ausente."}, status=401)
+    frames = request.FILES.getlist('images') or request.FILES.getlist('image')
+    if not frames:
+        return JsonResponse({'error': 'Se requiere al menos un frame en "images"'}, status=400)
+    max_frames = settings.AI_CLIENT_SETTINGS['MAX_FRAMES_RAFAGA']
+    if len(frames) > max_frames:
+        return JsonResponse({'error': f'Máximo {max_frames} frames por ráfaga'}, status=400)
+    for frame in frames:
+        error = excede_tamano(frame)
+        if error:
+            return JsonResponse({'error': error}, status=413)
+    # Decodificar y reducir los frames es CPU: fuera del event loop
+    return await asyncio.to_thread(leer_frames, frames)
+
+
+@csrf_exempt
+@require_POST
+async def recognize_face_burst_async(request):
+    """POST /api/ai-detection/async/recognize-face-burst/ (multipart: images[], camera_location, save_evidence)"""
+    frames = await _leer_rafaga(request)
+    if isinstance(frames, JsonResponse):
+        return frames
+    camera_location = request.POST.get('camera_location', 'Principal')
+    guardar_evidencia = request.POST.get('save_evidence', 'true').lower() != 'false'
+
+    try:
+        result = await ai_async.reconocer_rafaga(frames, camera_location, guardar_evidencia)
+    except Exception as e:
+        logger.error(f"Error en ráfaga facial async: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        return JsonResponse({'error': 'Error interno del servidor'}, status=500)
+    return JsonResponse(result, status=200 if result.get('success') else 502)
+
+
+@csrf_exempt
+@require_POST
+async def detect_plate_burst_async(request):
+    """POST /api/ai-detection/async/detect-plate-burst/ (multipart: images[], camera_location, access_type)"""
+    frames = await _leer_rafaga(request)
+    if isinstance(frames, JsonResponse):
+        return frames
+    camera_location = request.POST.get('camera_location', 'Estacionamiento')
+    access_type = request.POST.get('access_type', 'entrada')
+    guardar_evidencia = request.POST.get('save_evidence', 'true').lower() != 'false'
+
+    try:
+        result = await ai_async.detectar_placa_rafaga(frames, camera_location, access_type, guardar_evidencia)
+    except Exception as e:
+        logger.error(f"Error en ráfaga de placa async: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        return JsonResponse({'error': 'Error interno del servidor'}, status=500)
+    return JsonResponse(result, status=200 if result.get('success') else 502)
+
 
 # -------- Helpers ----------
 def _month_range(yyyy_mm: str):
@@ -1803,6 +2270,91 @@ def _bitacora(request, accion: str):
         pass
 
 
+def _estado_cuenta_payload(user: Usuario, mes: str) -> dict:
+    """Calcula cargos, pagos y totales del usuario para el mes 'YYYY-MM'."""
+    desde, hasta = _month_range(mes)
+
+    # propiedades del usuario (ocupación vigente en el período)
+    pertenencias = (
+        Pertenece.objects
+        .filter(codigo_usuario=user, fecha_ini__lte=hasta)
+        .filter(Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=desde))
+        .select_related("codigo_propiedad")
+    )
+
+    propiedades = [p.codigo_propiedad for p in pertenencias]
+    props_desc = [p.codigo_propiedad.descripcion for p in pertenencias]
+
+    # CARGOS
+    cargos = []
+
+    # a) cat. Pagos vigentes (si tu tabla Pagos no tiene 'estado', elimina el filter(estado="activo"))
+    pagos_catalogo_qs = Pagos.objects.all()
+    if hasattr(Pagos, "estado"):
+        pagos_catalogo_qs = pagos_catalogo_qs.filter(estado="activo")
+
+    for p in pagos_catalogo_qs:
+        cargos.append({
+            "tipo": p.tipo,                       # 'Cuota ordinaria', 'Servicio', etc.
+            "descripcion": p.descripcion,
+            "monto": p.monto,
+            "origen": "pago",
+            "fecha": None,
+        })
+
+    # b) Multas emitidas a sus propiedades dentro del mes
+    if propiedades:
+        multas_qs = (
+            DetalleMulta.objects
+            .filter(codigo_propiedad__in=[pp.codigo for pp in propiedades],
+                    fecha_emi__range=(desde, hasta))
+            .select_related("id_multa", "codigo_propiedad")
+        )
+        for dm in multas_qs:
+            m = dm.id_multa
+            # si Multa tiene 'estado', sólo contamos activas
+            if hasattr(Multa, "estado") and m.estado != "activo":
+                continue
+            cargos.append({
+                "tipo": "Multa",
+                "descripcion": m.descripcion,
+                "monto": m.monto,
+                "origen": "multa",
+                "fecha": dm.fecha_emi,
+            })
+
+    total_cargos = sum((Decimal(c["monto"]) for c in cargos), Decimal("0.00"))
+
+    # PAGOS del usuario en el mes (Facturas pagadas)
+    pagos_qs = (
+        Factura.objects
+        .filter(codigo_usuario=user, fecha__range=(desde, hasta), estado="pagado")
+        .select_related("id_pago", "codigo_usuario")
+    )
+
+    total_pagos = pagos_qs.aggregate(s=Sum("id_pago__monto"))["s"] or Decimal("0.00")
+
+    saldo = total_cargos - total_pagos
+
+    # E1: sin info
+    mensaje = ""
+    if not cargos and not pagos_qs.exists():
+        mensaje = "No existen registros para el período seleccionado."
+
+    return {
+        "mes": mes,
+        "propiedades": props_desc,
+        "cargos": cargos,
+        "pagos": pagos_qs,
+        "totales": {
+            "cargos": f"{total_cargos:.2f}",
+            "pagos": f"{total_pagos:.2f}",
+            "saldo": f"{saldo:.2f}",
+        },
+        "mensaje": mensaje,
+    }
+
+
 # -------- Endpoint: Estado de Cuenta ----------
 class EstadoCuentaView(APIView):
     permission_classes = [IsAuthenticated]
@@ -1816,94 +2368,36 @@ class EstadoCuentaView(APIView):
 
         # 2) mes (YYYY-MM)
         mes = request.query_params.get("mes") or date.today().strftime("%Y-%m")
-        desde, hasta = _month_range(mes)
-
-        # 3) propiedades del usuario (ocupación vigente en el período)
-        pertenencias = (
-            Pertenece.objects
-            .filter(codigo_usuario=user, fecha_ini__lte=hasta)
-            .filter(Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=desde))
-            .select_related("codigo_propiedad")
-        )
-
-        propiedades = [p.codigo_propiedad for p in pertenencias]
-        props_desc = [p.codigo_propiedad.descripcion for p in pertenencias]
-
-        # 4) CARGOS
-        cargos = []
+        payload = _estado_cuenta_payload(user, mes)
 
-        # a) cat. Pagos vigentes (si tu tabla Pagos no tiene 'estado', elimina el filter(estado="activo"))
-        pagos_catalogo_qs = Pagos.objects.all()
-        if hasattr(Pagos, "estado"):
-            pagos_catalogo_qs = pagos_catalogo_qs.filter(estado="activo")
-
-        for p in pagos_catalogo_qs:
-            cargos.append({
-                "tipo": p.tipo,                       # 'Cuota ordinaria', 'Servicio', etc.
-                "descripcion": p.descripcion,
-                "monto": p.monto,
-                "origen": "pago",
-                "fecha": None,
-            })
+        # 3) Bitácora
+        _bitacora(request, f"Consulta estado de cuenta {mes}")
 
-        # b) Multas emitidas a sus propiedades dentro del mes
-        if propiedades:
-            multas_qs = (
-                DetalleMulta.objects
-                .filter(codigo_propiedad__in=[pp.codigo for pp in propiedades],
-                        fechaemi__range=(desde, hasta))
-                .select_related("id_multa", "codigo_propiedad")
-            )
-            for dm in multas_qs:
-                m = dm.id_multa
-                # si Multa tiene 'estado', sólo contamos activas
-                if hasattr(Multa, "estado") and m.estado != "activo":
-                    continue
-                cargos.append({
-                    "tipo": "Multa",
-                    "descripcion": m.descripcion,
-                    "monto": m.monto,
-                    "origen": "multa",
-                    "fecha": dm.fecha_emi,
-                })
+        # Validamos contra el envelope final antes de responder
+        return Response(EstadoCuentaSerializer(payload).data, status=200)
 
-        total_cargos = sum((Decimal(c["monto"]) for c in cargos), Decimal("0.00"))
 
-        # 5) PAGOS del usuario en el mes (Facturas pagadas)
-        pagos_qs = (
-            Factura.objects
-            .filter(codigo_usuario=user, fecha__range=(desde, hasta), estado="pagado")
-            .select_related("id_pago", "codigo_usuario")
-        )
+# -------- Endpoint: Estado de Cuenta (PDF) ----------
+class EstadoCuentaPDFView(APIView):
+    permission_classes = [IsAuthenticated]
 
-       # pagos_ser = PagoRealizadoSerializer(pagos_qs, many=True).data   # <- usar serializer de consulta
-        total_pagos = pagos_qs.aggregate(s=Sum("id_pago__monto"))["s"] or Decimal("0.00")
+    def get(self, request):
+        try:
+            user = Usuario.objects.get(correo=request.user.email)
+        except Usuario.DoesNotExist:
+            raise Http404()
 
-        saldo = total_cargos - total_pagos
+        mes = request.query_params.get("mes") or date.today().strftime("%Y-%m")
+        payload = _estado_cuenta_payload(user, mes)
+        pagos = PagoRealizadoSerializer(payload["pagos"], many=True).data
 
-        # 6) E1: sin info
-        mensaje = ""
-        if not cargos and not pagos_qs.exists():
-            mensaje = "No existen registros para el período seleccionado."
+        titular = f"{user.nombre or ''} {user.apellido or ''}".strip() or user.correo
+        pdf = render_estado_cuenta_pdf(payload, pagos, titular)
 
-        # 7) Bitácora
-        _bitacora(request, f"Consulta estado de cuenta {mes}")
+        _bitacora(request, f"Descarga estado de cuenta PDF {mes}")
 
-        payload = {
-            "mes": mes,
-            "propiedades": props_desc,
-            "cargos": cargos,
-           # "pagos": pagos_ser,
-            "pagos" : pagos_qs,
-            "totales": {
-                "cargos": f"{total_cargos:.2f}",
-                "pagos": f"{total_pagos:.2f}",
-                "saldo": f"{saldo:.2f}",
-            },
-            "mensaje": mensaje,
-        }
-        # Validamos contra el envelope final antes de responder
-        return Response(EstadoCuentaSerializer(payload).data, status=200)
+        return FileResponse(pdf, as_attachment=True, filename=f"estado_cuenta_{mes}.pdf",
+                            content_type="application/pdf")
 
 
 # -------- Endpoint: PDF Comprobante ----------
@@ -3,6 +3,10 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Necesario para el stream SSE de /api/eventos/ (conexiones largas en espera) y
+para los endpoints de detección en /api/ai-detection/async/:
+    gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -14,3 +18,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Crea los servicios de IA/Storage al arrancar el worker en lugar de en el primer request
+from django.conf import settings  # noqa: E402
+
+if settings.AI_CLIENT_SETTINGS['WARM_UP']:
+    from api.services.registry import warm_up  # noqa: E402
+    warm_up()
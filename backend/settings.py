@@ -139,6 +139,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "backend.wsgi.application"
 
+# Crea en la BD de pruebas las tablas managed=False antes de migrar
+TEST_RUNNER = "api.ejecutor_pruebas.EjecutorPruebas"
+
 # ------------------------------------
 DATABASES = {
     "default": dj_database_url.config(
@@ -271,6 +274,12 @@ LOGGING = {
             "level": "DEBUG",
             "propagate": False,
         },
+        # httpx registra cada request en INFO (cámaras y Storage)
+        "httpx": {
+            "handlers": ["console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
     },
 }
 
@@ -287,11 +296,129 @@ AI_IMAGE_SETTINGS = {
     'THUMBNAIL_SIZE': (800, 600),
     'JPEG_QUALITY': int(os.getenv("AI_JPEG_QUALITY", "85")),
     'MAX_FILE_SIZE_MB': 5,
+    # Las claves en Storage son el SHA-256 de la imagen procesada: antes de subir se consulta
+    # un índice local de rutas ya subidas y, si no está, un HEAD a la URL pública
+    'STORAGE_INDICE_MAX': int(os.getenv("AI_STORAGE_INDICE_MAX", "20000")),
+    'STORAGE_INDICE_TTL_SEG': float(os.getenv("AI_STORAGE_INDICE_TTL_SEG", "600")),
+    'STORAGE_HEAD_CHECK': os.getenv("AI_STORAGE_HEAD_CHECK", "True").lower() == "true",
+    # Variantes que se guardan de cada imagen (una sola decodificación, subidas en paralelo).
+    # imagen_path/imagen_url apuntan a la principal; imagen_variantes guarda la ruta de cada una.
+    'VARIANTES': {
+        'mini': (160, 160),
+        'media': (800, 600),
+        'original': (1920, 1080),
+    },
+    'VARIANTE_PRINCIPAL': 'media',
+    # Recodificación de las imágenes que se guardan en Storage (api.services.supabase_storage).
+    # Un JPEG ya dentro de la variante mayor de VARIANTES y con calidad <= la del preset se
+    # guarda sin recodificar.
+    'STORAGE_PRESET': os.getenv("AI_STORAGE_PRESET", "rapido"),
+    'STORAGE_PRESETS': {
+        # Lo más barato en CPU: reducción por bloques antes del filtro, sin pasada de Huffman óptima
+        'rapido': {'quality': int(os.getenv("AI_JPEG_QUALITY", "85")), 'resample': 'BICUBIC',
+                   'reducing_gap': 2.0, 'optimize': False, 'progressive': False},
+        # Mejor nitidez al reducir, mismo tamaño de archivo que 'rapido'
+        'calidad': {'quality': 90, 'resample': 'LANCZOS',
+                    'reducing_gap': 3.0, 'optimize': False, 'progressive': False},
+        # Menos bytes en Storage a cambio de CPU (optimize + progresivo)
+        'compacto': {'quality': 75, 'resample': 'LANCZOS',
+                     'reducing_gap': 2.0, 'optimize': True, 'progressive': True},
+    },
     'FACE_TOLERANCE': float(os.getenv("AI_FACE_TOLERANCE", "0.6")),
+    # Recarga completa del FaceMatcher (cambios hechos por otros procesos)
+    'FACE_MATCHER_RESYNC_SEG': int(os.getenv("AI_FACE_MATCHER_RESYNC_SEG", "300")),
+    # Índice IVF aproximado (api.services.face_index) a partir de este tamaño de galería
+    'FACE_INDEX_MIN_PERFILES': int(os.getenv("AI_FACE_INDEX_MIN_PERFILES", "10000")),
+    'FACE_INDEX_N_PROBE': int(os.getenv("AI_FACE_INDEX_N_PROBE", "8")),
+    'FACE_INDEX_PATH': os.getenv("AI_FACE_INDEX_PATH", str(BASE_DIR / "var" / "face_index.npz")),
     'PLATE_CONFIDENCE_THRESHOLD': float(os.getenv("AI_PLATE_CONFIDENCE_THRESHOLD", "0.5")),
+    # Índice de placas tolerante a OCR (api.services.plate_index)
+    'PLATE_MATCH_MIN_CONFIANZA': float(os.getenv("AI_PLATE_MATCH_MIN_CONFIANZA", "0.75")),
+    'PLATE_INDEX_RESYNC_SEG': int(os.getenv("AI_PLATE_INDEX_RESYNC_SEG", "300")),
+    # Frames casi idénticos de una misma cámara (api.services.frame_dedupe); 0 desactiva
+    'DEDUPE_VENTANA_SEG': float(os.getenv("AI_DEDUPE_VENTANA_SEG", "10")),
+    'DEDUPE_HAMMING_MAX': int(os.getenv("AI_DEDUPE_HAMMING_MAX", "6")),
 }
 
 # ------------------------------------
 # Configuración del microservicio de IA
 # ------------------------------------
 AI_MICROSERVICE_URL = os.getenv('AI_MICROSERVICE_URL', 'http://localhost:8001')
+
+AI_CLIENT_SETTINGS = {
+    # Pool keep-alive compartido por proceso (api.services.ai_client)
+    'POOL_CONNECTIONS': int(os.getenv("AI_CLIENT_POOL_CONNECTIONS", "4")),
+    'POOL_MAXSIZE': int(os.getenv("AI_CLIENT_POOL_MAXSIZE", "16")),
+    'CONNECT_TIMEOUT': float(os.getenv("AI_CLIENT_CONNECT_TIMEOUT", "3")),
+    'READ_TIMEOUT': float(os.getenv("AI_CLIENT_READ_TIMEOUT", "30")),
+    'REINTENTOS_CONEXION': int(os.getenv("AI_CLIENT_REINTENTOS_CONEXION", "1")),
+    # Circuit breaker (api.services.circuit_breaker): tras N fallos seguidos o respuestas
+    # más lentas que LENTITUD_SEG, falla al instante durante ESPERA_SEG y luego prueba una llamada
+    'BREAKER_FALLOS': int(os.getenv("AI_CLIENT_BREAKER_FALLOS", "5")),
+    'BREAKER_LENTITUD_SEG': float(os.getenv("AI_CLIENT_BREAKER_LENTITUD_SEG", "10")),
+    'BREAKER_ESPERA_SEG': float(os.getenv("AI_CLIENT_BREAKER_ESPERA_SEG", "15")),
+    # Plazo total de un request de detección (inferencia + subida de la evidencia)
+    'PLAZO_SEG': float(os.getenv("AI_CLIENT_PLAZO_SEG", "12")),
+    # Hilos que suben la evidencia mientras corre la inferencia
+    'UPLOAD_WORKERS': int(os.getenv("AI_CLIENT_UPLOAD_WORKERS", "8")),
+    # 'directo': la evidencia se sube durante el request; 'spool': se encola en disco
+    # (api.services.evidence_spool) y la sube un worker en segundo plano
+    'EVIDENCE_UPLOAD_MODE': os.getenv("AI_EVIDENCE_UPLOAD_MODE", "directo"),
+    'SPOOL_DIR': os.getenv("AI_SPOOL_DIR", str(BASE_DIR / "var" / "evidence_spool")),
+    # Worker dentro de cada proceso web; False si corre aparte `manage.py subir_evidencias`
+    'SPOOL_HILO': os.getenv("AI_SPOOL_HILO", "True").lower() == "true",
+    'SPOOL_WORKERS': int(os.getenv("AI_SPOOL_WORKERS", "4")),
+    'SPOOL_LOTE': int(os.getenv("AI_SPOOL_LOTE", "50")),
+    'SPOOL_MAX_INTENTOS': int(os.getenv("AI_SPOOL_MAX_INTENTOS", "10")),
+    'SPOOL_BACKOFF_SEG': float(os.getenv("AI_SPOOL_BACKOFF_SEG", "5")),
+    'SPOOL_POLL_SEG': float(os.getenv("AI_SPOOL_POLL_SEG", "2")),
+    # Ráfagas de frames por evento de cámara (ai-detection/*_burst)
+    'RAFAGA_WORKERS': int(os.getenv("AI_CLIENT_RAFAGA_WORKERS", "8")),
+    'MAX_FRAMES_RAFAGA': int(os.getenv("AI_MAX_FRAMES_RAFAGA", "8")),
+    # Inicializa servicios y verifica el bucket al cargar wsgi/asgi
+    'WARM_UP': os.getenv("AI_WARM_UP", "True").lower() == "true",
+}
+
+# ------------------------------------
+# Avisos / notificaciones push
+# ------------------------------------
+AVISOS_SETTINGS = {
+    'BULK_BATCH_SIZE': int(os.getenv("AVISOS_BULK_BATCH_SIZE", "500")),
+    'DISPATCH_WORKERS': int(os.getenv("AVISOS_DISPATCH_WORKERS", "2")),
+    # Worker de comunicados programados (manage.py publicar_programados)
+    'POLL_SEGUNDOS': float(os.getenv("AVISOS_POLL_SEGUNDOS", "15")),
+    'VENTANA_SUAVIZADO_SEG': int(os.getenv("AVISOS_VENTANA_SUAVIZADO_SEG", "900")),
+    'UMBRAL_SUAVIZADO': int(os.getenv("AVISOS_UMBRAL_SUAVIZADO", "200")),
+    'ENVIOS_POR_CICLO': int(os.getenv("AVISOS_ENVIOS_POR_CICLO", "500")),
+    'COMUNICADOS_POR_CICLO': int(os.getenv("AVISOS_COMUNICADOS_POR_CICLO", "10")),
+    # Un envío 'enviando' más viejo que esto es de un worker caído y se vuelve a despachar
+    'RECLAMO_VENCIDO_SEG': int(os.getenv("AVISOS_RECLAMO_VENCIDO_SEG", "600")),
+    # Un envío inmediato aún 'pendiente' pasado esto perdió su despacho (reinicio) y lo toma el worker
+    'PENDIENTE_VENCIDO_SEG': int(os.getenv("AVISOS_PENDIENTE_VENCIDO_SEG", "300")),
+    'MAX_INTENTOS_PROGRAMADO': int(os.getenv("AVISOS_MAX_INTENTOS_PROGRAMADO", "3")),
+    # Mapa rol -> audiencia (se invalida al escribir Rol/Usuario; el TTL cubre otros procesos)
+    'AUDIENCIAS_CACHE_TTL': int(os.getenv("AVISOS_AUDIENCIAS_CACHE_TTL", "300")),
+}
+
+PUSH_SETTINGS = {
+    # Clase que implementa api.services.push_dispatch.PushProvider
+    'PROVIDER': os.getenv("PUSH_PROVIDER", "api.services.push_dispatch.LogPushProvider"),
+    'BATCH_SIZE': int(os.getenv("PUSH_BATCH_SIZE", "500")),
+    'MAX_WORKERS': int(os.getenv("PUSH_MAX_WORKERS", "4")),
+    'MAX_REINTENTOS': int(os.getenv("PUSH_MAX_REINTENTOS", "3")),
+    'BACKOFF_BASE': float(os.getenv("PUSH_BACKOFF_BASE", "0.5")),
+    'BACKOFF_MAX': float(os.getenv("PUSH_BACKOFF_MAX", "8")),
+    'RATE_PER_SECOND': float(os.getenv("PUSH_RATE_PER_SECOND", "500")),
+}
+
+# ------------------------------------
+# Eventos en tiempo real (SSE)
+# ------------------------------------
+EVENTOS_SETTINGS = {
+    # LocalBackend (un solo proceso) o PostgresNotifyBackend (varios workers)
+    'BACKEND': os.getenv("EVENTOS_BACKEND", "api.services.eventos.LocalBackend"),
+    # LISTEN requiere conexión directa a Postgres (puerto 5432, no el pooler 6543)
+    'LISTEN_DATABASE_URL': os.getenv("EVENTOS_LISTEN_DATABASE_URL", _db_url),
+    'HEARTBEAT_SEG': int(os.getenv("EVENTOS_HEARTBEAT_SEG", "15")),
+    'QUEUE_MAX': int(os.getenv("EVENTOS_QUEUE_MAX", "100")),
+}
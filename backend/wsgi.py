@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Crea los servicios de IA/Storage al arrancar el worker en lugar de en el primer request
+from django.conf import settings  # noqa: E402
+
+if settings.AI_CLIENT_SETTINGS['WARM_UP']:
+    from api.services.registry import warm_up  # noqa: E402
+    warm_up()